@@ -0,0 +1,330 @@
+"""
+Acervo das páginas de produto baixadas da Amazon, para reextrair sem ir à rede.
+
+Cada página fica comprimida (zlib) em objetos/<2 primeiros do hash>/<resto do hash>, onde o
+hash é o SHA-256 do conteúdo: páginas idênticas são gravadas uma única vez. Um índice SQLite
+liga ASIN e momento da captura ao hash, junto com os campos extraídos na hora.
+
+A gravação é feita por uma thread em segundo plano (fila limitada: se encher, a página não
+é guardada), então o caminho da busca só paga a cópia dos bytes. Com o download em
+streaming a página pode ter sido lida só até os campos aparecerem; a coluna 'completa'
+diz se o corpo foi lido inteiro.
+
+Com 'retencao' > 0 a mesma thread apaga, de tempos em tempos, as capturas mais antigas que
+a retenção e os objetos que ficaram sem uso (um worker por intervalo, eleito pela tabela de
+controle). Gravar uma captura e apagar um objeto sem uso acontecem dentro de uma transação
+de escrita do índice, então uma captura nunca aponta para um objeto apagado.
+
+Quando os seletores mudam, a linha de comando reextrai as páginas guardadas em paralelo
+(um processo por núcleo) e mostra quantas mudaram:
+    python -m acervo_paginas --dir acervo_dados estatisticas
+    python -m acervo_paginas --dir acervo_dados reextrair --dias 30 --saida reextracao.jsonl
+    python -m acervo_paginas --dir acervo_dados reextrair --todas --gravar
+    python -m acervo_paginas --dir acervo_dados limpar --dias 90
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import sqlite3
+import sys
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from extrator import detectar_codificacao, extrair_produto
+from recursos_processo import ConexoesSQLite, ThreadDoProcesso
+
+NIVEL_COMPRESSAO = 6
+FILA_MAXIMA = 256  # Páginas esperando gravação; acima disso são descartadas
+DIRETORIO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "acervo_dados")  # Linha de comando
+
+logger = logging.getLogger(__name__)
+
+
+class AcervoPaginas:
+    """Armazém de páginas endereçado pelo conteúdo, com índice por ASIN e momento."""
+
+    def __init__(self, diretorio, retencao=0.0, intervalo_limpeza=3600.0):
+        self.diretorio = diretorio
+        self.retencao = retencao  # Segundos que uma captura é mantida (0 = para sempre)
+        self.intervalo_limpeza = intervalo_limpeza
+        self.caminho_db = os.path.join(diretorio, "indice.db")
+        os.makedirs(os.path.join(diretorio, "objetos"), exist_ok=True)
+        self._conexao = ConexoesSQLite(self.caminho_db, sqlite3.Row)
+        self._fila = queue.Queue(FILA_MAXIMA)
+        self._thread = ThreadDoProcesso(self._gravar_continuamente, "acervo-paginas")
+        self.guardadas = 0
+        self.duplicadas = 0
+        self.descartadas = 0
+        self.limpezas = 0
+        self._proxima_limpeza = time.monotonic() + intervalo_limpeza * random.uniform(0.1, 1.0)
+        self._criar_tabelas()
+
+    # --- Banco de dados ---
+
+    def _criar_tabelas(self):
+        conexao = self._conexao()
+        conexao.execute("""
+            CREATE TABLE IF NOT EXISTS paginas (
+                asin TEXT NOT NULL,
+                momento REAL NOT NULL,
+                hash TEXT NOT NULL,
+                url TEXT NOT NULL,
+                content_type TEXT,
+                bytes INTEGER NOT NULL,
+                completa INTEGER NOT NULL,
+                titulo TEXT,
+                preco_atual TEXT,
+                preco_antigo TEXT,
+                PRIMARY KEY (asin, momento)
+            ) WITHOUT ROWID
+        """)
+        conexao.execute("CREATE INDEX IF NOT EXISTS idx_paginas_hash ON paginas (hash)")
+        conexao.execute("CREATE INDEX IF NOT EXISTS idx_paginas_momento ON paginas (momento)")
+        conexao.execute("CREATE TABLE IF NOT EXISTS controle (chave TEXT PRIMARY KEY, valor REAL NOT NULL)")
+        conexao.execute("INSERT OR IGNORE INTO controle (chave, valor) VALUES ('limpeza', 0)")
+
+    def caminho_objeto(self, hash_conteudo):
+        return os.path.join(self.diretorio, "objetos", hash_conteudo[:2], hash_conteudo[2:])
+
+    # --- Gravação (thread em segundo plano) ---
+
+    def guardar(self, asin, url, conteudo, content_type, completa, campos):
+        """Coloca a página na fila de gravação. Nunca bloqueia quem está buscando o produto."""
+        if not asin or not conteudo:
+            return
+        item = (asin, time.time(), url, conteudo, content_type, completa,
+                campos.get("titulo"), campos.get("preco_atual"), campos.get("preco_antigo"))
+        try:
+            self._fila.put_nowait(item)
+        except queue.Full:
+            self.descartadas += 1
+            return
+        self._thread.garantir()
+
+    def _gravar_continuamente(self):
+        while True:
+            try:
+                item = self._fila.get(timeout=max(self._proxima_limpeza - time.monotonic(), 0.1))
+            except queue.Empty:
+                item = None
+            try:
+                if item is not None:
+                    self._gravar(*item)
+                if self.retencao > 0 and time.monotonic() >= self._proxima_limpeza:
+                    self._proxima_limpeza = time.monotonic() + self.intervalo_limpeza
+                    self._limpar_periodicamente()
+            except (OSError, sqlite3.Error) as e:
+                logger.warning("falha ao gravar página no acervo: %s", e)
+
+    def _limpar_periodicamente(self):
+        # Eleição atômica: só o worker que conseguir avançar o marcador limpa neste intervalo
+        agora = time.time()
+        eleito = self._conexao().execute(
+            "UPDATE controle SET valor = ? WHERE chave = 'limpeza' AND valor <= ?",
+            (agora, agora - self.intervalo_limpeza * 0.9),
+        ).rowcount
+        if eleito:
+            resultado = self.limpar(agora - self.retencao)
+            logger.info("acervo de páginas limpo", extra={"campos": resultado})
+
+    def _gravar(self, asin, momento, url, conteudo, content_type, completa, titulo, preco_atual, preco_antigo):
+        hash_conteudo = hashlib.sha256(conteudo).hexdigest()
+        caminho = self.caminho_objeto(hash_conteudo)
+        # Comprime fora da transação (é a parte lenta); o objeto só é escrito dentro dela
+        comprimido = None if os.path.exists(caminho) else zlib.compress(conteudo, NIVEL_COMPRESSAO)
+        conexao = self._conexao()
+        conexao.execute("BEGIN IMMEDIATE")  # Exclui a limpeza: o objeto não some entre a verificação e o INSERT
+        try:
+            if os.path.exists(caminho):
+                self.duplicadas += 1
+            else:
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                temporario = f"{caminho}.{os.getpid()}.tmp"
+                with open(temporario, "wb") as arquivo:
+                    arquivo.write(comprimido or zlib.compress(conteudo, NIVEL_COMPRESSAO))
+                os.replace(temporario, caminho)  # Troca atômica: leitores nunca veem o objeto pela metade
+            conexao.execute(
+                "INSERT OR IGNORE INTO paginas (asin, momento, hash, url, content_type, bytes, completa,"
+                " titulo, preco_atual, preco_antigo) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (asin, momento, hash_conteudo, url, content_type, len(conteudo), int(bool(completa)),
+                 titulo, preco_atual, preco_antigo),
+            )
+            conexao.execute("COMMIT")
+        except BaseException:
+            conexao.execute("ROLLBACK")
+            raise
+        self.guardadas += 1
+
+    # --- Leitura ---
+
+    def ler(self, hash_conteudo):
+        """Conteúdo original (bytes) da página com o hash dado."""
+        return ler_objeto(self.caminho_objeto(hash_conteudo))
+
+    def listar(self, asin=None, desde=None, ultima_por_asin=True):
+        """Registros do índice (mais recentes primeiro), opcionalmente só a última captura de cada ASIN."""
+        condicoes = []
+        parametros = []
+        if asin:
+            condicoes.append("asin = ?")
+            parametros.append(asin)
+        if desde:
+            condicoes.append("momento >= ?")
+            parametros.append(desde)
+        onde = (" WHERE " + " AND ".join(condicoes)) if condicoes else ""
+        if ultima_por_asin:
+            consulta = (f"SELECT p.* FROM paginas p JOIN (SELECT asin, MAX(momento) AS momento FROM paginas{onde}"
+                        " GROUP BY asin) u ON p.asin = u.asin AND p.momento = u.momento ORDER BY p.momento DESC")
+        else:
+            consulta = f"SELECT * FROM paginas{onde} ORDER BY momento DESC"
+        return [dict(linha) for linha in self._conexao().execute(consulta, parametros)]
+
+    def atualizar_campos(self, asin, momento, campos):
+        self._conexao().execute(
+            "UPDATE paginas SET titulo = ?, preco_atual = ?, preco_antigo = ? WHERE asin = ? AND momento = ?",
+            (campos["titulo"], campos["preco_atual"], campos["preco_antigo"], asin, momento),
+        )
+
+    def limpar(self, antes_de):
+        """Remove do índice as capturas anteriores a 'antes_de' e os objetos que ficaram sem uso."""
+        conexao = self._conexao()
+        hashes = [linha[0] for linha in conexao.execute(
+            "SELECT DISTINCT hash FROM paginas WHERE momento < ?", (antes_de,))]
+        removidas = conexao.execute("DELETE FROM paginas WHERE momento < ?", (antes_de,)).rowcount
+        objetos = 0
+        for hash_conteudo in hashes:
+            # Verificar e apagar na mesma transação de escrita que _gravar usa para referenciar o objeto
+            conexao.execute("BEGIN IMMEDIATE")
+            try:
+                if not conexao.execute("SELECT 1 FROM paginas WHERE hash = ? LIMIT 1", (hash_conteudo,)).fetchone():
+                    try:
+                        os.remove(self.caminho_objeto(hash_conteudo))
+                        objetos += 1
+                    except FileNotFoundError:
+                        pass
+                conexao.execute("COMMIT")
+            except BaseException:
+                conexao.execute("ROLLBACK")
+                raise
+        self.limpezas += 1
+        return {"capturas_removidas": removidas, "objetos_removidos": objetos}
+
+    def estatisticas(self):
+        linha = self._conexao().execute(
+            "SELECT COUNT(*) AS capturas, COUNT(DISTINCT asin) AS asins, COUNT(DISTINCT hash) AS objetos,"
+            " COALESCE(SUM(bytes), 0) AS bytes_capturados FROM paginas"
+        ).fetchone()
+        return {
+            **dict(linha),
+            "guardadas": self.guardadas,
+            "duplicadas": self.duplicadas,
+            "descartadas": self.descartadas,
+            "na_fila": self._fila.qsize(),
+            "retencao_dias": round(self.retencao / 86400, 2),
+            "limpezas": self.limpezas,
+        }
+
+
+def ler_objeto(caminho):
+    with open(caminho, "rb") as arquivo:
+        return zlib.decompress(arquivo.read())
+
+
+def _reextrair(item):
+    """Executada nos processos do pool: lê o objeto e roda a extração atual sobre ele."""
+    caminho, content_type = item
+    try:
+        conteudo = ler_objeto(caminho)
+    except (OSError, zlib.error) as e:
+        return {"erro": str(e)}
+    codificacao = detectar_codificacao(content_type, conteudo[:4096])
+    return extrair_produto(conteudo.decode(codificacao, errors="replace"))
+
+
+def reextrair(acervo, registros, processos=None):
+    """Roda a extração atual sobre os registros em paralelo; gera (registro, campos novos)."""
+    itens = [(acervo.caminho_objeto(r["hash"]), r["content_type"]) for r in registros]
+    with ProcessPoolExecutor(max_workers=processos or os.cpu_count()) as executor:
+        yield from zip(registros, executor.map(_reextrair, itens, chunksize=16))
+
+
+# --- Linha de comando ---
+
+def _comando_reextrair(acervo, args):
+    desde = time.time() - args.dias * 86400 if args.dias else None
+    registros = acervo.listar(asin=args.asin, desde=desde, ultima_por_asin=not args.todas)
+    inicio = time.perf_counter()
+    mudaram = 0
+    erros = 0
+    niveis = Counter()
+    saida = open(args.saida, "w", encoding="utf-8") if args.saida else None
+    try:
+        for registro, campos in reextrair(acervo, registros, args.processos):
+            if "erro" in campos:
+                erros += 1
+                continue
+            niveis[(campos["nivel_titulo"] or "nenhum", campos["nivel_preco"] or "nenhum")] += 1
+            antes = {campo: registro[campo] for campo in ("titulo", "preco_atual", "preco_antigo")}
+            depois = {campo: campos[campo] for campo in ("titulo", "preco_atual", "preco_antigo")}
+            mudou = antes != depois
+            if mudou:
+                mudaram += 1
+                if args.gravar:
+                    acervo.atualizar_campos(registro["asin"], registro["momento"], campos)
+            if saida is not None:
+                saida.write(json.dumps({"asin": registro["asin"], "momento": registro["momento"],
+                                        "hash": registro["hash"], "completa": bool(registro["completa"]),
+                                        "mudou": mudou, "antes": antes, "depois": campos},
+                                       ensure_ascii=False) + "\n")
+    finally:
+        if saida is not None:
+            saida.close()
+    duracao = time.perf_counter() - inicio
+
+    print(f"{len(registros)} páginas reextraídas em {duracao:.1f}s "
+          f"({len(registros) / duracao if duracao else 0:.0f} páginas/s)")
+    print(f"campos diferentes da captura: {mudaram}" + (" (gravados no índice)" if args.gravar and mudaram else ""))
+    if erros:
+        print(f"objetos ilegíveis: {erros}")
+    for (nivel_titulo, nivel_preco), quantidade in niveis.most_common():
+        print(f"  título={nivel_titulo:20s} preço={nivel_preco:20s} {quantidade}")
+    return 1 if erros else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Acervo de páginas de produto baixadas.")
+    parser.add_argument("--dir", default=os.environ.get("ACERVO_DIR") or DIRETORIO_PADRAO, help="Diretório do acervo")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    comandos.add_parser("estatisticas", help="Tamanho do acervo")
+
+    reextracao = comandos.add_parser("reextrair", help="Reextrai as páginas guardadas com os seletores atuais")
+    reextracao.add_argument("--asin", help="Só este ASIN")
+    reextracao.add_argument("--dias", type=float, help="Só capturas dos últimos N dias")
+    reextracao.add_argument("--todas", action="store_true", help="Todas as capturas (padrão: a última de cada ASIN)")
+    reextracao.add_argument("--processos", type=int, help="Processos em paralelo (padrão: um por núcleo)")
+    reextracao.add_argument("--saida", help="Arquivo JSONL com o resultado de cada página")
+    reextracao.add_argument("--gravar", action="store_true", help="Grava no índice os campos que mudaram")
+
+    limpeza = comandos.add_parser("limpar", help="Remove capturas antigas e objetos sem uso")
+    limpeza.add_argument("--dias", type=float, required=True, help="Remove capturas com mais de N dias")
+
+    args = parser.parse_args(argv)
+    acervo = AcervoPaginas(args.dir)
+    if args.comando == "estatisticas":
+        print(json.dumps(acervo.estatisticas(), ensure_ascii=False, indent=2))
+        return 0
+    if args.comando == "limpar":
+        print(json.dumps(acervo.limpar(time.time() - args.dias * 86400), ensure_ascii=False))
+        return 0
+    return _comando_reextrair(acervo, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
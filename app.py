@@ -1,25 +1,568 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import re
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import codecs
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit
 # Importe as bibliotecas necessárias para web scraping
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from acervo_paginas import AcervoPaginas
+from busca_unica import BuscaUnica
+from extrator import ExtratorProduto, detectar_codificacao, estatisticas_niveis
+from fila_telegram import OFERTA_AGRUPADA, OFERTA_ENFILEIRADA, FilaTelegram, ResultadoEnvio
+from importacao_ofertas import ImportadorOfertas, abrir_texto
+from links_amazon import (
+    ExpansorLinksCurtos, eh_host_amazon, eh_link_curto, extrair_asin, reescrever_links,
+)
+from links_amazon import montar_link_afiliado as montar_link_canonico
+from mensagens_oferta import estatisticas_mensagens, impressao_oferta, montar_mensagem_oferta
+from monitor_precos import INTERVALO_PADRAO, MonitorPrecos
+from precos import centavos_para_preco, preco_para_centavos
+from observabilidade import Metricas, configurar_logs
+from resultados_compartilhados import ResultadosCompartilhados
+from pool_saida import BLOQUEIO, FALHA, PERFIS_CABECALHOS, SUCESSO, PoolSaida
+from politica_busca import (
+    BLOQUEIO_BYTES_INICIO, MEIO_ABERTO, CircuitoAberto, DisjuntorCircuito, PaginaBloqueada, TimeoutAdaptativo,
+    motivo_bloqueio_inicio, motivo_bloqueio_status,
+)
 
 # 1. Configuração do Flask
 app = Flask(__name__)
 # Habilita CORS para permitir que o frontend (index.html) se comunique com o servidor
 CORS(app) 
 
-# Variáveis de Configuração (Substitua pelos seus dados reais para envio real)
-TELEGRAM_BOT_TOKEN = "SEU_TOKEN_BOT_AQUI"
-TELEGRAM_CHAT_ID = "-SEU_CHAT_ID_AQUI" # IDs de canais ou grupos costumam começar com '-'
+# Variáveis de Configuração (Substitua pelos seus dados reais para envio real, ou use as variáveis de ambiente)
+TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "SEU_TOKEN_BOT_AQUI")
+TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID", "-SEU_CHAT_ID_AQUI") # IDs de canais ou grupos costumam começar com '-'
+
+# Servidores de destino. O teste de carga (benchmarks/carga.py) aponta os dois para servidores falsos locais
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "https://api.telegram.org")
+AMAZON_URL_BASE = os.environ.get("AMAZON_URL_BASE", "")  # Ex: http://127.0.0.1:8001 (vazio = a própria Amazon)
+
+# Observabilidade: métricas em /metrics (somadas entre os workers vivos da instância; ver observabilidade.py)
+# e logs estruturados. METRICAS_INSTANCIA separa instâncias que não sejam workers do mesmo master.
+METRICAS_DIR = os.environ.get("METRICAS_DIR", os.path.join(tempfile.gettempdir(), "celoland_metricas"))
+LOG_NIVEL = os.environ.get("LOG_NIVEL", "INFO")
+LOG_FORMATO = os.environ.get("LOG_FORMATO", "json")  # "json" ou "texto"
+
+# Fila persistente de envios ao Telegram (SQLite)
+FILA_TELEGRAM_DB = os.environ.get(
+    "FILA_TELEGRAM_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fila_telegram.db")
+)
+# Mesma oferta (produto, preço, cupom e chat) dentro da janela não é enviada de novo; 0 desliga
+OFERTAS_JANELA_REPETICAO = float(os.environ.get("OFERTAS_JANELA_REPETICAO", "3600"))
+
+# Monitor de preços (lista de produtos vigiados, SQLite)
+MONITOR_ATIVO = os.environ.get("MONITOR_ATIVO", "1") != "0"
+MONITOR_DB = os.environ.get(
+    "MONITOR_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "monitor_precos.db")
+)
+MONITOR_MAX_THREADS = int(os.environ.get("MONITOR_MAX_THREADS", "8"))
+
+# Cache de produtos (em segundos / quantidade de itens). Pode ser ajustado por variáveis de ambiente.
+CACHE_PRODUTO_TTL = int(os.environ.get("CACHE_PRODUTO_TTL", "600"))  # Resultado real do scraping
+CACHE_PRODUTO_TTL_SIMULACAO = int(os.environ.get("CACHE_PRODUTO_TTL_SIMULACAO", "60"))  # Fallback mockado
+CACHE_PRODUTO_TTL_FALHA = int(os.environ.get("CACHE_PRODUTO_TTL_FALHA", "30"))  # Link sem ASIN / falha
+CACHE_PRODUTO_MAX_ITENS = int(os.environ.get("CACHE_PRODUTO_MAX_ITENS", "2000"))
+
+# Resultados compartilhados entre os workers (SQLite; vazio = cada worker só com o seu cache)
+RESULTADOS_DB = os.environ.get(
+    "RESULTADOS_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados_compartilhados.db")
+)
+RESULTADOS_COMPACTACAO = float(os.environ.get("RESULTADOS_COMPACTACAO", "300"))  # Segundos entre compactações
+
+# Acervo das páginas baixadas, para reextrair sem ir à rede (ex: ACERVO_DIR=acervo_dados; vazio = desligado)
+ACERVO_DIR = os.environ.get("ACERVO_DIR", "")
+ACERVO_RETENCAO_DIAS = float(os.environ.get("ACERVO_RETENCAO_DIAS", "30"))  # Capturas mais antigas são apagadas; 0 = nunca
+
+# Coalescência de buscas simultâneas pelo mesmo ASIN (vazio = só dentro do worker).
+# No modo assíncrono (servidor_async) a coalescência é só dentro do processo: isto não vale lá
+COALESCENCIA_DIR = os.environ.get("COALESCENCIA_DIR", os.path.join(tempfile.gettempdir(), "celoland_busca_unica"))
+COALESCENCIA_VALIDADE = float(os.environ.get("COALESCENCIA_VALIDADE", "5"))  # Segundos
+
+# Sessões HTTP reaproveitadas (keep-alive) para Amazon e Telegram
+HTTP_POOL_CONEXOES = int(os.environ.get("HTTP_POOL_CONEXOES", "10"))  # Pools (hosts) por sessão
+HTTP_POOL_MAX = int(os.environ.get("HTTP_POOL_MAX", "20"))  # Conexões abertas por host
+HTTP_RETRY_TOTAL = int(os.environ.get("HTTP_RETRY_TOTAL", "2"))
+HTTP_RETRY_BACKOFF = float(os.environ.get("HTTP_RETRY_BACKOFF", "0.5"))
+
+# Download em streaming da página: para de ler quando os campos já foram encontrados
+STREAMING_ATIVO = os.environ.get("STREAMING_ATIVO", "1") != "0"
+STREAMING_MAX_BYTES = int(os.environ.get("STREAMING_MAX_BYTES", str(3 * 1024 * 1024)))  # Teto por página
+STREAMING_BYTES_EXTRAS = int(os.environ.get("STREAMING_BYTES_EXTRAS", str(64 * 1024)))  # Procurando o preço antigo
+STREAMING_TAMANHO_BLOCO = 16 * 1024
+
+# Política de busca na Amazon: timeout adaptativo, disjuntor e hedge (ver politica_busca.py)
+BUSCA_TIMEOUT_MIN = float(os.environ.get("BUSCA_TIMEOUT_MIN", "3"))
+BUSCA_TIMEOUT_MAX = float(os.environ.get("BUSCA_TIMEOUT_MAX", "20"))
+BUSCA_TIMEOUT_FATOR = float(os.environ.get("BUSCA_TIMEOUT_FATOR", "3"))  # Timeout = p95 x fator
+DISJUNTOR_LIMITE = int(os.environ.get("DISJUNTOR_LIMITE", "5"))  # Falhas seguidas que abrem o disjuntor (0 = desligado)
+DISJUNTOR_RESFRIAMENTO = float(os.environ.get("DISJUNTOR_RESFRIAMENTO", "60"))  # Segundos
+DISJUNTOR_RESFRIAMENTO_MAX = float(os.environ.get("DISJUNTOR_RESFRIAMENTO_MAX", "600"))
+BUSCA_HEDGE = os.environ.get("BUSCA_HEDGE", "0") == "1"  # Segunda requisição quando a primeira passa do p95
+
+# Links curtos (amzn.to, a.co): destino guardado em memória para não seguir o redirecionamento de novo
+LINKS_CURTOS_TIMEOUT = float(os.environ.get("LINKS_CURTOS_TIMEOUT", "5"))
+LINKS_CURTOS_TTL = int(os.environ.get("LINKS_CURTOS_TTL", "86400"))
+LINKS_CURTOS_MAX_ITENS = int(os.environ.get("LINKS_CURTOS_MAX_ITENS", "20000"))
+LINKS_MAX_LOTE = int(os.environ.get("LINKS_MAX_LOTE", "20000"))  # Links por chamada de /api/links-afiliado
+
+# Pool de saída das buscas na Amazon: proxies e perfis de cabeçalhos sorteados pela saúde (ver pool_saida.py)
+SAIDA_PROXIES = [p.strip() for p in os.environ.get("SAIDA_PROXIES", "").split(",") if p.strip()]  # Vazio = direto
+SAIDA_DIRETO = os.environ.get("SAIDA_DIRETO", "0") == "1"  # Conexão direta também entra no pool de proxies
+SAIDA_PERFIS = [p.strip() for p in os.environ.get("SAIDA_PERFIS", ",".join(PERFIS_CABECALHOS)).split(",") if p.strip()]
+SAIDA_QUARENTENA = float(os.environ.get("SAIDA_QUARENTENA", "60"))  # Segundos (dobra a cada reincidência)
+SAIDA_QUARENTENA_MAX = float(os.environ.get("SAIDA_QUARENTENA_MAX", "900"))
+SAIDA_SONDA_URL = os.environ.get("SAIDA_SONDA_URL", "https://www.amazon.com.br/")
+
+# Busca em lote (/api/buscar-produtos)
+LOTE_MAX_LINKS = int(os.environ.get("LOTE_MAX_LINKS", "500"))
+LOTE_MAX_THREADS = int(os.environ.get("LOTE_MAX_THREADS", "16"))
+LOTE_MAX_POR_HOST = int(os.environ.get("LOTE_MAX_POR_HOST", "8"))  # Requisições simultâneas por host
+
+AMAZON_HOST = "www.amazon.com.br"
+TELEGRAM_HOST = "api.telegram.org"
+SESSAO_LINKS_CURTOS = "links-curtos"  # Chave da sessão compartilhada pelos encurtadores (amzn.to, a.co...)
+
+# Headers para simular um navegador real (necessário para a Amazon)
+# O User-Agent foi atualizado para ser mais "comum"
+HEADERS_AMAZON = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept-Language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
+    'Accept-Encoding': 'gzip, deflate, br'
+}
+
+configurar_logs(LOG_NIVEL, LOG_FORMATO)
+logger = logging.getLogger("celoland")
+
+
+# --- Métricas (formato Prometheus, expostas em /metrics) ---
+
+metricas = Metricas(METRICAS_DIR or None)
+metricas.histograma("celoland_http_conexao_segundos", "Tempo para abrir conexão com o upstream (DNS + TCP + TLS).")
+metricas.histograma("celoland_amazon_resposta_segundos", "Tempo até receber os headers da resposta da Amazon.")
+metricas.histograma("celoland_amazon_download_segundos", "Tempo lendo o corpo da página da Amazon (sem o parsing).")
+metricas.histograma("celoland_amazon_parse_segundos", "Tempo de parsing da página, por nível de fallback do preço.",
+                    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+metricas.histograma("celoland_telegram_envio_segundos", "Duração das chamadas ao sendMessage do Telegram.")
+metricas.contador("celoland_buscas_total", "Buscas de produto executadas, por origem do resultado.")
+metricas.contador("celoland_cache_produtos_total", "Consultas ao cache de produtos (hit, compartilhado entre workers ou miss).")
+metricas.contador("celoland_amazon_status_total", "Respostas HTTP da Amazon, por status.")
+metricas.contador("celoland_amazon_erros_total", "Falhas do scraping que caíram no fallback, por tipo.")
+metricas.contador("celoland_extracao_nivel_total", "Nível de fallback dos seletores usado, por campo.")
+metricas.contador("celoland_telegram_envios_total", "Tentativas de envio ao Telegram, por resultado.")
+metricas.contador("celoland_amazon_bloqueios_total", "Páginas de bloqueio (captcha/robot check) da Amazon, por motivo.")
+metricas.contador("celoland_disjuntor_aberturas_total", "Vezes que o disjuntor da Amazon abriu.")
+metricas.contador("celoland_disjuntor_evitadas_total", "Buscas que não foram à Amazon porque o disjuntor estava aberto.")
+metricas.contador("celoland_amazon_hedge_total", "Requisições de hedge à Amazon (disparadas e vencedoras).")
+metricas.contador("celoland_ofertas_repetidas_total", "Ofertas repetidas que não viraram envio ao Telegram, por ação.")
+
+
+class ScrapingFalhou(Exception):
+    """A página foi baixada, mas não tinha título e preço válidos."""
+
+
+# --- Cache de Produtos (chaveado pelo ASIN) ---
+
+class CacheProdutos:
+    """
+    Cache em memória com TTL e despejo LRU para os resultados de busca de produtos.
+
+    A chave é o ASIN canônico (e não a URL crua), assim parâmetros de rastreamento
+    diferentes para o mesmo produto reaproveitam a mesma entrada.
+    """
+
+    def __init__(self, max_itens):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()  # chave -> (expira_em, resultado)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirados = 0
+        self.despejados = 0
+
+    def obter(self, chave):
+        """Retorna uma cópia do resultado em cache ou None (miss/expirado)."""
+        agora = time.monotonic()
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.misses += 1
+                return None
+            expira_em, resultado = item
+            if expira_em <= agora:
+                del self._itens[chave]
+                self.expirados += 1
+                self.misses += 1
+                return None
+            self._itens.move_to_end(chave)  # Marca como usado recentemente (LRU)
+            self.hits += 1
+            return dict(resultado)
+
+    def guardar(self, chave, resultado, ttl):
+        """Guarda o resultado por 'ttl' segundos, despejando o item menos usado se necessário."""
+        if ttl <= 0 or self.max_itens <= 0:
+            return
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + ttl, dict(resultado))
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self.despejados += 1
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "itens": len(self._itens),
+                "max_itens": self.max_itens,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expirados": self.expirados,
+                "despejados": self.despejados,
+                "taxa_acerto": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+cache_produtos = CacheProdutos(CACHE_PRODUTO_MAX_ITENS)
+busca_unica = BuscaUnica(COALESCENCIA_DIR or None, validade=COALESCENCIA_VALIDADE)
+resultados_compartilhados = ResultadosCompartilhados(RESULTADOS_DB, RESULTADOS_COMPACTACAO) if RESULTADOS_DB else None
+acervo_paginas = AcervoPaginas(ACERVO_DIR, ACERVO_RETENCAO_DIAS * 86400) if ACERVO_DIR else None
+disjuntor_amazon = DisjuntorCircuito(DISJUNTOR_LIMITE, DISJUNTOR_RESFRIAMENTO, DISJUNTOR_RESFRIAMENTO_MAX)
+timeout_amazon = TimeoutAdaptativo(BUSCA_TIMEOUT_MIN, BUSCA_TIMEOUT_MAX, BUSCA_TIMEOUT_FATOR)
+pool_saida = PoolSaida(SAIDA_PROXIES + ([None] if SAIDA_DIRETO or not SAIDA_PROXIES else []), SAIDA_PERFIS,
+                       sondar=lambda saida: _sondar_saida(saida), quarentena=SAIDA_QUARENTENA,
+                       quarentena_maxima=SAIDA_QUARENTENA_MAX)
+
+
+# --- Sessões HTTP (uma por host upstream, reaproveitadas pelo worker) ---
+
+class _ConexaoHTTPMedida(HTTPConnection):
+    def connect(self):
+        with metricas.medir("celoland_http_conexao_segundos", host=self.host):
+            super().connect()
+
+
+class _ConexaoHTTPSMedida(HTTPSConnection):
+    def connect(self):
+        with metricas.medir("celoland_http_conexao_segundos", host=self.host):
+            super().connect()
+
+
+class _PoolHTTPMedido(HTTPConnectionPool):
+    ConnectionCls = _ConexaoHTTPMedida
+
+
+class _PoolHTTPSMedido(HTTPSConnectionPool):
+    ConnectionCls = _ConexaoHTTPSMedida
+
+
+class AdaptadorMedido(HTTPAdapter):
+    """HTTPAdapter cujas conexões novas registram o tempo de abertura nas métricas."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _PoolHTTPMedido, "https": _PoolHTTPSMedido}
+
+
+_sessoes = {}  # host -> (pid, sessao, adapter)
+_sessoes_lock = threading.Lock()
+
+
+def _criar_sessao(host):
+    """Cria a sessão do host com pool de conexões e política de retry/backoff."""
+    if host == TELEGRAM_HOST:
+        # POST não é idempotente: só repete falhas de conexão (antes do envio).
+        # Respostas 429 do Telegram são tratadas por quem chama.
+        retry = Retry(total=HTTP_RETRY_TOTAL, connect=HTTP_RETRY_TOTAL, read=0, status=0,
+                      backoff_factor=HTTP_RETRY_BACKOFF)
+    else:
+        retry = Retry(total=HTTP_RETRY_TOTAL, connect=HTTP_RETRY_TOTAL, read=1, status=HTTP_RETRY_TOTAL,
+                      backoff_factor=HTTP_RETRY_BACKOFF,
+                      status_forcelist=(500, 502, 504),  # 503 é bloqueio: repetir só piora
+                      allowed_methods=frozenset(['GET', 'HEAD']),
+                      raise_on_status=False)
+
+    adapter = AdaptadorMedido(pool_connections=HTTP_POOL_CONEXOES, pool_maxsize=HTTP_POOL_MAX, max_retries=retry)
+    sessao = requests.Session()
+    sessao.mount("https://", adapter)
+    sessao.mount("http://", adapter)
+    if host != TELEGRAM_HOST:
+        sessao.headers.update(HEADERS_AMAZON)  # Headers montados uma única vez por sessão
+    return sessao, adapter
+
+
+def obter_sessao(host):
+    """
+    Retorna a sessão keep-alive do host. A sessão é recriada após um fork
+    (ex: gunicorn com --preload), pois conexões não podem ser compartilhadas entre processos.
+    """
+    pid = os.getpid()
+    item = _sessoes.get(host)
+    if item is not None and item[0] == pid:
+        return item[1]
+    with _sessoes_lock:
+        item = _sessoes.get(host)
+        if item is None or item[0] != pid:
+            sessao, adapter = _criar_sessao(host)
+            item = (pid, sessao, adapter)
+            _sessoes[host] = item
+        return item[1]
+
+
+def estatisticas_sessoes():
+    """Contadores de reaproveitamento de conexões (requisições x conexões novas) por host."""
+    resultado = {}
+    pid = os.getpid()
+    with _sessoes_lock:
+        itens = [(host, item[2]) for host, item in _sessoes.items() if item[0] == pid]
+    for host, adapter in itens:
+        pools = adapter.poolmanager.pools
+        requisicoes = 0
+        conexoes = 0
+        for chave in list(pools.keys()):
+            pool = pools.get(chave)
+            if pool is None:
+                continue
+            requisicoes += pool.num_requests
+            conexoes += pool.num_connections
+        resultado[host] = {
+            "requisicoes": requisicoes,
+            "conexoes_abertas": conexoes,
+            "conexoes_reaproveitadas": max(requisicoes - conexoes, 0),
+        }
+    return {"pid": pid, "hosts": resultado}
 
 # --- Funções de Simulação/Realização (Web Scraping e Telegram) ---
 
 def buscar_info_produto_real(url):
     """
     Função REAL de busca de dados do produto, extraindo informações do link da Amazon.
-    
+
+    Os resultados ficam no cache de produtos (chaveado pelo ASIN), com TTLs separados
+    para scraping real, fallback simulado e falha.
+    """
+    return dict(buscar_info_produto_com_origem(url)["resultado"])
+
+
+def buscar_info_produto_com_origem(url):
+    """
+    Igual a buscar_info_produto_real, mas retorna {"resultado": ..., "origem": ...}, onde
+    origem é "amazon", "simulacao" ou "falha" (o monitor de preços ignora simulações).
+    """
+    if eh_link_curto(url):
+        url = links_curtos.expandir(url.strip()) or url
+    asin = extrair_asin(url)
+    chave = asin or url
+
+    busca = cache_produtos.obter(chave)
+    if busca is not None:
+        metricas.incrementar("celoland_cache_produtos_total", resultado="hit")
+        logger.debug("cache hit", extra={"campos": {"chave": chave}})
+        return busca
+
+    # Segundo nível: o que os outros workers já buscaram
+    compartilhado = obter_resultado_compartilhado(chave)
+    if compartilhado is not None:
+        busca, restante = compartilhado
+        cache_produtos.guardar(chave, busca, min(restante, _ttl_cache(busca["origem"])))
+        return busca
+    metricas.incrementar("celoland_cache_produtos_total", resultado="miss")
+
+    # Buscas simultâneas pelo mesmo ASIN (neste ou em outros workers) viram uma só
+    # O resultado leva a 'origem' junto para aplicar o TTL correto mesmo quando vem de outro worker
+    busca = busca_unica.executar(chave, lambda: _buscar_para_coalescencia(url, asin, chave))
+    cache_produtos.guardar(chave, busca, _ttl_cache(busca["origem"]))
+    return busca
+
+
+def obter_resultado_compartilhado(chave):
+    """(busca, segundos até expirar) gravada por algum worker, ou None (também usada pelo modo assíncrono)."""
+    if resultados_compartilhados is None:
+        return None
+    compartilhado = resultados_compartilhados.obter(chave)
+    if compartilhado is not None:
+        metricas.incrementar("celoland_cache_produtos_total", resultado="compartilhado")
+        logger.debug("resultado compartilhado", extra={"campos": {"chave": chave}})
+    return compartilhado
+
+
+def guardar_resultado_compartilhado(chave, busca):
+    if resultados_compartilhados is not None:
+        resultados_compartilhados.guardar(chave, busca, _ttl_cache(busca["origem"]))
+
+
+def _ttl_cache(origem):
+    if origem == "amazon":
+        return CACHE_PRODUTO_TTL
+    if origem == "simulacao":
+        return CACHE_PRODUTO_TTL_SIMULACAO
+    return CACHE_PRODUTO_TTL_FALHA
+
+
+def _buscar_para_coalescencia(url, asin, chave):
+    """Executada só pelo líder da coalescência (resultado serializável em JSON)."""
+    # Outro worker pode ter gravado o resultado enquanto esperávamos a vez
+    compartilhado = obter_resultado_compartilhado(chave)
+    if compartilhado is not None:
+        return compartilhado[0]
+    resultado, origem = _buscar_info_produto_sem_cache(url, asin)
+    metricas.incrementar("celoland_buscas_total", origem=origem)
+    busca = {"resultado": resultado, "origem": origem}
+    guardar_resultado_compartilhado(chave, busca)
+    return busca
+
+
+# --- Download em streaming da página do produto ---
+
+_estatisticas_download = {
+    "paginas": 0,
+    "paginas_interrompidas": 0,  # Parou antes do fim (campos encontrados ou teto de bytes)
+    "paginas_no_teto": 0,
+    "bytes_recebidos": 0,  # Bytes lidos da rede (comprimidos, se a resposta vier com gzip)
+    "bytes_economizados": 0,  # Content-Length - bytes recebidos, quando o servidor informa o tamanho
+}
+_estatisticas_download_lock = threading.Lock()
+
+
+class LeituraPagina:
+    """
+    Estado da leitura em streaming de uma página: recebe os blocos do corpo e alimenta o
+    extrator incremental. Usada pelo download síncrono (requests) e pelo assíncrono
+    (servidor_async.py), que chama receber()/finalizar() em um pool de threads.
+
+    receber() retorna True quando não vale mais a pena ler: título, preço e preço antigo
+    foram encontrados, os essenciais foram encontrados e já se leu STREAMING_BYTES_EXTRAS
+    além deles (o preço antigo fica perto do preço atual), ou o teto STREAMING_MAX_BYTES
+    foi atingido.
+    """
+
+    def __init__(self, url, content_type):
+        self.url = url
+        self.content_type = content_type
+        self.extrator = ExtratorProduto()
+        self.decodificador = None
+        self.lidos = 0
+        self.lidos_nos_essenciais = None
+        self.interrompida = False
+        self.no_teto = False
+        self.tempo_parse = 0.0
+        self.inicio = time.perf_counter()
+        self._inicio_corpo = b""
+        self._blocos = [] if acervo_paginas is not None else None  # Cópia do corpo para o acervo
+
+    def receber(self, bloco):
+        if len(self._inicio_corpo) < BLOQUEIO_BYTES_INICIO:
+            # Captcha/robot check se reconhece nos primeiros bytes: nem chega a ser parseado
+            self._inicio_corpo += bloco[:BLOQUEIO_BYTES_INICIO]
+            motivo = motivo_bloqueio_inicio(self._inicio_corpo)
+            if motivo is not None:
+                raise PaginaBloqueada(motivo)
+        if self._blocos is not None:
+            self._blocos.append(bloco)
+        if self.decodificador is None:
+            codificacao = detectar_codificacao(self.content_type, bloco)
+            self.decodificador = codecs.getincrementaldecoder(codificacao)(errors='replace')
+        self.lidos += len(bloco)
+        inicio_parse = time.perf_counter()
+        self.extrator.alimentar(self.decodificador.decode(bloco))
+        self.tempo_parse += time.perf_counter() - inicio_parse
+
+        if not STREAMING_ATIVO:
+            return False
+        if self.extrator.todos_encontrados:
+            self.interrompida = True
+            return True
+        if self.extrator.essenciais_encontrados:
+            if self.lidos_nos_essenciais is None:
+                self.lidos_nos_essenciais = self.lidos
+            elif self.lidos - self.lidos_nos_essenciais >= STREAMING_BYTES_EXTRAS:
+                self.interrompida = True
+                return True
+        if self.lidos >= STREAMING_MAX_BYTES:
+            self.interrompida = self.no_teto = True
+            logger.info("teto de bytes atingido, extraindo o que foi lido",
+                        extra={"campos": {"url": self.url, "teto": STREAMING_MAX_BYTES}})
+            return True
+        return False
+
+    def finalizar(self, recebidos=None, tamanho_total=None):
+        """
+        Resolve os campos e registra as métricas. 'recebidos' são os bytes que passaram pela
+        rede (antes de descomprimir) e 'tamanho_total' o Content-Length, quando informado.
+        """
+        inicio_parse = time.perf_counter()
+        if self.decodificador is not None:
+            self.extrator.alimentar(self.decodificador.decode(b"", final=True))
+        campos = self.extrator.finalizar()
+        self.tempo_parse += time.perf_counter() - inicio_parse
+
+        metricas.observar("celoland_amazon_download_segundos",
+                          time.perf_counter() - self.inicio - self.tempo_parse)
+        metricas.observar("celoland_amazon_parse_segundos", self.tempo_parse,
+                          nivel_preco=campos["nivel_preco"] or "nenhum")
+        for campo, nivel in (("titulo", campos["nivel_titulo"]), ("preco_atual", campos["nivel_preco"]),
+                             ("preco_antigo", campos["nivel_preco_antigo"])):
+            metricas.incrementar("celoland_extracao_nivel_total", campo=campo, nivel=nivel or "nenhum")
+        if self._blocos is not None:
+            acervo_paginas.guardar(extrair_asin(self.url), self.url, b"".join(self._blocos), self.content_type,
+                                   not self.interrompida, campos)
+
+        recebidos = recebidos or self.lidos
+        with _estatisticas_download_lock:
+            _estatisticas_download["paginas"] += 1
+            _estatisticas_download["bytes_recebidos"] += recebidos
+            if self.interrompida:
+                _estatisticas_download["paginas_interrompidas"] += 1
+                if tamanho_total and tamanho_total.isdigit():
+                    _estatisticas_download["bytes_economizados"] += max(int(tamanho_total) - recebidos, 0)
+            if self.no_teto:
+                _estatisticas_download["paginas_no_teto"] += 1
+        return campos
+
+
+def _baixar_e_extrair(response):
+    """Lê o corpo da resposta (requests, stream=True) em blocos e extrai os campos."""
+    leitura = LeituraPagina(response.url, response.headers.get('Content-Type'))
+    blocos = response.iter_content(chunk_size=STREAMING_TAMANHO_BLOCO) if STREAMING_ATIVO else [response.content]
+    for bloco in blocos:
+        if leitura.receber(bloco):
+            break
+
+    # Bytes que realmente passaram pela rede (antes de descomprimir)
+    try:
+        recebidos = response.raw.tell()
+    except Exception:
+        recebidos = None
+    return leitura.finalizar(recebidos, response.headers.get('Content-Length'))
+
+
+def estatisticas_download():
+    with _estatisticas_download_lock:
+        return dict(_estatisticas_download)
+
+
+def _buscar_info_produto_sem_cache(url, asin):
+    """
+    Faz o scraping da página da Amazon (com fallback para a simulação).
+
+    Retorna uma tupla (resultado, origem), onde origem é "amazon", "simulacao" ou "falha".
+
     NOTA: Os seletores da Amazon podem mudar. Se o scraping falhar, os seletores
     dentro do bloco 'try' precisam ser atualizados.
     """
@@ -28,170 +571,526 @@ def buscar_info_produto_real(url):
     # --- INÍCIO DA LÓGICA DE WEB SCRAPING REAL (MELHORADA) ---
     # ----------------------------------------------------------------------
     
-    try:
-        # Configurar headers para simular um navegador real (necessário para a Amazon)
-        # O User-Agent foi atualizado para ser mais "comum"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept-Language': 'pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Accept-Encoding': 'gzip, deflate, br'
-        }
-        
-        # Fazer a requisição HTTP
-        response = requests.get(url, headers=headers, timeout=20) # Aumentado o timeout
-        response.raise_for_status() # Lança exceção para erros HTTP (4xx ou 5xx)
-        
-        # Analisar o conteúdo HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # 1. Título - Tentando seletor mais genérico (e o original)
-        titulo_elemento = soup.find(id='productTitle')
-        if not titulo_elemento:
-             titulo_elemento = soup.find('span', id='productTitle')
-             
-        titulo = titulo_elemento.text.strip() if titulo_elemento else None
-        
-        # 2. Preço Atual - Buscando em todos os elementos 'a-offscreen' e filtrando o primeiro
-        preco_atual = None
-        
-        # Tenta 1: Encontrar o preço principal dentro de 'a-offscreen' (local mais comum para o preço)
-        price_offscreen = soup.find('span', class_='a-offscreen')
+    if not disjuntor_amazon.permitir():
+        metricas.incrementar("celoland_disjuntor_evitadas_total")
+        return resultado_fallback(url, asin, CircuitoAberto("Disjuntor da Amazon aberto: busca não realizada."))
 
-        if price_offscreen:
-            preco_atual = price_offscreen.text.strip()
-        else:
-            # Tenta 2: Encontrar no price block principal
-            price_main_block = soup.find(id='priceblock_ourprice') 
-            if price_main_block:
-                preco_atual = price_main_block.text.strip()
-            
-            # Tenta 3: Encontrar na classe de preço mais comum 'priceToPay'
-            if not preco_atual:
-                price_to_pay = soup.find('span', class_='priceToPay')
-                if price_to_pay:
-                    price_offscreen_fallback = price_to_pay.find('span', class_='a-offscreen')
-                    if price_offscreen_fallback:
-                        preco_atual = price_offscreen_fallback.text.strip()
-            
-            # Tenta 4: Montar o valor a partir dos elementos de preço (inteiro e decimal)
-            if not preco_atual:
-                preco_atual_elemento = soup.find(class_='a-price-whole') 
-                if preco_atual_elemento:
-                    centavos_elemento = soup.find(class_='a-price-fraction')
-                    simbolo_elemento = soup.find(class_='a-price-symbol')
-                    
-                    preco_atual_str = ""
-                    if simbolo_elemento:
-                        preco_atual_str += simbolo_elemento.text.strip() + " "
-                    if preco_atual_elemento:
-                        preco_atual_str += preco_atual_elemento.text.strip()
-                    if centavos_elemento:
-                        preco_atual_str += "," + centavos_elemento.text.strip()
-                    
-                    preco_atual = preco_atual_str if preco_atual_str.strip() != "" else None
-
-
-        # 3. Preço Antigo (Geralmente marcado com riscado na classe 'a-text-strike')
-        preco_antigo_elemento = soup.find('span', class_='a-text-strike')
-        preco_antigo = preco_antigo_elemento.text.strip() if preco_antigo_elemento else None
+    saida = None
+    timeout = timeout_da_busca()
+    try:
+        # Fazer a requisição HTTP pela sessão keep-alive, saindo por um proxy/perfil do pool de saída
+        # Com stream=True o corpo é lido aos poucos, conforme o parser consome
+        response = _get_amazon_com_hedge(url, timeout)
+        saida = response.saida
+        metricas.observar("celoland_amazon_resposta_segundos", response.elapsed.total_seconds())
+        metricas.incrementar("celoland_amazon_status_total", status=str(response.status_code))
+        with response:
+            verificar_status_bloqueio(response.status_code)
+            response.raise_for_status() # Lança exceção para erros HTTP (4xx ou 5xx)
 
-        
-        # Verifica se os dados essenciais foram encontrados e parecem válidos
-        # Deve ter título E o preço deve conter "R$" ou ser um valor numérico (para garantir que não seja texto vazio)
-        if titulo and preco_atual and (preco_atual.startswith('R$') or any(char.isdigit() for char in preco_atual)):
-            print(f"SCRAPING SUCESSO: Título: {titulo}, Preço: {preco_atual}")
-            return {
-                "sucesso": True,
-                "titulo": titulo,
-                "preco_atual": preco_atual,
-                "preco_antigo": preco_antigo
-            }
-        
-        # Se chegou aqui, os dados não foram encontrados ou estão em formato inesperado
-        raise Exception("Dados essenciais não encontrados na página (Scraping falhou).")
+            # Extrair título e preços em uma única passada pelo HTML (níveis de fallback em extrator.py)
+            campos = _baixar_e_extrair(response)
+        registrar_resposta_amazon(response.elapsed.total_seconds())
+        pool_saida.registrar(saida, SUCESSO, response.elapsed.total_seconds())
+        return validar_campos(url, campos), "amazon"
             
+    except PaginaBloqueada as e:
+        registrar_falha_amazon(e.motivo)
+        if saida is not None:
+            pool_saida.registrar(saida, BLOQUEIO)
+        return resultado_fallback(url, asin, e)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        registrar_falha_amazon("timeout" if isinstance(e, requests.Timeout) else "conexao", timeout)
+        if saida is not None:  # Falhas antes da resposta já foram registradas em _get_amazon
+            pool_saida.registrar(saida, FALHA)
+        return resultado_fallback(url, asin, e)
     except Exception as e:
-        print(f"Erro durante o scraping (voltando para a simulação): {e}")
+        return resultado_fallback(url, asin, e)
+
+
+def verificar_status_bloqueio(status):
+    """Levanta PaginaBloqueada se o status HTTP for de bloqueio (503/429)."""
+    motivo = motivo_bloqueio_status(status)
+    if motivo is not None:
+        raise PaginaBloqueada(motivo)
+
+
+def timeout_da_busca():
+    """
+    Timeout da próxima busca: o adaptativo (p95 x fator) ou, na busca de teste do disjuntor
+    meio aberto, o máximo (o teste não pode falhar só porque o timeout ficou curto).
+    """
+    return BUSCA_TIMEOUT_MAX if disjuntor_amazon.estado == MEIO_ABERTO else timeout_amazon.atual()
+
+
+def registrar_resposta_amazon(segundos):
+    """A Amazon respondeu com uma página de verdade: fecha o disjuntor e alimenta o timeout adaptativo."""
+    disjuntor_amazon.registrar_sucesso()
+    timeout_amazon.registrar(segundos)
+
+
+def registrar_falha_amazon(motivo, timeout=None):
+    """Alimenta o disjuntor; num timeout, também o timeout adaptativo ('timeout' = segundos usados)."""
+    if motivo not in ("timeout", "conexao"):
+        metricas.incrementar("celoland_amazon_bloqueios_total", motivo=motivo)
+    if motivo == "timeout" and timeout:
+        timeout_amazon.registrar_timeout(timeout)
+    if disjuntor_amazon.registrar_falha(motivo):
+        metricas.incrementar("celoland_disjuntor_aberturas_total")
+        logger.warning("disjuntor da Amazon aberto", extra={"campos": {
+            "motivo": motivo, "resfriamento": disjuntor_amazon.resfriamento}})
+
+
+# --- Hedge: segunda requisição quando a primeira demora mais que o p95 ---
+
+_executor_hedge = None
+_executor_hedge_pid = None
+_executor_hedge_lock = threading.Lock()
+
+
+def _obter_executor_hedge():
+    global _executor_hedge, _executor_hedge_pid
+    pid = os.getpid()
+    if _executor_hedge is None or _executor_hedge_pid != pid:
+        with _executor_hedge_lock:
+            if _executor_hedge is None or _executor_hedge_pid != pid:
+                _executor_hedge = ThreadPoolExecutor(max_workers=HTTP_POOL_MAX, thread_name_prefix="hedge")
+                _executor_hedge_pid = pid
+    return _executor_hedge
+
+
+def url_de_download(url):
+    """URL que é de fato baixada: com AMAZON_URL_BASE, os links da Amazon vão para esse servidor."""
+    if not AMAZON_URL_BASE:
+        return url
+    partes = urlsplit(url)
+    if not eh_host_amazon(partes.hostname or ""):
+        return url
+    return AMAZON_URL_BASE.rstrip("/") + urlunsplit(("", "", partes.path, partes.query, ""))
+
+
+def _get_amazon(url, timeout, saida=None):
+    """GET pela saída indicada (ou sorteada no pool); a resposta leva a saída em 'response.saida'."""
+    saida = saida or pool_saida.escolher()
+    proxies = {"http": saida.url_proxy, "https": saida.url_proxy} if saida.url_proxy else None
+    try:
+        response = obter_sessao(AMAZON_HOST).get(url_de_download(url), timeout=timeout, stream=True,
+                                                 headers=saida.cabecalhos, proxies=proxies)
+    except (requests.ConnectionError, requests.Timeout):
+        pool_saida.registrar(saida, FALHA)
+        raise
+    response.saida = saida
+    return response
+
+
+def _sondar_saida(saida):
+    """Sonda uma saída que saiu da quarentena: (SUCESSO, BLOQUEIO ou FALHA, segundos)."""
+    proxies = {"http": saida.url_proxy, "https": saida.url_proxy} if saida.url_proxy else None
+    try:
+        with obter_sessao(AMAZON_HOST).get(url_de_download(SAIDA_SONDA_URL), timeout=BUSCA_TIMEOUT_MAX,
+                                           stream=True, headers=saida.cabecalhos, proxies=proxies) as response:
+            inicio = next(response.iter_content(BLOQUEIO_BYTES_INICIO), b"")
+            segundos = response.elapsed.total_seconds()
+            if motivo_bloqueio_status(response.status_code) or motivo_bloqueio_inicio(inicio):
+                return BLOQUEIO, segundos
+            return (FALHA if response.status_code >= 500 else SUCESSO), segundos
+    except requests.RequestException:
+        return FALHA, None
+
+
+def _fechar_resposta(futuro):
+    if not futuro.cancelled() and futuro.exception() is None:
+        futuro.result().close()
+
+
+def _get_amazon_com_hedge(url, timeout):
+    """
+    GET na Amazon (stream=True). Com BUSCA_HEDGE, se os headers não chegam dentro do p95
+    observado, dispara uma segunda requisição e fica com a que responder primeiro.
+    """
+    atraso = timeout_amazon.p95
+    if not BUSCA_HEDGE or atraso is None:
+        return _get_amazon(url, timeout)
+
+    executor = _obter_executor_hedge()
+    saida = pool_saida.escolher()
+    primeira = executor.submit(_get_amazon, url, timeout, saida)
+    concluidas, _ = wait([primeira], timeout=atraso)
+    if concluidas:
+        return primeira.result()
+
+    # A segunda requisição sai por outro proxy e perfil, se houver
+    metricas.incrementar("celoland_amazon_hedge_total", resultado="disparada")
+    segunda = executor.submit(_get_amazon, url, timeout, pool_saida.escolher(excluir=saida))
+    pendentes = {primeira, segunda}
+    while pendentes:
+        concluidas, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+        vencedora = next((f for f in concluidas if f.exception() is None), None)
+        if vencedora is None:
+            continue
+        for futuro in concluidas | pendentes:
+            if futuro is not vencedora:
+                futuro.add_done_callback(_fechar_resposta)  # A perdedora é fechada quando terminar
+        if vencedora is segunda:
+            metricas.incrementar("celoland_amazon_hedge_total", resultado="vencedora")
+        return vencedora.result()
+    return primeira.result()  # As duas falharam: levanta o erro da primeira
+
+
+def validar_campos(url, campos):
+    """Resultado do scraping a partir dos campos extraídos; ScrapingFalhou se não forem válidos."""
+    titulo = campos["titulo"]
+    preco_atual = campos["preco_atual"]
+    preco_antigo = campos["preco_antigo"]
+    logger.debug("extração", extra={"campos": {"url": url, "nivel_titulo": campos["nivel_titulo"],
+                                               "nivel_preco": campos["nivel_preco"]}})
+
+    # Verifica se os dados essenciais foram encontrados e parecem válidos
+    # Deve ter título E o preço deve conter "R$" ou ser um valor numérico (para garantir que não seja texto vazio)
+    if titulo and preco_atual and (preco_atual.startswith('R$') or any(char.isdigit() for char in preco_atual)):
+        logger.debug("scraping sucesso", extra={"campos": {"url": url, "titulo": titulo, "preco": preco_atual}})
+        return {
+            "sucesso": True,
+            "titulo": titulo,
+            "preco_atual": preco_atual,
+            "preco_antigo": preco_antigo
+        }
+
+    # Se chegou aqui, os dados não foram encontrados ou estão em formato inesperado
+    raise ScrapingFalhou("Dados essenciais não encontrados na página (Scraping falhou).")
+
+
+def resultado_fallback(url, asin, erro):
+    """Registra a falha do scraping e retorna (resultado, origem) da simulação/falha."""
+    metricas.incrementar("celoland_amazon_erros_total", tipo=type(erro).__name__)
+    logger.warning("erro durante o scraping (voltando para a simulação)",
+                   extra={"campos": {"url": url, "erro": str(erro)}})
         
     # ----------------------------------------------------------------------
     # --- FIM DA LÓGICA DE WEB SCRAPING REAL (início da SIMULAÇÃO/FALLBACK) ---
     # ----------------------------------------------------------------------
 
-    # Tenta encontrar o ASIN (código do produto) na URL para simular diferentes respostas
-    asin_match = re.search(r'/[A-Z0-9]{10}(/|$|\?)', url)
-    
-    if not asin_match:
-        print("SIMULAÇÃO: ASIN não encontrado. Retornando falha.")
+    # Usa o ASIN (código do produto) da URL para simular diferentes respostas
+    if not asin:
+        logger.info("simulação: ASIN não encontrado, retornando falha", extra={"campos": {"url": url}})
         return {
             "sucesso": False,
             "titulo": "Título não encontrado via Scraping ou Simulação.",
             "preco_atual": None,
             "preco_antigo": None
-        }
+        }, "falha"
 
     # Se o scraping falhou (caiu no 'except' ou não encontrou os seletores),
     # ele usa a lógica de simulação/mock (os dados fixos) como um FALLBACK para testar.
-    print("SIMULAÇÃO: Retornando dados mockados como fallback.")
+    logger.info("simulação: retornando dados mockados como fallback", extra={"campos": {"url": url}})
     return {
         "sucesso": True,
         "titulo": f"PRODUTO MOCKADO (Link: {url[:30]}...)",
         "preco_atual": "R$ 349,99",
         "preco_antigo": "R$ 499,90"
-    }
+    }, "simulacao"
+
+# --- Busca em Lote (pool de threads limitado, com teto por host) ---
 
-def enviar_mensagem_telegram(mensagem, link_afiliado):
+_executor_lote = None
+_executor_lote_pid = None
+_semaforos_host = {}
+_lote_lock = threading.Lock()
+
+
+def _obter_executor_lote():
+    """Pool de threads do processo atual (criado sob demanda, recriado após fork)."""
+    global _executor_lote, _executor_lote_pid
+    pid = os.getpid()
+    if _executor_lote is None or _executor_lote_pid != pid:
+        with _lote_lock:
+            if _executor_lote is None or _executor_lote_pid != pid:
+                _executor_lote = ThreadPoolExecutor(max_workers=LOTE_MAX_THREADS, thread_name_prefix="busca-lote")
+                _executor_lote_pid = pid
+                _semaforos_host.clear()
+    return _executor_lote
+
+
+def _semaforo_host(host):
+    with _lote_lock:
+        semaforo = _semaforos_host.get(host)
+        if semaforo is None:
+            semaforo = threading.BoundedSemaphore(LOTE_MAX_POR_HOST)
+            _semaforos_host[host] = semaforo
+        return semaforo
+
+
+def _buscar_com_limite_host(url):
+    """Executa buscar_info_produto_com_origem respeitando o teto de requisições simultâneas do host."""
+    host = (urlparse(url).hostname or "").lower()
+    with _semaforo_host(host):
+        return buscar_info_produto_com_origem(url)
+
+
+def buscar_info_produtos_lote(urls):
+    """
+    Busca vários produtos em paralelo. Links repetidos (mesmo ASIN) são buscados
+    uma única vez. Retorna a lista de resultados na mesma ordem da entrada,
+    cada um no formato de buscar_info_produto_real (mais o campo "url").
     """
-    Tenta enviar a mensagem para o Telegram usando a API real.
+    executor = _obter_executor_lote()
+
+    # 1. Deduplicar pelo ASIN (ou pela URL quando não há ASIN)
+    futuros = {}
+    chaves = []
+    for url in urls:
+        if not isinstance(url, str) or not url.strip():
+            chaves.append(None)
+            continue
+        url = url.strip()
+        chave = extrair_asin(url) or url
+        chaves.append(chave)
+        if chave not in futuros:
+            futuros[chave] = executor.submit(_buscar_com_limite_host, url)
+
+    # 2. Montar os resultados na ordem original
+    resultados = []
+    for url, chave in zip(urls, chaves):
+        if chave is None:
+            resultados.append({"sucesso": False, "url": url, "erro": "Link inválido"})
+            continue
+        try:
+            resultado = dict(futuros[chave].result()["resultado"])
+        except Exception as e:
+            logger.warning("erro na busca em lote", extra={"campos": {"url": url, "erro": str(e)}})
+            resultado = {"sucesso": False, "titulo": None, "preco_atual": None, "preco_antigo": None, "erro": str(e)}
+        resultado["url"] = url
+        resultados.append(resultado)
+    return resultados
+
+
+def enviar_mensagem_telegram(mensagem, link_afiliado, chat_id=None):
+    """
+    Tenta enviar a mensagem para o Telegram usando a API real (de forma síncrona).
     Verifique se TELEGRAM_BOT_TOKEN e TELEGRAM_CHAT_ID estão configurados.
     """
+    return enviar_mensagem_telegram_detalhado(chat_id or TELEGRAM_CHAT_ID, mensagem, link_afiliado).ok
+
+
+def enviar_mensagem_telegram_detalhado(chat_id, mensagem, link_afiliado=None):
+    """
+    Envia a mensagem ao Telegram e retorna um ResultadoEnvio, com o 'retry_after'
+    das respostas 429 e se o erro é permanente (usado pela fila de envios).
+    """
     
     # 1. Checagem de Configuração (Se não estiver configurado, entra em modo de simulação)
-    if TELEGRAM_BOT_TOKEN == "SEU_TOKEN_BOT_AQUI" or TELEGRAM_CHAT_ID == "-SEU_CHAT_ID_AQUI":
-        print("\n--- AVISO: MODO DE SIMULAÇÃO ATIVADO ---")
-        print("Preencha TELEGRAM_BOT_TOKEN e TELEGRAM_CHAT_ID para envio REAL.")
-        print("Link de Afiliado (Final):", link_afiliado)
-        print("Conteúdo da Mensagem:\n", mensagem)
-        print("---------------------------------------\n")
-        return True # Retorna True para não falhar o frontend no modo de simulação
+    if TELEGRAM_BOT_TOKEN == "SEU_TOKEN_BOT_AQUI" or chat_id == "-SEU_CHAT_ID_AQUI":
+        logger.info("telegram em modo de simulação: preencha TELEGRAM_BOT_TOKEN e TELEGRAM_CHAT_ID para envio real",
+                    extra={"campos": {"link_afiliado": link_afiliado, "mensagem": mensagem}})
+        metricas.incrementar("celoland_telegram_envios_total", resultado="simulacao")
+        return ResultadoEnvio(True) # Sucesso para não falhar o frontend no modo de simulação
 
     # 2. Envio REAL para o Telegram
-    telegram_api_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+    telegram_api_url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {
-        "chat_id": TELEGRAM_CHAT_ID,
+        "chat_id": chat_id,
         "text": mensagem,
         "parse_mode": "Markdown" # Usa Markdown para negritos, itálicos, etc.
     }
     
-    print("\n--- TENTATIVA DE ENVIO REAL AO TELEGRAM ---")
-    print(f"Chat ID: {TELEGRAM_CHAT_ID}")
+    logger.debug("tentativa de envio real ao telegram", extra={"campos": {"chat_id": chat_id}})
     
     try:
-        response = requests.post(telegram_api_url, data=payload)
+        with metricas.medir("celoland_telegram_envio_segundos"):
+            response = obter_sessao(TELEGRAM_HOST).post(telegram_api_url, data=payload, timeout=20)
+
+        if response.status_code == 429:
+            # Limite de envio atingido: o Telegram informa quanto tempo esperar
+            try:
+                retry_after = response.json().get('parameters', {}).get('retry_after')
+            except ValueError:
+                retry_after = None
+            retry_after = retry_after or response.headers.get('Retry-After') or 1
+            metricas.incrementar("celoland_telegram_envios_total", resultado="limite")
+            logger.warning("limite do telegram (429)", extra={"campos": {"chat_id": chat_id, "retry_after": retry_after}})
+            return ResultadoEnvio(False, erro="HTTP 429 (limite de envio)", retry_after=float(retry_after))
+
         response.raise_for_status() # Lança erro para status 4xx/5xx
         
         resultado = response.json()
         if resultado.get('ok'):
-            print("ENVIO SUCESSO. Verifique o Telegram.")
-            return True
+            metricas.incrementar("celoland_telegram_envios_total", resultado="sucesso")
+            logger.info("envio ao telegram com sucesso", extra={"campos": {"chat_id": chat_id}})
+            return ResultadoEnvio(True)
         else:
-            print(f"FALHA NO ENVIO: {resultado.get('description', 'Erro desconhecido da API.')}")
-            return False
+            descricao = resultado.get('description', 'Erro desconhecido da API.')
+            metricas.incrementar("celoland_telegram_envios_total", resultado="falha")
+            logger.warning("falha no envio ao telegram", extra={"campos": {"chat_id": chat_id, "erro": descricao}})
+            return ResultadoEnvio(False, erro=descricao)
             
     except requests.exceptions.HTTPError as e:
-        print(f"ERRO HTTP ao enviar ao Telegram: {e.response.text}")
-        return False
+        metricas.incrementar("celoland_telegram_envios_total", resultado="erro_http")
+        logger.warning("erro http ao enviar ao telegram",
+                       extra={"campos": {"status": e.response.status_code, "erro": e.response.text[:500]}})
+        # Erros 4xx (token inválido, chat inexistente, Markdown inválido) não adianta repetir
+        permanente = 400 <= e.response.status_code < 500
+        return ResultadoEnvio(False, erro=f"HTTP {e.response.status_code}: {e.response.text[:200]}", permanente=permanente)
     except Exception as e:
-        print(f"ERRO GERAL ao enviar ao Telegram: {e}")
-        return False
+        metricas.incrementar("celoland_telegram_envios_total", resultado="erro")
+        logger.error("erro geral ao enviar ao telegram", extra={"campos": {"erro": str(e)}})
+        return ResultadoEnvio(False, erro=str(e))
+
+
+fila_telegram = FilaTelegram(FILA_TELEGRAM_DB, enviar_mensagem_telegram_detalhado)
+
+
+# --- Link de Afiliado e Mensagem da Oferta ---
+
+def _resolver_link_curto(link):
+    """Segue os redirecionamentos do link curto (HEAD, sem baixar páginas) até um link da Amazon."""
+    # Uma sessão só para todos os encurtadores (o pool dela separa as conexões por host)
+    sessao = obter_sessao(SESSAO_LINKS_CURTOS)
+    destino = link
+    for _ in range(5):
+        resposta = sessao.head(destino, allow_redirects=False, timeout=LINKS_CURTOS_TIMEOUT)
+        resposta.close()
+        local = resposta.headers.get("Location")
+        if not resposta.is_redirect or not local:
+            break
+        destino = urljoin(destino, local)
+        if not eh_link_curto(destino):
+            return destino
+    logger.warning("link curto não expandido", extra={"campos": {"link": link, "destino": destino}})
+    return None
+
+
+links_curtos = ExpansorLinksCurtos(_resolver_link_curto, LINKS_CURTOS_MAX_ITENS, LINKS_CURTOS_TTL)
+
+
+def asin_do_link(link):
+    """Como extrair_asin, mas expandindo links curtos (amzn.to, a.co) antes."""
+    if eh_link_curto(link):
+        link = links_curtos.expandir(link.strip()) or link
+    return extrair_asin(link)
+
+
+def montar_link_afiliado(link_original, tag_afiliado):
+    """
+    Retorna o link canônico com a tag de afiliado (https://www.amazon.com.br/dp/<ASIN>?tag=...),
+    expandindo links curtos. Links sem ASIN só têm a tag trocada (ver links_amazon.py).
+    Retorna None se 'link_original' não for um link.
+    """
+    return montar_link_canonico(link_original, tag_afiliado, expandir=links_curtos.expandir)
+
+
+def enfileirar_oferta(chat_id, mensagem, link_afiliado, preco_por=None, cupom=None, forcar=False):
+    """
+    Coloca a oferta na fila do Telegram sem repetir a mesma oferta (produto, preço, cupom e
+    chat) dentro de OFERTAS_JANELA_REPETICAO. Retorna (id do envio, ação); numa repetição
+    o id é o do envio original (ver FilaTelegram.enfileirar_oferta).
+    """
+    if OFERTAS_JANELA_REPETICAO <= 0:
+        return fila_telegram.enfileirar(chat_id, mensagem, link_afiliado), OFERTA_ENFILEIRADA
+    impressao = impressao_oferta(chat_id, link_afiliado, preco_por, cupom)
+    id_envio, acao = fila_telegram.enfileirar_oferta(chat_id, mensagem, link_afiliado, impressao,
+                                                     OFERTAS_JANELA_REPETICAO, forcar=forcar)
+    if acao != OFERTA_ENFILEIRADA:
+        metricas.incrementar("celoland_ofertas_repetidas_total", acao=acao)
+        logger.info("oferta repetida não enfileirada", extra={"campos": {
+            "acao": acao, "id_envio": id_envio, "link_afiliado": link_afiliado, "preco_por": preco_por}})
+    return id_envio, acao
+
+
+# --- Importação em massa de listas de ofertas (CSV/JSONL) ---
+
+importador_ofertas = ImportadorOfertas(
+    _buscar_com_limite_host, montar_link_afiliado, montar_mensagem_oferta, enfileirar_oferta,
+    asin_do_link, _obter_executor_lote, janela=LOTE_MAX_THREADS,
+)
+
+
+# --- Monitor de Preços (lista de produtos vigiados) ---
+
+def _oferta_monitorada(monitorado, resultado):
+    """Chamada pelo monitor quando o preço de um produto vigiado cruza o alvo."""
+    link_afiliado = montar_link_afiliado(monitorado["url"], monitorado["tag_afiliado"]) or montar_link_canonico(
+        f"https://{AMAZON_HOST}/dp/{monitorado['asin']}", monitorado["tag_afiliado"])
+    mensagem = montar_mensagem_oferta(
+        resultado["titulo"], link_afiliado,
+        preco_de=resultado.get("preco_antigo"),
+        preco_por=resultado.get("preco_atual"),
+    )
+    enfileirar_oferta(TELEGRAM_CHAT_ID, mensagem, link_afiliado, preco_por=resultado.get("preco_atual"))
+
+
+monitor_precos = MonitorPrecos(MONITOR_DB, buscar_info_produto_com_origem, _oferta_monitorada,
+                               max_threads=MONITOR_MAX_THREADS)
 
 
 # --- Endpoints da API ---
 
+@app.before_request
+def iniciar_fila_telegram():
+    """Garante as threads da fila e do monitor em cada worker (trabalho pendente é retomado após um restart)."""
+    fila_telegram.iniciar()
+    if MONITOR_ATIVO:
+        monitor_precos.iniciar()
+
 @app.route('/api/teste-conexao', methods=['GET'])
 def teste_conexao():
     """Endpoint para verificar se o servidor está rodando."""
     return jsonify({"ok": True, "mensagem": "Conexão Flask OK!"})
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Endpoint de métricas no formato de texto do Prometheus (somadas entre os workers)."""
+    return Response(metricas.texto_prometheus(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route('/api/cache-produtos', methods=['GET'])
+def estatisticas_cache_produtos():
+    """Endpoint com os contadores do cache de produtos (hits, misses, despejos)."""
+    return jsonify(cache_produtos.estatisticas())
+
+@app.route('/api/resultados-compartilhados', methods=['GET'])
+def estatisticas_resultados_compartilhados():
+    """Endpoint com o armazém de resultados compartilhado entre os workers (contadores deste worker)."""
+    if resultados_compartilhados is None:
+        return jsonify({"ativo": False})
+    return jsonify({"ativo": True, **resultados_compartilhados.estatisticas()})
+
+@app.route('/api/coalescencia', methods=['GET'])
+def estatisticas_coalescencia():
+    """Endpoint com quantas buscas foram executadas e quantas foram coalescidas."""
+    return jsonify(busca_unica.estatisticas())
+
+@app.route('/api/download', methods=['GET'])
+def estatisticas_download_paginas():
+    """Endpoint com os bytes recebidos e economizados pelo download em streaming."""
+    return jsonify(estatisticas_download())
+
+@app.route('/api/extracao', methods=['GET'])
+def estatisticas_extracao():
+    """Endpoint com quantas vezes cada nível de fallback dos seletores foi usado."""
+    return jsonify(estatisticas_niveis())
+
+@app.route('/api/acervo', methods=['GET'])
+def estatisticas_acervo():
+    """Endpoint com o tamanho do acervo de páginas e a fila de gravação deste worker."""
+    if acervo_paginas is None:
+        return jsonify({"ativo": False})
+    return jsonify({"ativo": True, **acervo_paginas.estatisticas()})
+
+@app.route('/api/disjuntor', methods=['GET'])
+def estado_disjuntor():
+    """Endpoint com o estado do disjuntor e do timeout adaptativo da Amazon neste worker."""
+    return jsonify({"pid": os.getpid(), "disjuntor": disjuntor_amazon.estatisticas(),
+                    "timeout": timeout_amazon.estatisticas(), "hedge_ativo": BUSCA_HEDGE})
+
+@app.route('/api/pool-saida', methods=['GET'])
+def estado_pool_saida():
+    """Endpoint com a saúde de cada proxy e perfil de cabeçalhos do pool de saída deste worker."""
+    return jsonify(pool_saida.estatisticas())
+
+@app.route('/api/sessoes-http', methods=['GET'])
+def estatisticas_sessoes_http():
+    """Endpoint com o reaproveitamento de conexões das sessões HTTP deste worker."""
+    return jsonify(estatisticas_sessoes())
+
 @app.route('/api/buscar-produto', methods=['POST'])
 def buscar_produto():
     """Endpoint para buscar informações do produto dado um link da Amazon."""
@@ -206,9 +1105,46 @@ def buscar_produto():
     
     return jsonify(resultado)
 
+@app.route('/api/buscar-produtos', methods=['POST'])
+def buscar_produtos():
+    """Endpoint para buscar vários produtos de uma vez (lista de links da Amazon)."""
+    data = request.get_json(silent=True) or {}
+    links = data.get('urls')
+
+    if not isinstance(links, list) or not links:
+        return jsonify({"sucesso": False, "erro": "Lista de links da Amazon ('urls') é obrigatória"}), 400
+    if len(links) > LOTE_MAX_LINKS:
+        return jsonify({"sucesso": False, "erro": f"Máximo de {LOTE_MAX_LINKS} links por requisição"}), 400
+
+    resultados = buscar_info_produtos_lote(links)
+    return jsonify({"sucesso": True, "resultados": resultados})
+
+@app.route('/api/links-afiliado', methods=['POST'])
+def links_afiliado():
+    """
+    Endpoint para reescrever uma lista de links com a tag de afiliado (sem buscar os produtos).
+    Cada link vira o canônico /dp/<ASIN>?tag=...; links curtos são expandidos (com cache).
+    """
+    data = request.get_json(silent=True) or {}
+    links = data.get('links')
+    tag_afiliado = data.get('tag_afiliado')
+
+    if not isinstance(links, list) or not links or not tag_afiliado:
+        return jsonify({"sucesso": False, "erro": "Lista de links ('links') e Tag são obrigatórias"}), 400
+    if len(links) > LINKS_MAX_LOTE:
+        return jsonify({"sucesso": False, "erro": f"Máximo de {LINKS_MAX_LOTE} links por requisição"}), 400
+
+    resultados, resumo = reescrever_links(links, tag_afiliado, links_curtos, _obter_executor_lote())
+    return jsonify({"sucesso": True, "resultados": resultados, "resumo": resumo})
+
+@app.route('/api/links-curtos', methods=['GET'])
+def estatisticas_links_curtos():
+    """Endpoint com as estatísticas do cache de expansão de links curtos deste worker."""
+    return jsonify(links_curtos.estatisticas())
+
 @app.route('/api/enviar-telegram', methods=['POST'])
 def enviar_telegram():
-    """Endpoint para formatar a mensagem e simular o envio ao Telegram."""
+    """Endpoint para formatar a mensagem e colocá-la na fila de envio ao Telegram."""
     dados = request.get_json()
     
     # 1. Validar dados
@@ -220,53 +1156,141 @@ def enviar_telegram():
         return jsonify({"sucesso": False, "erro": "Nome, Link e Tag são obrigatórios"}), 400
 
     # 2. Construir o Link de Afiliado (Lógica Crítica)
-    # A maneira mais segura de adicionar a tag é substituir qualquer tag existente ou adicionar
-    # no final se for um link "limpo" (sem query parameters).
-    link_afiliado = link_original
-    tag_param = f"tag={tag_afiliado}"
-    
-    # Remove qualquer tag existente (ex: tag=velha-20)
-    link_afiliado = re.sub(r'([?&])tag=[^&]*', r'\1', link_afiliado)
-
-    # Adiciona a nova tag
-    if '?' in link_afiliado:
-        # Se já tem query params, adiciona com '&'
-        if not link_afiliado.endswith(('?', '&')):
-             link_afiliado += '&'
-        link_afiliado += tag_param
-    else:
-        # Se não tem, adiciona com '?'
-        link_afiliado += '?' + tag_param
-        
-    # Limpa possíveis duplos '?' ou '&'
-    link_afiliado = link_afiliado.replace('?&', '?').replace('&&', '&')
-    
+    link_afiliado = montar_link_afiliado(link_original, tag_afiliado)
+    if link_afiliado is None:
+        return jsonify({"sucesso": False, "erro": "Link inválido"}), 400
 
     # 3. Formatar a Mensagem do Telegram
-    mensagem = f"🚨 *OFERTA EXCLUSIVA* 🚨\n\n"
-    mensagem += f"🎁 *{nome}*\n\n"
+    mensagem = montar_mensagem_oferta(
+        nome, link_afiliado,
+        preco_de=dados.get('preco_de'),
+        preco_por=dados.get('preco_por'),
+        cupom=dados.get('cupom'),
+        descricao=dados.get('descricao'),
+    )
     
-    if dados.get('preco_de'):
-        mensagem += f"❌ DE: ~{dados['preco_de']}~\n" # Usando ~ para riscar (strikethrough) em Markdown
-    if dados.get('preco_por'):
-        mensagem += f"🔥 POR: *{dados['preco_por']}*\n" # Usando * para negrito em Markdown
-        
-    if dados.get('cupom'):
-        mensagem += f"\n🏷️ *Cupom*: `{dados['cupom']}`\n" # Usando ` para código
-        
-    if dados.get('descricao'):
-        mensagem += f"\n📝 _{dados['descricao']}_\n" # Usando _ para itálico
-        
-    mensagem += f"\n🔗 [Link para Amazon]({link_afiliado})" # Link formatado para o Telegram
-    
-    # 4. Tentar Envio REAL
-    if enviar_mensagem_telegram(mensagem, link_afiliado):
-        return jsonify({"sucesso": True, "mensagem": "Mensagem enviada com sucesso! Verifique seu Telegram."})
-    else:
-        return jsonify({"sucesso": False, "erro": "Falha no envio para o Telegram. Verifique seu Token e Chat ID."}), 500
+    # 4. Colocar na fila de envio (a thread da fila envia respeitando os limites do Telegram),
+    #    a menos que a mesma oferta já tenha sido enfileirada dentro da janela ('forcar' ignora)
+    try:
+        id_envio, acao = enfileirar_oferta(TELEGRAM_CHAT_ID, mensagem, link_afiliado,
+                                           preco_por=dados.get('preco_por'), cupom=dados.get('cupom'),
+                                           forcar=dados.get('forcar') is True)
+    except Exception:
+        logger.exception("erro ao colocar o envio na fila")
+        return jsonify({"sucesso": False, "erro": "Falha ao colocar a mensagem na fila de envio."}), 500
+
+    if acao != OFERTA_ENFILEIRADA:
+        explicacao = ("a mensagem nova substituiu a que ainda estava na fila" if acao == OFERTA_AGRUPADA
+                      else "não será enviada de novo")
+        return jsonify({
+            "sucesso": True,
+            "id_envio": id_envio,
+            "status": "repetida",
+            "acao": acao,
+            "mensagem": f"Mesma oferta (produto, preço e cupom) já enfileirada na última janela: {explicacao}. "
+                        "Use 'forcar': true para enviar mesmo assim. Envio original: /api/envios-telegram/" + id_envio
+        }), 200
+
+    return jsonify({
+        "sucesso": True,
+        "id_envio": id_envio,
+        "status": "pendente",
+        "acao": acao,
+        "mensagem": "Mensagem na fila de envio. Consulte o status em /api/envios-telegram/" + id_envio
+    }), 202
+
+@app.route('/api/importar-ofertas', methods=['POST'])
+def importar_ofertas():
+    """
+    Endpoint de importação em massa: o corpo é o arquivo CSV/JSONL (não multipart) e a resposta
+    é NDJSON, uma linha por oferta assim que ela fica pronta, e o resumo no final.
+    Parâmetros: tag_afiliado, formato (csv/jsonl, padrão: detectar) e simular=1 (não enfileira).
+    Ex: curl --data-binary @ofertas.csv 'http://127.0.0.1:5000/api/importar-ofertas?tag_afiliado=x-20'
+    """
+    formato = request.args.get('formato') or None
+    if formato not in (None, 'csv', 'jsonl'):
+        return jsonify({"sucesso": False, "erro": "Formato deve ser 'csv' ou 'jsonl'"}), 400
+
+    # O corpo é lido aos poucos, conforme as linhas são processadas
+    arquivo = abrir_texto(request.stream)
+    resultados = importador_ofertas.importar(arquivo, TELEGRAM_CHAT_ID, request.args.get('tag_afiliado'),
+                                             formato, simular=request.args.get('simular') == '1')
+    linhas = (json.dumps(resultado, ensure_ascii=False) + "\n" for resultado in resultados)
+    return Response(stream_with_context(linhas), mimetype='application/x-ndjson')
+
+@app.route('/api/envios-telegram/<id_envio>', methods=['GET'])
+def status_envio_telegram(id_envio):
+    """Endpoint para consultar o que aconteceu com um envio da fila do Telegram."""
+    envio = fila_telegram.consultar(id_envio)
+    if envio is None:
+        return jsonify({"sucesso": False, "erro": "Envio não encontrado"}), 404
+    return jsonify({"sucesso": True, **envio})
+
+@app.route('/api/envios-telegram', methods=['GET'])
+def estatisticas_envios_telegram():
+    """Endpoint com a quantidade de envios por status na fila do Telegram."""
+    return jsonify(fila_telegram.estatisticas())
+
+@app.route('/api/ofertas-repetidas', methods=['GET'])
+def estatisticas_ofertas_repetidas():
+    """
+    Endpoint com as ofertas repetidas que não viraram envio (somadas entre os workers) e o
+    cache de mensagens montadas deste worker.
+    """
+    return jsonify({
+        "ativo": OFERTAS_JANELA_REPETICAO > 0,
+        "janela_segundos": OFERTAS_JANELA_REPETICAO,
+        **fila_telegram.estatisticas_ofertas(),
+        "cache_mensagens": estatisticas_mensagens(),
+    })
+
+@app.route('/api/monitorados', methods=['POST'])
+def adicionar_monitorado():
+    """Endpoint para vigiar um produto: avisa no Telegram quando o preço chegar ao alvo."""
+    dados = request.get_json(silent=True) or {}
+    link = dados.get('url')
+    tag_afiliado = dados.get('tag_afiliado')
+    preco_alvo = preco_para_centavos(dados.get('preco_alvo'))
+
+    if not all([link, tag_afiliado]) or preco_alvo is None:
+        return jsonify({"sucesso": False, "erro": "Link, Tag e Preço alvo são obrigatórios"}), 400
+    asin = asin_do_link(link)
+    if not asin:
+        return jsonify({"sucesso": False, "erro": "ASIN não encontrado no link"}), 400
+    try:
+        intervalo = int(dados.get('intervalo') or INTERVALO_PADRAO)
+    except (TypeError, ValueError):
+        return jsonify({"sucesso": False, "erro": "Intervalo inválido"}), 400
+
+    monitor_precos.adicionar(asin, link, tag_afiliado, preco_alvo, intervalo)
+    return jsonify({"sucesso": True, "asin": asin, "preco_alvo": centavos_para_preco(preco_alvo)})
+
+@app.route('/api/monitorados', methods=['GET'])
+def listar_monitorados():
+    """Endpoint com os produtos vigiados (paginado por 'limite' e 'deslocamento')."""
+    limite = min(request.args.get('limite', 100, type=int), 1000)
+    deslocamento = request.args.get('deslocamento', 0, type=int)
+    return jsonify({
+        "sucesso": True,
+        "monitorados": monitor_precos.listar(limite, deslocamento),
+        "estatisticas": monitor_precos.estatisticas(),
+    })
+
+@app.route('/api/monitorados/<asin>', methods=['DELETE'])
+def remover_monitorado(asin):
+    """Endpoint para parar de vigiar um produto."""
+    if not monitor_precos.remover(asin):
+        return jsonify({"sucesso": False, "erro": "Produto não está sendo monitorado"}), 404
+    return jsonify({"sucesso": True})
+
+@app.route('/api/monitorados/<asin>/historico', methods=['GET'])
+def historico_monitorado(asin):
+    """Endpoint com o histórico de mudanças de preço do produto (em centavos)."""
+    desde = request.args.get('desde', 0, type=int)
+    return jsonify({"sucesso": True, "asin": asin, "historico": monitor_precos.historico(asin, desde)})
 
 # 5. Inicialização do Servidor
 if __name__ == '__main__':
-    print("Servidor Flask inicializado. Acesse http://127.0.0.1:5000/")
+    logger.info("Servidor Flask inicializado. Acesse http://127.0.0.1:5000/")
     # Garante que o servidor seja acessível externamente (necessário para alguns ambientes)
     app.run(debug=True, host='0.0.0.0')
@@ -0,0 +1,146 @@
+"""
+Servidores falsos dos testes de carga (benchmarks.carga e benchmarks.carga_async): uma
+Amazon e um Telegram locais, para o app não tocar nos serviços reais.
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import threading
+import time
+from urllib.parse import parse_qs
+
+DIRETORIO_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+TOKEN_FALSO = "0000:teste-de-carga"
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def resposta_http(status, tipo, corpo):
+    motivo = {200: "OK", 404: "Not Found", 429: "Too Many Requests"}.get(status, "OK")
+    return (f"HTTP/1.1 {status} {motivo}\r\nContent-Type: {tipo}\r\n"
+            f"Content-Length: {len(corpo)}\r\n\r\n").encode() + corpo
+
+
+class ServidorFalso:
+    """Servidor HTTP/1.1 mínimo (keep-alive) em asyncio, numa thread própria."""
+
+    def __init__(self):
+        self.porta = porta_livre()
+        self.contadores = {}
+        self._lock = threading.Lock()
+
+    def contar(self, nome):
+        with self._lock:
+            self.contadores[nome] = self.contadores.get(nome, 0) + 1
+
+    async def responder(self, metodo, caminho, corpo):
+        raise NotImplementedError
+
+    async def _atender(self, leitor, escritor):
+        try:
+            while True:
+                cabecalho = await leitor.readuntil(b"\r\n\r\n")
+                linhas = cabecalho.decode("latin-1").split("\r\n")
+                metodo, caminho, _ = linhas[0].split(" ", 2)
+                tamanho = 0
+                for linha in linhas[1:]:
+                    if linha.lower().startswith("content-length:"):
+                        tamanho = int(linha.split(":", 1)[1])
+                corpo = await leitor.readexactly(tamanho) if tamanho else b""
+                escritor.write(await self.responder(metodo, caminho, corpo))
+                await escritor.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            escritor.close()
+
+    def iniciar(self):
+        async def servir():
+            servidor = await asyncio.start_server(self._atender, "127.0.0.1", self.porta, backlog=2048)
+            async with servidor:
+                await servidor.serve_forever()
+
+        threading.Thread(target=lambda: asyncio.run(servir()), daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.porta}"
+
+
+class AmazonFalsa(ServidorFalso):
+    """Páginas de produto do corpus, com atraso (atraso ± variacao) e uma fração de captchas."""
+
+    def __init__(self, atraso, variacao, fracao_captcha):
+        super().__init__()
+        self.atraso = atraso
+        self.variacao = variacao
+        self.fracao_captcha = fracao_captcha
+        with open(os.path.join(DIRETORIO_CORPUS, "esperado.json"), encoding="utf-8") as f:
+            esperado = json.load(f)
+        self.variantes = []
+        for nome in sorted(esperado):
+            if esperado[nome].get("origem") == "amazon":
+                with open(os.path.join(DIRETORIO_CORPUS, nome + ".html"), "rb") as f:
+                    self.variantes.append(resposta_http(200, "text/html; charset=utf-8", f.read()))
+        with open(os.path.join(DIRETORIO_CORPUS, "captcha.html"), "rb") as f:
+            self.captcha = resposta_http(200, "text/html; charset=utf-8", f.read())
+        self.nao_encontrado = resposta_http(404, "text/plain", b"nao encontrado")
+
+    async def responder(self, metodo, caminho, corpo):
+        atraso = self.atraso + random.uniform(-self.variacao, self.variacao)
+        if atraso > 0:
+            await asyncio.sleep(atraso)
+        if "/dp/" not in caminho:
+            self.contar("nao_encontrado")
+            return self.nao_encontrado
+        if random.random() < self.fracao_captcha:
+            self.contar("captcha")
+            return self.captcha
+        self.contar("paginas")
+        asin = caminho.split("/dp/", 1)[1][:10]
+        return self.variantes[hash(asin) % len(self.variantes)]
+
+
+class TelegramFalso(ServidorFalso):
+    """sendMessage com limite de mensagens por segundo (429 + retry_after acima dele)."""
+
+    def __init__(self, atraso, limite_por_segundo, fracao_429, retry_after):
+        super().__init__()
+        self.atraso = atraso
+        self.limite_por_segundo = limite_por_segundo
+        self.fracao_429 = fracao_429
+        self.retry_after = retry_after
+        self._segundo = 0
+        self._no_segundo = 0
+        self.mensagens = set()
+
+    async def responder(self, metodo, caminho, corpo):
+        if self.atraso > 0:
+            await asyncio.sleep(self.atraso)
+        if metodo != "POST" or not caminho.endswith("/sendMessage") or f"/bot{TOKEN_FALSO}/" not in caminho:
+            self.contar("nao_encontrado")
+            return resposta_http(404, "application/json", b'{"ok":false,"error_code":404,"description":"Not Found"}')
+
+        agora = int(time.time())
+        if agora != self._segundo:
+            self._segundo, self._no_segundo = agora, 0
+        self._no_segundo += 1
+        if (self.limite_por_segundo and self._no_segundo > self.limite_por_segundo) or random.random() < self.fracao_429:
+            self.contar("limite_429")
+            retorno = {"ok": False, "error_code": 429, "parameters": {"retry_after": self.retry_after},
+                       "description": f"Too Many Requests: retry after {self.retry_after}"}
+            return resposta_http(429, "application/json", json.dumps(retorno).encode())
+
+        dados = parse_qs(corpo.decode("utf-8"))
+        self.contar("entregues")
+        self.mensagens.add(dados.get("text", [""])[0])
+        retorno = {"ok": True, "result": {"message_id": len(self.mensagens), "chat": {"id": dados.get("chat_id")}}}
+        return resposta_http(200, "application/json", json.dumps(retorno).encode())
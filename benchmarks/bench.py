@@ -0,0 +1,276 @@
+"""
+Benchmarks offline do app (sem acesso à rede).
+
+Mede:
+  - extração: buscar_info_produto_real sobre as páginas salvas em benchmarks/corpus
+    (a sessão HTTP é trocada por uma que devolve o arquivo; o cache é limpo a cada busca);
+  - link de afiliado e mensagem: vazão de montar_link_afiliado (um a um e em lote) e montar_mensagem_oferta;
+  - ponta a ponta: latência de /api/buscar-produto e /api/enviar-telegram pelo test client do Flask.
+
+Cada página do corpus também é conferida contra benchmarks/corpus/esperado.json.
+
+Uso (na raiz do repositório):
+    python -m benchmarks.bench --saida resultados.json
+    python -m benchmarks.bench --saida novo.json --comparar resultados.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_CORPUS = os.path.join(DIRETORIO, "corpus")
+
+# O app lê a configuração na importação: bancos temporários e nada rodando em segundo plano
+_TEMPORARIO = tempfile.mkdtemp(prefix="celoland_bench_")
+os.environ.setdefault("FILA_TELEGRAM_DB", os.path.join(_TEMPORARIO, "fila_telegram.db"))
+os.environ.setdefault("MONITOR_DB", os.path.join(_TEMPORARIO, "monitor_precos.db"))
+os.environ.setdefault("MONITOR_ATIVO", "0")
+os.environ.setdefault("COALESCENCIA_DIR", "")
+os.environ.setdefault("METRICAS_DIR", "")
+os.environ.setdefault("ACERVO_DIR", "")
+# As medições "sem cache" limpam o cache em memória; o armazém compartilhado responderia no lugar dele
+os.environ.setdefault("RESULTADOS_DB", "")
+# O app registra cada busca/envio nos logs; durante as medições isso só atrapalha
+os.environ.setdefault("LOG_NIVEL", "ERROR")
+# A página de captcha é buscada repetidas vezes: com o disjuntor ligado as outras páginas nem seriam baixadas
+os.environ.setdefault("DISJUNTOR_LIMITE", "0")
+
+import requests  # noqa: E402
+from urllib3.response import HTTPResponse  # noqa: E402
+
+import app  # noqa: E402
+from precos import preco_para_centavos  # noqa: E402
+
+
+class SessaoCorpus:
+    """Substitui a sessão HTTP: responde com o HTML do corpus correspondente à URL."""
+
+    def __init__(self, paginas):
+        self.paginas = paginas
+
+    def get(self, url, **kwargs):
+        nome = url.rsplit("/", 1)[-1]
+        corpo = self.paginas[nome]
+        resposta = requests.Response()
+        resposta.status_code = 200
+        resposta.url = url
+        resposta.headers["Content-Type"] = "text/html;charset=UTF-8"
+        resposta.headers["Content-Length"] = str(len(corpo))
+        resposta.raw = HTTPResponse(body=io.BytesIO(corpo), preload_content=False,
+                                    headers={"Content-Length": str(len(corpo))})
+        return resposta
+
+
+def carregar_corpus():
+    paginas = {}
+    for arquivo in sorted(os.listdir(DIRETORIO_CORPUS)):
+        if arquivo.endswith(".html"):
+            with open(os.path.join(DIRETORIO_CORPUS, arquivo), "rb") as f:
+                paginas[arquivo[:-len(".html")]] = f.read()
+    with open(os.path.join(DIRETORIO_CORPUS, "esperado.json"), encoding="utf-8") as f:
+        esperado = json.load(f)
+    return paginas, esperado
+
+
+def url_do_corpus(indice, nome):
+    # ASIN diferente por página para não haver coalescência/cache entre elas
+    return f"https://www.amazon.com.br/dp/B0BENCH{indice:03d}/{nome}"
+
+
+def medir(funcao, iteracoes, aquecimento=3):
+    """Executa funcao() e retorna as estatísticas de tempo (em milissegundos)."""
+    for _ in range(aquecimento):
+        funcao()
+    tempos = []
+    for _ in range(iteracoes):
+        inicio = time.perf_counter_ns()
+        funcao()
+        tempos.append((time.perf_counter_ns() - inicio) / 1e6)
+    tempos.sort()
+    return {
+        "iteracoes": iteracoes,
+        "media_ms": round(statistics.fmean(tempos), 4),
+        "mediana_ms": round(statistics.median(tempos), 4),
+        "p95_ms": round(tempos[min(int(len(tempos) * 0.95), len(tempos) - 1)], 4),
+        "min_ms": round(tempos[0], 4),
+    }
+
+
+def medir_vazao(funcao, itens, repeticoes):
+    """Executa funcao(item) para todos os itens, 'repeticoes' vezes; retorna operações por segundo."""
+    for item in itens[:100]:
+        funcao(item)
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for item in itens:
+            funcao(item)
+    duracao = time.perf_counter() - inicio
+    total = len(itens) * repeticoes
+    return {"operacoes": total, "segundos": round(duracao, 4), "ops_por_segundo": round(total / duracao, 1)}
+
+
+def bench_extracao(paginas, esperado, iteracoes):
+    resultados = {}
+    erros = []
+    for indice, nome in enumerate(paginas):
+        url = url_do_corpus(indice, nome)
+
+        def buscar():
+            app.cache_produtos.limpar()
+            return app.buscar_info_produto_real(url)
+
+        resultado = buscar()
+        erros.extend(conferir(nome, resultado, esperado.get(nome)))
+        estatisticas = medir(buscar, iteracoes)
+        estatisticas["bytes"] = len(paginas[nome])
+        resultados["extracao/" + nome] = estatisticas
+    return resultados, erros
+
+
+def conferir(nome, resultado, esperado):
+    if esperado is None:
+        return [f"{nome}: sem entrada em esperado.json"]
+    if esperado["origem"] == "simulacao":
+        if not resultado["titulo"].startswith("PRODUTO MOCKADO"):
+            return [f"{nome}: esperava a simulação, veio {resultado['titulo']!r}"]
+        return []
+    erros = []
+    for campo in ("titulo", "preco_atual", "preco_antigo"):
+        if resultado.get(campo) != esperado[campo]:
+            erros.append(f"{nome}: {campo} = {resultado.get(campo)!r}, esperado {esperado[campo]!r}")
+    # O preço extraído precisa virar os centavos certos (histórico e alertas do monitor de preços)
+    centavos = preco_para_centavos(resultado.get("preco_atual"))
+    if centavos != esperado["preco_atual_centavos"]:
+        erros.append(f"{nome}: preco_atual em centavos = {centavos!r}, esperado {esperado['preco_atual_centavos']!r}")
+    return erros
+
+
+def bench_link_e_mensagem(repeticoes):
+    links = []
+    for i in range(1000):
+        asin = f"B0{i:08d}"
+        links.append([
+            f"https://www.amazon.com.br/dp/{asin}",
+            f"https://www.amazon.com.br/Produto-Qualquer/dp/{asin}/ref=sr_1_{i}?keywords=x&qid=1700000000&sr=8-{i}",
+            f"https://www.amazon.com.br/dp/{asin}?tag=antiga-20&psc=1",
+            f"https://www.amazon.com.br/gp/product/{asin}?th=1&tag=outra-21&linkCode=ll1",
+        ][i % 4])
+
+    resultados = {
+        "link_afiliado": medir_vazao(lambda link: app.montar_link_afiliado(link, "celoland-20"), links, repeticoes),
+    }
+    # Em lote (/api/links-afiliado): uma chamada com os 1000 links, contando cada link como uma operação
+    lote = medir_vazao(lambda lista: app.reescrever_links(lista, "celoland-20"), [links], repeticoes)
+    lote["operacoes"] *= len(links)
+    lote["ops_por_segundo"] = round(lote["ops_por_segundo"] * len(links), 1)
+    resultados["link_afiliado_lote"] = lote
+    ofertas = [
+        (f"Produto em oferta número {i}", app.montar_link_afiliado(link, "celoland-20"),
+         "R$ 499,90", "R$ 349,99", "CUPOM10" if i % 2 else None, "Menor preço histórico!" if i % 3 else None)
+        for i, link in enumerate(links)
+    ]
+    resultados["mensagem_oferta"] = medir_vazao(lambda oferta: app.montar_mensagem_oferta(*oferta), ofertas, repeticoes)
+    return resultados
+
+
+def bench_ponta_a_ponta(paginas, iteracoes):
+    cliente = app.app.test_client()
+    nomes = list(paginas)
+    nome = "offscreen_com_riscado" if "offscreen_com_riscado" in paginas else nomes[0]
+    url = url_do_corpus(nomes.index(nome), nome)
+    resultados = {}
+
+    def buscar_sem_cache():
+        app.cache_produtos.limpar()
+        resposta = cliente.post("/api/buscar-produto", json={"url": url})
+        assert resposta.status_code == 200
+
+    def buscar_com_cache():
+        resposta = cliente.post("/api/buscar-produto", json={"url": url})
+        assert resposta.status_code == 200
+
+    oferta = {
+        "nome": "Echo Dot 5ª geração", "link": url, "tag_afiliado": "celoland-20",
+        "preco_de": "R$ 399,00", "preco_por": "R$ 284,05", "cupom": "ALEXA10", "descricao": "Menor preço!",
+    }
+
+    def enviar_telegram():
+        resposta = cliente.post("/api/enviar-telegram", json=oferta)
+        assert resposta.status_code in (200, 202)
+
+    resultados["http/buscar-produto (sem cache)"] = medir(buscar_sem_cache, iteracoes)
+    resultados["http/buscar-produto (cache)"] = medir(buscar_com_cache, iteracoes)
+    resultados["http/enviar-telegram"] = medir(enviar_telegram, iteracoes)
+    return resultados
+
+
+def comparar(atual, anterior):
+    """Imprime a variação de cada benchmark em relação a uma execução anterior."""
+    print("\nComparação com a execução anterior (negativo = mais rápido):")
+    for nome, valores in atual["resultados"].items():
+        antigo = anterior.get("resultados", {}).get(nome)
+        if not antigo:
+            print(f"  {nome:45s} (novo)")
+            continue
+        if "mediana_ms" in valores:
+            variacao = (valores["mediana_ms"] - antigo["mediana_ms"]) / antigo["mediana_ms"] * 100
+            print(f"  {nome:45s} {antigo['mediana_ms']:10.3f} ms -> {valores['mediana_ms']:10.3f} ms ({variacao:+.1f}%)")
+        else:
+            variacao = (antigo["ops_por_segundo"] - valores["ops_por_segundo"]) / antigo["ops_por_segundo"] * 100
+            print(f"  {nome:45s} {antigo['ops_por_segundo']:10.0f}/s -> {valores['ops_por_segundo']:10.0f}/s "
+                  f"({variacao:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks offline do app.")
+    parser.add_argument("--saida", help="Arquivo JSON com os resultados")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--iteracoes", type=int, default=30, help="Iterações por benchmark de latência")
+    parser.add_argument("--repeticoes", type=int, default=20, help="Repetições dos benchmarks de vazão")
+    args = parser.parse_args(argv)
+
+    paginas, esperado = carregar_corpus()
+    sessao = SessaoCorpus({url_do_corpus(i, nome).rsplit("/", 1)[-1]: corpo
+                           for i, (nome, corpo) in enumerate(paginas.items())})
+    app.obter_sessao = lambda host: sessao
+
+    resultados = {}
+    extracao, erros = bench_extracao(paginas, esperado, args.iteracoes)
+    resultados.update(extracao)
+    resultados.update(bench_link_e_mensagem(args.repeticoes))
+    resultados.update(bench_ponta_a_ponta(paginas, args.iteracoes))
+
+    relatorio = {
+        "momento": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "erros_corpus": erros,
+        "resultados": resultados,
+    }
+
+    for nome, valores in resultados.items():
+        if "mediana_ms" in valores:
+            print(f"{nome:45s} mediana {valores['mediana_ms']:9.3f} ms   p95 {valores['p95_ms']:9.3f} ms")
+        else:
+            print(f"{nome:45s} {valores['ops_por_segundo']:12.0f} ops/s")
+    for erro in erros:
+        print("ERRO NO CORPUS:", erro)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados gravados em {args.saida}")
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(relatorio, json.load(f))
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
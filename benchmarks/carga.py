@@ -0,0 +1,261 @@
+"""
+Teste de carga local: o app rodando como no Procfile (gunicorn), falando com uma Amazon e
+um Telegram falsos, sem tocar nos serviços reais.
+
+  - Amazon falsa: responde /dp/<ASIN> com uma das páginas do corpus (variantes de layout,
+    escolhida pelo ASIN), depois de um atraso configurável; uma fração das respostas é a
+    página de captcha.
+  - Telegram falso: responde ao sendMessage; acima de um limite de mensagens por segundo
+    (ou numa fração aleatória) devolve 429 com 'retry_after', como o Telegram de verdade.
+  - Proxies falsos (--proxies): cada um responde como a Amazon (recebe a URL absoluta) e os
+    primeiros --proxies-ruins devolvem captcha na maior parte das vezes, para ver o pool de
+    saída (pool_saida.py) tirar esses proxies do sorteio.
+  - O app é apontado para eles por AMAZON_URL_BASE, TELEGRAM_API_URL, TELEGRAM_BOT_TOKEN
+    e SAIDA_PROXIES.
+
+Os cenários disparam /api/buscar-produto e /api/enviar-telegram com a concorrência pedida e
+mostram vazão, latência p50/p95/p99 e taxa de erros. No cenário do Telegram a latência é a
+de colocar na fila; depois o teste acompanha a fila de envios por --espera-fila segundos e
+mostra quantas mensagens chegaram ao Telegram falso e quantos 429 ele devolveu. O chat de
+teste é um grupo, então a fila respeita o limite de 20 mensagens por minuto do Telegram.
+
+Uso (na raiz do repositório; requer gunicorn e httpx):
+    python -m benchmarks.carga --requisicoes 2000 --simultaneas 50 --workers 4
+    python -m benchmarks.carga --cenarios buscar --atraso 0.3 --captcha 0.05 --asins 200 --saida carga.json
+    python -m benchmarks.carga --cenarios buscar --proxies 4 --proxies-ruins 1 --quarentena 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shlex
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from ._servidores_falsos import TOKEN_FALSO, AmazonFalsa, TelegramFalso, porta_livre
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(DIRETORIO)
+PROCFILE = os.path.join(RAIZ, "Procfile.txt")
+
+CHAT_FALSO = "-1000000000000"
+
+
+def comando_procfile(porta, argumentos_extras):
+    """Comando 'web' do Procfile, ouvindo só em 127.0.0.1:porta."""
+    with open(PROCFILE, encoding="utf-8") as f:
+        for linha in f:
+            if linha.strip().startswith("web:"):
+                comando = shlex.split(linha.split(":", 1)[1])
+                break
+        else:
+            raise RuntimeError("Procfile sem processo 'web'")
+    comando = [parte.replace("0.0.0.0:$PORT", f"127.0.0.1:{porta}").replace("$PORT", str(porta))
+               for parte in comando]
+    return comando + argumentos_extras
+
+
+def iniciar_app(porta, amazon, telegram, argumentos_extras, temporario, ambiente_extra=None):
+    ambiente = dict(os.environ)
+    ambiente.update({
+        "AMAZON_URL_BASE": amazon.url,
+        "TELEGRAM_API_URL": telegram.url,
+        "TELEGRAM_BOT_TOKEN": TOKEN_FALSO,
+        "TELEGRAM_CHAT_ID": CHAT_FALSO,
+        "FILA_TELEGRAM_DB": os.path.join(temporario, "fila_telegram.db"),
+        "MONITOR_DB": os.path.join(temporario, "monitor_precos.db"),
+        "MONITOR_ATIVO": "0",
+        "RESULTADOS_DB": os.path.join(temporario, "resultados.db"),
+        "COALESCENCIA_DIR": os.path.join(temporario, "busca_unica"),
+        "METRICAS_DIR": os.path.join(temporario, "metricas"),
+        "ACERVO_DIR": "",
+        "LOG_NIVEL": "WARNING",
+    })
+    ambiente.update(ambiente_extra or {})
+    comando = comando_procfile(porta, argumentos_extras)
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL,
+                                stderr=open(os.path.join(temporario, "gunicorn.log"), "w"))
+    limite = time.time() + 30
+    while time.time() < limite:
+        try:
+            httpx.get(f"http://127.0.0.1:{porta}/api/teste-conexao", timeout=1)
+            return processo, comando
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    processo.kill()
+    raise RuntimeError(f"o app não subiu (veja {temporario}/gunicorn.log)")
+
+
+def percentil(ordenados, fracao):
+    return ordenados[min(int(len(ordenados) * fracao), len(ordenados) - 1)]
+
+
+async def disparar(base, requisicoes, simultaneas, montar, avaliar):
+    """Executa 'requisicoes' chamadas (montar(i) -> (rota, json)) com no máximo 'simultaneas' ao mesmo tempo."""
+    limites = httpx.Limits(max_connections=simultaneas, max_keepalive_connections=simultaneas)
+    semaforo = asyncio.Semaphore(simultaneas)
+    tempos = []
+    erros = {}
+
+    async with httpx.AsyncClient(base_url=base, limits=limites, timeout=120) as cliente:
+        async def uma(indice):
+            rota, dados = montar(indice)
+            async with semaforo:
+                inicio = time.perf_counter()
+                try:
+                    resposta = await cliente.post(rota, json=dados)
+                    erro = avaliar(resposta)
+                except httpx.HTTPError as e:
+                    erro = type(e).__name__
+                tempos.append(time.perf_counter() - inicio)
+            if erro:
+                erros[erro] = erros.get(erro, 0) + 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(uma(i) for i in range(requisicoes)))
+        duracao = time.perf_counter() - inicio
+
+    tempos.sort()
+    total_erros = sum(erros.values())
+    return {
+        "requisicoes": requisicoes,
+        "simultaneas": simultaneas,
+        "segundos": round(duracao, 2),
+        "requisicoes_por_segundo": round(requisicoes / duracao, 1),
+        "p50_ms": round(percentil(tempos, 0.50) * 1000, 1),
+        "p95_ms": round(percentil(tempos, 0.95) * 1000, 1),
+        "p99_ms": round(percentil(tempos, 0.99) * 1000, 1),
+        "taxa_erros": round(total_erros / requisicoes, 4),
+        "erros": erros,
+    }
+
+
+def avaliar_busca(resposta):
+    if resposta.status_code != 200:
+        return f"http_{resposta.status_code}"
+    if resposta.json().get("titulo", "").startswith("PRODUTO MOCKADO"):
+        return "fallback"  # Captcha, disjuntor aberto ou página sem os campos
+    return None
+
+
+def avaliar_envio(resposta):
+    return None if resposta.status_code == 202 else f"http_{resposta.status_code}"
+
+
+def esperar_fila(base, limite_segundos):
+    """Espera a fila de envios do app esvaziar; retorna a contagem por status e quanto tempo levou."""
+    inicio = time.time()
+    while True:
+        estatisticas = httpx.get(f"{base}/api/envios-telegram", timeout=10).json()
+        if not estatisticas.get("pendente") or time.time() - inicio > limite_segundos:
+            return estatisticas, round(time.time() - inicio, 1)
+        time.sleep(0.5)
+
+
+def imprimir(nome, r):
+    erros = ", ".join(f"{tipo}={total}" for tipo, total in sorted(r["erros"].items())) or "-"
+    print(f"{nome:8s} {r['requisicoes_por_segundo']:8.1f} req/s   p50 {r['p50_ms']:8.1f} ms   "
+          f"p95 {r['p95_ms']:8.1f} ms   p99 {r['p99_ms']:8.1f} ms   erros {r['taxa_erros']:.2%} ({erros})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga com Amazon e Telegram falsos.")
+    parser.add_argument("--cenarios", default="buscar,telegram", help="buscar e/ou telegram, na ordem")
+    parser.add_argument("--requisicoes", type=int, default=1000, help="Requisições por cenário")
+    parser.add_argument("--simultaneas", type=int, default=50)
+    parser.add_argument("--asins", type=int, default=0,
+                        help="ASINs distintos nas buscas (0 = um por requisição, sem cache)")
+    parser.add_argument("--atraso", type=float, default=0.2, help="Segundos que a Amazon falsa leva para responder")
+    parser.add_argument("--variacao", type=float, default=0.05, help="Variação aleatória do atraso (±)")
+    parser.add_argument("--captcha", type=float, default=0.0, help="Fração das páginas que vem como captcha")
+    parser.add_argument("--telegram-atraso", type=float, default=0.02)
+    parser.add_argument("--telegram-limite", type=int, default=30, help="Mensagens por segundo antes do 429 (0 = sem)")
+    parser.add_argument("--telegram-429", type=float, default=0.02, help="Fração aleatória de respostas 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--espera-fila", type=float, default=30, help="Segundos acompanhando a fila de envios")
+    parser.add_argument("--workers", type=int, default=2, help="Workers do gunicorn (somado ao comando do Procfile)")
+    parser.add_argument("--gunicorn", default="", help="Argumentos extras do gunicorn, ex: '--threads 4'")
+    parser.add_argument("--proxies", type=int, default=0, help="Proxies falsos no pool de saída (0 = conexão direta)")
+    parser.add_argument("--proxies-ruins", type=int, default=0, help="Quantos desses proxies estão queimados")
+    parser.add_argument("--captcha-proxy-ruim", type=float, default=0.7, help="Fração de captchas nos proxies ruins")
+    parser.add_argument("--quarentena", type=float, default=60, help="SAIDA_QUARENTENA do app (segundos)")
+    parser.add_argument("--saida", help="Arquivo JSON com os resultados")
+    args = parser.parse_args(argv)
+
+    amazon = AmazonFalsa(args.atraso, args.variacao, args.captcha).iniciar()
+    proxies = [AmazonFalsa(args.atraso, args.variacao,
+                           args.captcha_proxy_ruim if i < args.proxies_ruins else args.captcha).iniciar()
+               for i in range(args.proxies)]
+    ambiente_extra = {"SAIDA_QUARENTENA": str(args.quarentena)}
+    if proxies:
+        ambiente_extra["SAIDA_PROXIES"] = ",".join(proxy.url for proxy in proxies)
+    telegram = TelegramFalso(args.telegram_atraso, args.telegram_limite, args.telegram_429, args.retry_after).iniciar()
+    temporario = tempfile.mkdtemp(prefix="celoland_carga_")
+    porta = porta_livre()
+    extras = ["--workers", str(args.workers), "--timeout", "120"] + shlex.split(args.gunicorn)
+    processo, comando = iniciar_app(porta, amazon, telegram, extras, temporario, ambiente_extra)
+    base = f"http://127.0.0.1:{porta}"
+    print("app:", " ".join(comando))
+
+    resultados = {}
+    prefixo = random.randrange(1000)  # ASINs novos a cada execução (o armazém de resultados é temporário, mas por garantia)
+    try:
+        for cenario in args.cenarios.split(","):
+            if cenario == "buscar":
+                distintos = args.asins or args.requisicoes
+
+                def montar(i):
+                    return "/api/buscar-produto", {"url": f"https://www.amazon.com.br/dp/B{prefixo:03d}{i % distintos:06d}"}
+
+                resultados[cenario] = asyncio.run(disparar(base, args.requisicoes, args.simultaneas, montar,
+                                                           avaliar_busca))
+                resultados[cenario]["amazon_falsa"] = dict(amazon.contadores)
+                if proxies:
+                    resultados[cenario]["proxies_falsos"] = {proxy.url: dict(proxy.contadores) for proxy in proxies}
+                    # Estado do pool de um dos workers (cada worker tem o seu)
+                    pool = httpx.get(f"{base}/api/pool-saida", timeout=10).json()
+                    resultados[cenario]["pool_saida"] = pool
+                    for membro in pool["proxies"]:
+                        print(f"{'':9s}proxy {membro['membro']:24s} nota {membro['nota']:.3f}   "
+                              f"quarentenas {membro['quarentenas']}   {membro['resultados']}")
+            elif cenario == "telegram":
+                def montar(i):
+                    return "/api/enviar-telegram", {
+                        "nome": f"Oferta de carga {i}", "link": f"https://www.amazon.com.br/dp/B0{i:08d}",
+                        "tag_afiliado": "carga-20", "preco_de": "R$ 199,90", "preco_por": "R$ 149,90",
+                    }
+
+                inicio = time.time()
+                resultados[cenario] = asyncio.run(disparar(base, args.requisicoes, args.simultaneas, montar,
+                                                           avaliar_envio))
+                fila, segundos = esperar_fila(base, args.espera_fila)
+                total = time.time() - inicio  # Desde o primeiro envio colocado na fila
+                resultados[cenario].update({"fila_envios": fila, "segundos_acompanhando_fila": segundos,
+                                            "envios_por_minuto": round(fila.get("enviado", 0) / total * 60, 1),
+                                            "telegram_falso": dict(telegram.contadores)})
+            else:
+                parser.error(f"cenário desconhecido: {cenario}")
+            imprimir(cenario, resultados[cenario])
+            extras_cenario = {k: v for k, v in resultados[cenario].items()
+                              if k in ("amazon_falsa", "fila_envios", "envios_por_minuto", "telegram_falso")}
+            if extras_cenario:
+                print(" " * 9 + json.dumps(extras_cenario, ensure_ascii=False))
+    finally:
+        processo.send_signal(signal.SIGTERM)
+        processo.wait(30)
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({"parametros": vars(args), "comando": comando, "resultados": resultados}, f,
+                      ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
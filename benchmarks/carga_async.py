@@ -0,0 +1,132 @@
+"""
+Comparação de carga: deploy síncrono (gunicorn, workers sync) x modo assíncrono (servidor_async.py).
+
+Sobe a Amazon falsa (_servidores_falsos), que responde com as páginas do corpus depois
+de um atraso (simulando páginas lentas), sobe cada servidor com o mesmo número de workers
+e dispara buscas simultâneas em /api/buscar-produto, cada uma com um ASIN diferente
+(sem cache).
+
+Uso (na raiz do repositório; requer gunicorn, uvicorn e httpx):
+    python -m benchmarks.carga_async --buscas 400 --simultaneas 200 --atraso 1.0 --workers 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from ._servidores_falsos import AmazonFalsa, porta_livre
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(DIRETORIO)
+
+SERVIDORES = {
+    "sync": ["gunicorn", "app:app"],
+    "async": ["gunicorn", "-k", "uvicorn.workers.UvicornWorker", "servidor_async:app"],
+}
+
+
+def iniciar_servidor(nome, porta, workers, temporario):
+    ambiente = dict(os.environ)
+    ambiente.update({
+        "FILA_TELEGRAM_DB": os.path.join(temporario, f"fila_{nome}.db"),
+        "MONITOR_DB": os.path.join(temporario, f"monitor_{nome}.db"),
+        "MONITOR_ATIVO": "0",
+        "COALESCENCIA_DIR": "",
+        "METRICAS_DIR": "",
+        "ACERVO_DIR": "",
+        "RESULTADOS_DB": os.path.join(temporario, f"resultados_{nome}.db"),
+        "LOG_NIVEL": "ERROR",
+    })
+    comando = SERVIDORES[nome] + ["--bind", f"127.0.0.1:{porta}", "--workers", str(workers), "--timeout", "120"]
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=ambiente,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    limite = time.time() + 30
+    while time.time() < limite:
+        try:
+            httpx.get(f"http://127.0.0.1:{porta}/api/teste-conexao", timeout=1)
+            return processo
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    processo.kill()
+    raise RuntimeError(f"servidor {nome} não subiu")
+
+
+async def disparar(porta_app, porta_amazon, buscas, simultaneas, prefixo):
+    limites = httpx.Limits(max_connections=simultaneas, max_keepalive_connections=simultaneas)
+    semaforo = asyncio.Semaphore(simultaneas)
+    tempos = []
+    erros = 0
+
+    async with httpx.AsyncClient(limits=limites, timeout=120) as cliente:
+        async def uma(indice):
+            nonlocal erros
+            url = f"http://127.0.0.1:{porta_amazon}/dp/B{prefixo}{indice:07d}"
+            async with semaforo:
+                inicio = time.perf_counter()
+                try:
+                    resposta = await cliente.post(f"http://127.0.0.1:{porta_app}/api/buscar-produto", json={"url": url})
+                    if resposta.status_code != 200 or resposta.json().get("titulo", "").startswith("PRODUTO MOCKADO"):
+                        erros += 1
+                except httpx.HTTPError:
+                    erros += 1
+                tempos.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(uma(i) for i in range(buscas)))
+        duracao = time.perf_counter() - inicio
+
+    tempos.sort()
+    return {
+        "buscas": buscas,
+        "simultaneas": simultaneas,
+        "segundos": round(duracao, 2),
+        "buscas_por_segundo": round(buscas / duracao, 1),
+        "mediana_ms": round(statistics.median(tempos) * 1000, 1),
+        "p95_ms": round(tempos[min(int(len(tempos) * 0.95), len(tempos) - 1)] * 1000, 1),
+        "erros": erros,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara o deploy síncrono com o modo assíncrono.")
+    parser.add_argument("--buscas", type=int, default=400)
+    parser.add_argument("--simultaneas", type=int, default=200)
+    parser.add_argument("--atraso", type=float, default=1.0, help="Segundos que a Amazon local leva para responder")
+    parser.add_argument("--workers", type=int, default=2, help="Workers do gunicorn em cada modo")
+    parser.add_argument("--modos", default="sync,async")
+    parser.add_argument("--saida", help="Arquivo JSON com os resultados")
+    args = parser.parse_args(argv)
+
+    porta_amazon = AmazonFalsa(args.atraso, 0.0, 0.0).iniciar().porta
+    temporario = tempfile.mkdtemp(prefix="celoland_carga_")
+
+    resultados = {}
+    for indice, nome in enumerate(args.modos.split(",")):
+        porta = porta_livre()
+        processo = iniciar_servidor(nome, porta, args.workers, temporario)
+        try:
+            resultados[nome] = asyncio.run(disparar(porta, porta_amazon, args.buscas, args.simultaneas,
+                                                    f"{indice:02d}"))
+        finally:
+            processo.send_signal(signal.SIGTERM)
+            processo.wait(30)
+        r = resultados[nome]
+        print(f"{nome:6s} {r['buscas_por_segundo']:8.1f} buscas/s   mediana {r['mediana_ms']:9.1f} ms   "
+              f"p95 {r['p95_ms']:9.1f} ms   erros {r['erros']}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({"parametros": vars(args), "resultados": resultados}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Coalescência de buscas simultâneas pelo mesmo produto ("single-flight").
+
+O primeiro pedido por uma chave (ASIN) executa a busca; os pedidos simultâneos pela mesma
+chave esperam e recebem o mesmo resultado. Dentro do worker isso usa um Event por chave.
+Entre workers do gunicorn, uma trava de arquivo por ASIN serializa as buscas: o worker que
+chega depois lê o resultado que o primeiro acabou de gravar, em vez de ir de novo à Amazon.
+Os arquivos de trava e de resultado antigos são apagados de tempos em tempos; a trava só é
+apagada por quem a segura, e quem travou um arquivo já apagado abre o novo e trava de novo.
+"""
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+CHAVE_ARQUIVO_REGEX = re.compile(r'^[A-Za-z0-9_-]{1,64}$')  # Só chaves seguras viram nome de arquivo
+LIMPEZA_A_CADA = 500  # Buscas executadas entre limpezas do diretório de travas
+ARQUIVO_EXPIRA_APOS = 3600.0  # Segundos
+
+logger = logging.getLogger(__name__)
+
+
+class _BuscaEmAndamento:
+    def __init__(self):
+        self.concluida = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class BuscaUnica:
+    """
+    Executa no máximo uma busca por chave ao mesmo tempo.
+
+    'diretorio_travas' habilita a coalescência entre processos (None = só dentro do processo).
+    'validade' é por quantos segundos o resultado gravado por outro worker pode ser reaproveitado.
+    """
+
+    def __init__(self, diretorio_travas=None, validade=5.0, espera_maxima=30.0):
+        self.diretorio_travas = diretorio_travas
+        self.validade = validade
+        self.espera_maxima = espera_maxima
+        self._em_andamento = {}
+        self._lock = threading.Lock()
+        self.executadas = 0
+        self.coalescidas_local = 0
+        self.coalescidas_entre_workers = 0
+        if diretorio_travas:
+            os.makedirs(diretorio_travas, exist_ok=True)
+
+    def executar(self, chave, funcao):
+        """
+        Retorna funcao() para a chave, reaproveitando uma execução em andamento.
+        'funcao' deve retornar um valor serializável em JSON para valer entre workers.
+        """
+        with self._lock:
+            busca = self._em_andamento.get(chave)
+            lider = busca is None
+            if lider:
+                busca = _BuscaEmAndamento()
+                self._em_andamento[chave] = busca
+            else:
+                self.coalescidas_local += 1
+
+        if not lider:
+            if not busca.concluida.wait(self.espera_maxima):
+                # O líder travou: melhor buscar por conta própria do que ficar preso
+                return funcao()
+            if busca.erro is not None:
+                raise busca.erro
+            return busca.resultado
+
+        try:
+            busca.resultado = self._executar_entre_workers(chave, funcao)
+            return busca.resultado
+        except Exception as e:
+            busca.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._em_andamento[chave]
+            busca.concluida.set()
+
+    def _executar_entre_workers(self, chave, funcao):
+        if not self.diretorio_travas or not CHAVE_ARQUIVO_REGEX.match(chave):
+            return self._executar_funcao(funcao)
+
+        caminho_base = os.path.join(self.diretorio_travas, chave)
+        arquivo_trava, travado = self._travar(caminho_base + ".lock")
+        with arquivo_trava:
+            try:
+                # Outro worker pode ter concluído a mesma busca enquanto esperávamos a trava
+                resultado = self._ler_resultado(caminho_base + ".json")
+                if resultado is not None:
+                    self.coalescidas_entre_workers += 1
+                    return resultado
+
+                resultado = self._executar_funcao(funcao)
+                self._gravar_resultado(caminho_base + ".json", resultado)
+                return resultado
+            finally:
+                if travado:
+                    fcntl.flock(arquivo_trava.fileno(), fcntl.LOCK_UN)
+
+    def _travar(self, caminho):
+        """Abre e trava o arquivo de trava. Retorna (arquivo, travado); sem trava após a espera máxima."""
+        inicio = time.time()
+        while True:
+            arquivo = open(caminho, "a+")
+            # flock não tem timeout: tenta sem bloquear até o limite de espera
+            while True:
+                try:
+                    fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except OSError:
+                    if time.time() - inicio > self.espera_maxima:
+                        return arquivo, False
+                    time.sleep(0.05)
+            try:
+                if os.stat(caminho).st_ino == os.fstat(arquivo.fileno()).st_ino:
+                    return arquivo, True
+            except FileNotFoundError:
+                pass
+            arquivo.close()  # A limpeza apagou o arquivo enquanto esperávamos: trava o novo
+
+    def _executar_funcao(self, funcao):
+        self.executadas += 1
+        if self.diretorio_travas and self.executadas % LIMPEZA_A_CADA == 0:
+            self._limpar_arquivos_antigos()
+        return funcao()
+
+    def _ler_resultado(self, caminho):
+        try:
+            if time.time() - os.path.getmtime(caminho) > self.validade:
+                return None
+            with open(caminho, encoding="utf-8") as arquivo:
+                return json.load(arquivo)
+        except (OSError, ValueError):
+            return None
+
+    def _gravar_resultado(self, caminho, resultado):
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporario, "w", encoding="utf-8") as arquivo:
+                json.dump(resultado, arquivo, ensure_ascii=False)
+            os.replace(temporario, caminho)  # Troca atômica: quem lê nunca vê arquivo pela metade
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("não foi possível gravar o resultado compartilhado: %s", e)
+            try:
+                os.remove(temporario)
+            except OSError:
+                pass
+
+    def _limpar_arquivos_antigos(self):
+        limite = time.time() - ARQUIVO_EXPIRA_APOS
+        try:
+            with os.scandir(self.diretorio_travas) as entradas:
+                for entrada in entradas:
+                    if entrada.stat().st_mtime >= limite:
+                        continue
+                    if entrada.name.endswith((".json", ".tmp")):
+                        os.remove(entrada.path)
+                    elif entrada.name.endswith(".lock"):
+                        self._remover_trava(entrada.path)
+        except OSError as e:
+            logger.warning("falha ao limpar o diretório de travas: %s", e)
+
+    def _remover_trava(self, caminho):
+        # Só apaga a trava livre, e enquanto a segura: quem estiver esperando por ela percebe
+        # (o arquivo travado não é mais o do caminho) e abre um novo
+        with open(caminho, "a+") as arquivo:
+            try:
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return  # Em uso
+            try:
+                if os.stat(caminho).st_ino == os.fstat(arquivo.fileno()).st_ino:
+                    os.remove(caminho)
+            except FileNotFoundError:
+                pass
+
+    def contar(self, coalescida):
+        """Conta uma busca coalescida (ou executada) fora de executar(): o modo assíncrono coalesce por conta própria."""
+        with self._lock:
+            if coalescida:
+                self.coalescidas_local += 1
+            else:
+                self.executadas += 1
+
+    def estatisticas(self):
+        with self._lock:
+            em_andamento = len(self._em_andamento)
+        return {
+            "buscas_executadas": self.executadas,
+            "coalescidas_local": self.coalescidas_local,
+            "coalescidas_entre_workers": self.coalescidas_entre_workers,
+            "em_andamento": em_andamento,
+        }
@@ -0,0 +1,337 @@
+"""
+Extração de título e preços da página de produto da Amazon em uma única passada.
+
+Em vez de montar a árvore inteira com o BeautifulSoup e percorrê-la várias vezes
+(um soup.find por seletor), o coletor recebe os eventos do parser (abre tag, texto,
+fecha tag) e guarda apenas o texto dos elementos que algum seletor da tabela SELETORES
+procura. Os níveis de fallback são resolvidos no final, sobre o que foi coletado.
+
+O parser é incremental (pode receber a página em pedaços). Usa o lxml (em
+requirements.txt) e, se ele não estiver instalado, o html.parser da biblioteca padrão,
+cerca de quatro vezes mais lento.
+"""
+import codecs
+import re
+import threading
+from collections import Counter
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:  # lxml é opcional: sem ele usamos o html.parser
+    etree = None
+
+# Tags sem fechamento (não entram na pilha de tags abertas)
+ELEMENTOS_VAZIOS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen',
+    'link', 'meta', 'param', 'source', 'track', 'wbr',
+])
+# Texto dentro dessas tags não faz parte do conteúdo visível
+TAGS_SEM_TEXTO = frozenset(['script', 'style', 'template'])
+
+CHARSET_REGEX = re.compile(rb'<meta[^>]+charset=["\']?([A-Za-z0-9_.:-]+)', re.IGNORECASE)
+
+
+class Seletor:
+    """Equivalente a soup.find(tag, id=..., class_=...), opcionalmente dentro de outro seletor."""
+
+    def __init__(self, nome, tag=None, id=None, classe=None, dentro_de=None):
+        self.nome = nome
+        self.tag = tag
+        self.id = id
+        self.classe = classe
+        self.dentro_de = dentro_de
+
+    def corresponde(self, tag, id_elemento, classes):
+        if self.tag is not None and tag != self.tag:
+            return False
+        if self.id is not None and id_elemento != self.id:
+            return False
+        if self.classe is not None and self.classe not in classes:
+            return False
+        return True
+
+
+# Todos os elementos que a extração precisa (apenas a primeira ocorrência de cada um)
+SELETORES = (
+    Seletor("titulo", id="productTitle"),
+    Seletor("titulo_span", tag="span", id="productTitle"),
+    Seletor("offscreen", tag="span", classe="a-offscreen"),
+    Seletor("priceblock_ourprice", id="priceblock_ourprice"),
+    Seletor("price_to_pay", tag="span", classe="priceToPay"),
+    Seletor("price_to_pay_offscreen", tag="span", classe="a-offscreen", dentro_de="price_to_pay"),
+    Seletor("preco_inteiro", classe="a-price-whole"),
+    Seletor("preco_centavos", classe="a-price-fraction"),
+    Seletor("preco_simbolo", classe="a-price-symbol"),
+    Seletor("preco_riscado", tag="span", classe="a-text-strike"),
+)
+
+
+def _texto(capturas, nome):
+    texto = capturas.get(nome)
+    return texto.strip() if texto is not None else None
+
+
+def _montar_preco_partes(capturas):
+    """Monta 'R$ 1.234,56' a partir dos elementos de símbolo, inteiro e centavos."""
+    if "preco_inteiro" not in capturas:
+        return None
+    preco = ""
+    if "preco_simbolo" in capturas:
+        preco += _texto(capturas, "preco_simbolo") + " "
+    preco += _texto(capturas, "preco_inteiro")
+    if "preco_centavos" in capturas:
+        preco += "," + _texto(capturas, "preco_centavos")
+    return preco if preco.strip() != "" else None
+
+
+# Níveis de fallback de cada campo, na ordem de prioridade:
+# (nome do nível, seletor que precisa ter sido encontrado, função que monta o valor, decisivo).
+# Um nível decisivo encerra a busca assim que o elemento existe, mesmo com texto vazio
+# (mesmo comportamento da cadeia original de soup.find).
+NIVEIS_TITULO = (
+    ("productTitle", "titulo", lambda c: _texto(c, "titulo"), True),
+    ("span#productTitle", "titulo_span", lambda c: _texto(c, "titulo_span"), True),
+)
+NIVEIS_PRECO_ATUAL = (
+    ("a-offscreen", "offscreen", lambda c: _texto(c, "offscreen"), True),
+    ("priceblock_ourprice", "priceblock_ourprice", lambda c: _texto(c, "priceblock_ourprice"), False),
+    ("priceToPay", "price_to_pay_offscreen", lambda c: _texto(c, "price_to_pay_offscreen"), False),
+    ("a-price-whole", "preco_inteiro", _montar_preco_partes, False),
+)
+NIVEIS_PRECO_ANTIGO = (
+    ("a-text-strike", "preco_riscado", lambda c: _texto(c, "preco_riscado"), True),
+)
+
+_contadores_niveis = Counter()
+_contadores_lock = threading.Lock()
+
+
+def _resolver(niveis, capturas):
+    """Retorna (valor, nome do nível) do primeiro nível que decidiu o campo."""
+    for nivel, seletor, montar, decisivo in niveis:
+        if seletor not in capturas:
+            continue
+        valor = montar(capturas)
+        if decisivo or valor:
+            return valor, nivel
+    return None, None
+
+
+class ColetorProduto:
+    """Recebe os eventos do parser e guarda o texto dos elementos da tabela SELETORES."""
+
+    def __init__(self, seletores=SELETORES):
+        self.seletores = seletores
+        self.capturas = {}  # nome do seletor -> texto completo do elemento
+        self._pilha = []  # Tags abertas
+        self._ativas = []  # [nome, profundidade, partes do texto]
+        self._iniciadas = set()
+        self._sem_texto = 0  # Profundidade dentro de <script>/<style>
+        # Índices por id e por classe: a maioria das tags é descartada com uma consulta ao dict
+        self._por_id = {}
+        self._por_classe = {}
+        for seletor in seletores:
+            if seletor.id is not None:
+                self._por_id.setdefault(seletor.id, []).append(seletor)
+            elif seletor.classe is not None:
+                self._por_classe.setdefault(seletor.classe, []).append(seletor)
+
+    # Interface de "target" do lxml (start/end/data/close); o html.parser usa o adaptador abaixo
+
+    def start(self, tag, atributos):
+        tag = tag.lower()
+        novas = self._corresponder(tag, atributos) if atributos else ()
+
+        if tag in ELEMENTOS_VAZIOS:
+            for nome in novas:
+                self.capturas[nome] = ""
+            return
+
+        self._pilha.append(tag)
+        if tag in TAGS_SEM_TEXTO:
+            self._sem_texto += 1
+        profundidade = len(self._pilha)
+        for nome in novas:
+            self._ativas.append([nome, profundidade, []])
+
+    def _corresponder(self, tag, atributos):
+        id_elemento = atributos.get('id')
+        classe = atributos.get('class')
+        candidatos = list(self._por_id.get(id_elemento, ())) if id_elemento else []
+        if classe:
+            classes = classe.split()
+            for nome_classe in classes:
+                candidatos.extend(self._por_classe.get(nome_classe, ()))
+        else:
+            classes = ()
+        if not candidatos:
+            return ()
+
+        novas = []
+        for seletor in candidatos:
+            if seletor.nome in self._iniciadas:
+                continue
+            if seletor.dentro_de is not None and seletor.dentro_de not in {c[0] for c in self._ativas}:
+                continue
+            if seletor.corresponde(tag, id_elemento, classes):
+                self._iniciadas.add(seletor.nome)
+                novas.append(seletor.nome)
+        return novas
+
+    def end(self, tag):
+        tag = tag.lower()
+        if tag not in self._pilha:
+            return  # Fechamento sem abertura correspondente: ignorado (como o BeautifulSoup)
+        while self._pilha:
+            fechada = self._pilha.pop()
+            if fechada in TAGS_SEM_TEXTO:
+                self._sem_texto -= 1
+            self._finalizar_capturas(len(self._pilha))
+            if fechada == tag:
+                break
+
+    def data(self, texto):
+        if self._ativas and not self._sem_texto:
+            for captura in self._ativas:
+                captura[2].append(texto)
+
+    def close(self):
+        self._finalizar_capturas(0)
+        return self.capturas
+
+    def _finalizar_capturas(self, profundidade_atual):
+        if not self._ativas:
+            return
+        restantes = []
+        for nome, profundidade, partes in self._ativas:
+            if profundidade > profundidade_atual:
+                self.capturas[nome] = "".join(partes)
+            else:
+                restantes.append([nome, profundidade, partes])
+        self._ativas = restantes
+
+    @property
+    def essenciais_encontrados(self):
+        """True quando título e preço atual já estão decididos (não dependem do resto da página)."""
+        if "titulo" not in self.capturas:
+            return False
+        # O nível 'a-offscreen' é decisivo: se existe, os outros níveis nem são consultados
+        return "offscreen" in self.capturas
+
+    @property
+    def todos_encontrados(self):
+        """True quando também o preço antigo já foi encontrado (nada mais a procurar na página)."""
+        return self.essenciais_encontrados and "preco_riscado" in self.capturas
+
+
+class _ParserPadrao(HTMLParser):
+    """Adaptador do html.parser (biblioteca padrão) para a interface do coletor."""
+
+    def __init__(self, coletor):
+        super().__init__(convert_charrefs=True)
+        self.coletor = coletor
+
+    def handle_starttag(self, tag, attrs):
+        self.coletor.start(tag, dict(attrs))
+
+    def handle_endtag(self, tag):
+        self.coletor.end(tag)
+
+    def handle_data(self, data):
+        self.coletor.data(data)
+
+    def close(self):
+        super().close()
+        return self.coletor.close()
+
+
+class ExtratorProduto:
+    """
+    Extração incremental: chame alimentar() com pedaços do HTML (str) e finalizar() no fim.
+    """
+
+    def __init__(self):
+        self.coletor = ColetorProduto()
+        if etree is not None:
+            self._parser = etree.HTMLParser(target=self.coletor, recover=True)
+            self.backend = "lxml"
+        else:
+            self._parser = _ParserPadrao(self.coletor)
+            self.backend = "html.parser"
+
+    def alimentar(self, texto):
+        if texto:
+            self._parser.feed(texto)
+
+    @property
+    def essenciais_encontrados(self):
+        return self.coletor.essenciais_encontrados
+
+    @property
+    def todos_encontrados(self):
+        return self.coletor.todos_encontrados
+
+    def finalizar(self):
+        """Resolve os níveis de fallback e retorna os campos extraídos e o nível usado em cada um."""
+        try:
+            self._parser.close()
+        except Exception:
+            self.coletor.close()  # lxml reclama de documento vazio/incompleto; o que foi coletado vale
+        return resolver_campos(self.coletor.capturas)
+
+
+def resolver_campos(capturas):
+    titulo, nivel_titulo = _resolver(NIVEIS_TITULO, capturas)
+    preco_atual, nivel_preco = _resolver(NIVEIS_PRECO_ATUAL, capturas)
+    preco_antigo, nivel_preco_antigo = _resolver(NIVEIS_PRECO_ANTIGO, capturas)
+
+    with _contadores_lock:
+        _contadores_niveis["titulo:" + (nivel_titulo or "nenhum")] += 1
+        _contadores_niveis["preco_atual:" + (nivel_preco or "nenhum")] += 1
+        _contadores_niveis["preco_antigo:" + (nivel_preco_antigo or "nenhum")] += 1
+
+    return {
+        "titulo": titulo,
+        "preco_atual": preco_atual,
+        "preco_antigo": preco_antigo,
+        "nivel_titulo": nivel_titulo,
+        "nivel_preco": nivel_preco,
+        "nivel_preco_antigo": nivel_preco_antigo,
+    }
+
+
+def extrair_produto(html):
+    """Extrai os campos de uma página completa (str)."""
+    extrator = ExtratorProduto()
+    extrator.alimentar(html)
+    return extrator.finalizar()
+
+
+def detectar_codificacao(content_type, inicio):
+    """Codificação da página: charset do Content-Type, senão o <meta charset> do início, senão UTF-8."""
+    if content_type:
+        for parametro in content_type.split(';')[1:]:
+            nome, _, valor = parametro.partition('=')
+            if nome.strip().lower() == 'charset' and valor.strip():
+                codificacao = valor.strip().strip('"\'')
+                break
+        else:
+            codificacao = None
+    else:
+        codificacao = None
+
+    if codificacao is None:
+        encontrado = CHARSET_REGEX.search(inicio[:4096])
+        codificacao = encontrado.group(1).decode('ascii') if encontrado else 'utf-8'
+    try:
+        codecs.lookup(codificacao)
+    except LookupError:
+        codificacao = 'utf-8'
+    return codificacao
+
+
+def estatisticas_niveis():
+    """Quantas vezes cada nível de fallback foi usado, por campo."""
+    with _contadores_lock:
+        return dict(_contadores_niveis)
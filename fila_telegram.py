@@ -0,0 +1,378 @@
+"""
+Fila persistente (SQLite) de envios ao Telegram, drenada por uma thread em segundo plano.
+
+O endpoint apenas grava o envio na fila e responde na hora; a thread respeita os limites
+do Telegram (global e por chat), obedece o 'retry_after' das respostas 429 e tenta de novo
+com backoff exponencial. Como a fila fica em disco, reiniciar o worker não perde ofertas.
+
+Com vários workers do gunicorn, apenas um processo drena a fila por vez (trava de arquivo),
+assim os limites de envio valem para o serviço todo.
+
+Ofertas repetidas (mesma impressão digital: produto, preço, cupom e chat) dentro de uma
+janela de tempo não viram um novo envio: se a primeira ainda está na fila, a nova mensagem
+toma o lugar dela (agrupada); se já foi enviada, a repetição é suprimida. O índice fica no
+mesmo banco da fila e é consultado na mesma transação, então vale entre os workers.
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+from recursos_processo import ConexoesSQLite, ThreadDoProcesso, TravaLider
+
+# Limites do Telegram para bots (https://core.telegram.org/bots/faq)
+LIMITE_GLOBAL_POR_SEGUNDO = 30  # Mensagens por segundo no total
+INTERVALO_MINIMO_CHAT = 1.0  # Segundos entre mensagens no mesmo chat
+LIMITE_GRUPO_POR_MINUTO = 20  # Mensagens por minuto em grupos/canais (chat_id negativo)
+
+MAX_TENTATIVAS = 8
+BACKOFF_BASE = 2.0  # Segundos (dobra a cada tentativa)
+BACKOFF_MAXIMO = 300.0
+INTERVALO_VERIFICACAO = 1.0  # Espera máxima da thread quando a fila está vazia
+ENVIO_TRAVADO_APOS = 120.0  # 'enviando' há mais tempo que isso volta para 'pendente'
+
+STATUS_PENDENTE = "pendente"
+STATUS_ENVIANDO = "enviando"
+STATUS_ENVIADO = "enviado"
+STATUS_FALHOU = "falhou"
+
+# O que aconteceu com uma oferta colocada na fila com impressão digital
+OFERTA_ENFILEIRADA = "enfileirada"
+OFERTA_AGRUPADA = "agrupada"  # Repetição de um envio ainda pendente: a mensagem nova substitui a antiga
+OFERTA_SUPRIMIDA = "suprimida"  # Repetição de uma oferta já enviada (ou em envio) dentro da janela
+
+LIMPEZA_OFERTAS_A_CADA = 500  # Ofertas novas entre duas limpezas do índice de impressões vencidas
+
+logger = logging.getLogger(__name__)
+
+
+class ResultadoEnvio:
+    """Resultado de uma tentativa de envio ao Telegram."""
+
+    def __init__(self, ok, erro=None, retry_after=None, permanente=False):
+        self.ok = ok
+        self.erro = erro
+        self.retry_after = retry_after  # Segundos pedidos pelo Telegram (HTTP 429)
+        self.permanente = permanente  # Erro que não adianta repetir (ex: 400, 403)
+
+
+class LimitadorTelegram:
+    """Controla quando o próximo envio é permitido, globalmente e por chat."""
+
+    def __init__(self):
+        self._envios_globais = deque()  # Horários dos envios do último segundo
+        self._ultimo_envio_chat = {}
+        self._envios_grupo = {}  # chat_id -> deque com horários do último minuto
+        self._pausa_global_ate = 0.0
+
+    def proximo_horario(self, chat_id, agora):
+        """Primeiro horário (time.monotonic) em que um envio para o chat é permitido."""
+        horario = max(agora, self._pausa_global_ate)
+
+        while self._envios_globais and self._envios_globais[0] <= agora - 1.0:
+            self._envios_globais.popleft()
+        if len(self._envios_globais) >= LIMITE_GLOBAL_POR_SEGUNDO:
+            horario = max(horario, self._envios_globais[0] + 1.0)
+
+        ultimo = self._ultimo_envio_chat.get(chat_id)
+        if ultimo is not None:
+            horario = max(horario, ultimo + INTERVALO_MINIMO_CHAT)
+
+        envios_grupo = self._envios_grupo.get(chat_id)
+        if envios_grupo is not None:
+            while envios_grupo and envios_grupo[0] <= agora - 60.0:
+                envios_grupo.popleft()
+            if len(envios_grupo) >= LIMITE_GRUPO_POR_MINUTO:
+                horario = max(horario, envios_grupo[0] + 60.0)
+        return horario
+
+    def registrar(self, chat_id, agora):
+        self._envios_globais.append(agora)
+        self._ultimo_envio_chat[chat_id] = agora
+        if str(chat_id).startswith('-'):
+            self._envios_grupo.setdefault(chat_id, deque()).append(agora)
+
+    def pausar(self, segundos, agora):
+        """Pausa todos os envios (o 'retry_after' do Telegram vale para o bot inteiro)."""
+        self._pausa_global_ate = max(self._pausa_global_ate, agora + segundos)
+
+
+class FilaTelegram:
+    """
+    Fila de envios gravada em SQLite.
+
+    'enviar' é a função que realmente fala com o Telegram: recebe (chat_id, mensagem,
+    link_afiliado) e retorna um ResultadoEnvio.
+    """
+
+    def __init__(self, caminho_db, enviar):
+        self.caminho_db = caminho_db
+        self.enviar = enviar
+        self.limitador = LimitadorTelegram()
+        self._conexao = ConexoesSQLite(caminho_db, sqlite3.Row)
+        self._acordar = threading.Event()
+        self._thread = ThreadDoProcesso(self._executar, "fila-telegram")
+        self._lideranca = TravaLider(caminho_db + ".lock", ao_assumir=self._recuperar_envios_interrompidos)
+        self._ofertas_desde_limpeza = 0
+        self._criar_tabelas()
+
+    # --- Banco de dados ---
+
+    def _criar_tabelas(self):
+        conexao = self._conexao()
+        conexao.execute("""
+            CREATE TABLE IF NOT EXISTS envios_telegram (
+                id TEXT PRIMARY KEY,
+                chat_id TEXT NOT NULL,
+                mensagem TEXT NOT NULL,
+                link_afiliado TEXT,
+                status TEXT NOT NULL,
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                proxima_tentativa REAL NOT NULL,
+                erro TEXT,
+                criado_em REAL NOT NULL,
+                atualizado_em REAL NOT NULL
+            )
+        """)
+        conexao.execute(
+            "CREATE INDEX IF NOT EXISTS idx_envios_pendentes ON envios_telegram (status, proxima_tentativa)"
+        )
+        conexao.execute("""
+            CREATE TABLE IF NOT EXISTS ofertas_publicadas (
+                impressao TEXT PRIMARY KEY,
+                id_envio TEXT NOT NULL,
+                repeticoes INTEGER NOT NULL DEFAULT 0,
+                criado_em REAL NOT NULL,
+                expira_em REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conexao.execute("CREATE INDEX IF NOT EXISTS idx_ofertas_expira_em ON ofertas_publicadas (expira_em)")
+        conexao.execute("CREATE TABLE IF NOT EXISTS contagem_ofertas (acao TEXT PRIMARY KEY, total INTEGER NOT NULL)")
+
+    # --- API usada pelos endpoints ---
+
+    def enfileirar(self, chat_id, mensagem, link_afiliado=None):
+        """Grava o envio na fila e acorda a thread. Retorna o id do envio."""
+        id_envio = self._inserir_envio(self._conexao(), chat_id, mensagem, link_afiliado, time.time())
+        self.iniciar()
+        self._acordar.set()
+        return id_envio
+
+    def enfileirar_oferta(self, chat_id, mensagem, link_afiliado, impressao, janela, forcar=False):
+        """
+        Como enfileirar, mas sem repetir a oferta com a mesma 'impressao' nos últimos 'janela'
+        segundos. Retorna (id do envio, ação): a ação é OFERTA_ENFILEIRADA (envio novo) ou,
+        para uma repetição, OFERTA_AGRUPADA/OFERTA_SUPRIMIDA com o id do envio original.
+        'forcar' enfileira mesmo assim (e a janela recomeça a partir deste envio).
+        """
+        conexao = self._conexao()
+        agora = time.time()
+        conexao.execute("BEGIN IMMEDIATE")  # Trava de escrita: dois workers não enfileiram a mesma oferta
+        try:
+            original = None if forcar else conexao.execute(
+                "SELECT o.id_envio, e.status FROM ofertas_publicadas o JOIN envios_telegram e ON e.id = o.id_envio"
+                " WHERE o.impressao = ? AND o.expira_em > ? AND e.status != ?",
+                (impressao, agora, STATUS_FALHOU),
+            ).fetchone()
+            if original is None:
+                id_envio = self._inserir_envio(conexao, chat_id, mensagem, link_afiliado, agora)
+                conexao.execute(
+                    "INSERT OR REPLACE INTO ofertas_publicadas (impressao, id_envio, repeticoes, criado_em, expira_em)"
+                    " VALUES (?, ?, 0, ?, ?)", (impressao, id_envio, agora, agora + janela),
+                )
+                acao = OFERTA_ENFILEIRADA
+            else:
+                id_envio = original["id_envio"]
+                agrupada = original["status"] == STATUS_PENDENTE and conexao.execute(
+                    "UPDATE envios_telegram SET mensagem = ?, link_afiliado = ?, atualizado_em = ?"
+                    " WHERE id = ? AND status = ?", (mensagem, link_afiliado, agora, id_envio, STATUS_PENDENTE),
+                ).rowcount
+                conexao.execute("UPDATE ofertas_publicadas SET repeticoes = repeticoes + 1 WHERE impressao = ?",
+                                (impressao,))
+                acao = OFERTA_AGRUPADA if agrupada else OFERTA_SUPRIMIDA
+            conexao.execute(
+                "INSERT INTO contagem_ofertas (acao, total) VALUES (?, 1)"
+                " ON CONFLICT (acao) DO UPDATE SET total = total + 1", (acao,),
+            )
+            conexao.execute("COMMIT")
+        except BaseException:
+            conexao.execute("ROLLBACK")
+            raise
+
+        if acao == OFERTA_ENFILEIRADA:
+            self._limpar_ofertas_vencidas(conexao, agora)
+            self.iniciar()
+            self._acordar.set()
+        return id_envio, acao
+
+    def _inserir_envio(self, conexao, chat_id, mensagem, link_afiliado, agora):
+        id_envio = uuid.uuid4().hex
+        conexao.execute(
+            "INSERT INTO envios_telegram (id, chat_id, mensagem, link_afiliado, status, tentativas,"
+            " proxima_tentativa, criado_em, atualizado_em) VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?)",
+            (id_envio, str(chat_id), mensagem, link_afiliado, STATUS_PENDENTE, agora, agora, agora),
+        )
+        return id_envio
+
+    def _limpar_ofertas_vencidas(self, conexao, agora):
+        """De tempos em tempos apaga as impressões fora da janela (as contagens ficam em contagem_ofertas)."""
+        self._ofertas_desde_limpeza += 1
+        if self._ofertas_desde_limpeza < LIMPEZA_OFERTAS_A_CADA:
+            return
+        self._ofertas_desde_limpeza = 0
+        try:
+            conexao.execute("DELETE FROM ofertas_publicadas WHERE expira_em <= ?", (agora,))
+        except sqlite3.Error as e:
+            logger.warning("falha ao limpar o índice de ofertas: %s", e)
+
+    def consultar(self, id_envio):
+        """Retorna o estado do envio (dict) ou None se o id não existir."""
+        linha = self._conexao().execute(
+            "SELECT id, status, tentativas, proxima_tentativa, erro, criado_em, atualizado_em"
+            " FROM envios_telegram WHERE id = ?",
+            (id_envio,),
+        ).fetchone()
+        return dict(linha) if linha else None
+
+    def estatisticas(self):
+        linhas = self._conexao().execute(
+            "SELECT status, COUNT(*) AS total FROM envios_telegram GROUP BY status"
+        ).fetchall()
+        return {linha["status"]: linha["total"] for linha in linhas}
+
+    def estatisticas_ofertas(self):
+        """Ofertas repetidas que não viraram envio (somadas entre os workers) e impressões na janela."""
+        conexao = self._conexao()
+        contagem = {OFERTA_ENFILEIRADA: 0, OFERTA_AGRUPADA: 0, OFERTA_SUPRIMIDA: 0}
+        contagem.update((linha["acao"], linha["total"]) for linha in
+                        conexao.execute("SELECT acao, total FROM contagem_ofertas").fetchall())
+        ativas = conexao.execute("SELECT COUNT(*) FROM ofertas_publicadas WHERE expira_em > ?",
+                                 (time.time(),)).fetchone()[0]
+        recebidas = sum(contagem.values())
+        economizados = contagem[OFERTA_AGRUPADA] + contagem[OFERTA_SUPRIMIDA]
+        return {
+            "ofertas_recebidas": recebidas,
+            "enfileiradas": contagem[OFERTA_ENFILEIRADA],
+            "agrupadas": contagem[OFERTA_AGRUPADA],
+            "suprimidas": contagem[OFERTA_SUPRIMIDA],
+            "envios_economizados": economizados,
+            "taxa_repeticao": round(economizados / recebidas, 4) if recebidas else 0.0,
+            "impressoes_na_janela": ativas,
+        }
+
+    # --- Thread de envio ---
+
+    def iniciar(self):
+        """Inicia a thread de envio deste processo (se ainda não estiver rodando)."""
+        self._thread.garantir()
+
+    def _recuperar_envios_interrompidos(self):
+        # Só um processo drena a fila por vez: os envios que ficaram em 'enviando' pertenciam a um processo que morreu
+        self._conexao().execute(
+            "UPDATE envios_telegram SET status = ?, atualizado_em = ? WHERE status = ?",
+            (STATUS_PENDENTE, time.time(), STATUS_ENVIANDO),
+        )
+
+    def _executar(self):
+        while True:
+            try:
+                if not self._lideranca.tentar():
+                    self._acordar.wait(INTERVALO_VERIFICACAO * 5)
+                    self._acordar.clear()
+                    continue
+                espera = self._processar_proximo()
+                if espera > 0:
+                    self._acordar.wait(min(espera, INTERVALO_VERIFICACAO))
+                    self._acordar.clear()
+            except Exception as e:
+                logger.exception("erro inesperado na thread de envio: %s", e)
+                time.sleep(INTERVALO_VERIFICACAO)
+
+    def _processar_proximo(self):
+        """
+        Envia o próximo envio permitido. Retorna quantos segundos esperar antes de
+        tentar de novo (0 quando deve continuar imediatamente).
+        """
+        conexao = self._conexao()
+        agora = time.time()
+        self._liberar_envios_travados(agora)
+        candidatos = conexao.execute(
+            "SELECT id, chat_id, mensagem, link_afiliado, tentativas FROM envios_telegram"
+            " WHERE status = ? AND proxima_tentativa <= ? ORDER BY proxima_tentativa, criado_em LIMIT 50",
+            (STATUS_PENDENTE, agora),
+        ).fetchall()
+        if not candidatos:
+            return INTERVALO_VERIFICACAO
+
+        # Escolhe o primeiro envio cujo chat já pode receber mensagem
+        agora_mono = time.monotonic()
+        escolhido = None
+        menor_espera = None
+        for linha in candidatos:
+            horario = self.limitador.proximo_horario(linha["chat_id"], agora_mono)
+            if horario <= agora_mono:
+                escolhido = linha
+                break
+            espera = horario - agora_mono
+            menor_espera = espera if menor_espera is None else min(menor_espera, espera)
+        if escolhido is None:
+            return menor_espera
+
+        reservado = conexao.execute(
+            "UPDATE envios_telegram SET status = ?, atualizado_em = ? WHERE id = ? AND status = ?",
+            (STATUS_ENVIANDO, agora, escolhido["id"], STATUS_PENDENTE),
+        ).rowcount
+        if not reservado:
+            return 0
+
+        self.limitador.registrar(escolhido["chat_id"], agora_mono)
+        try:
+            resultado = self.enviar(escolhido["chat_id"], escolhido["mensagem"], escolhido["link_afiliado"])
+        except Exception as e:
+            resultado = ResultadoEnvio(False, erro=str(e))
+        self._registrar_resultado(escolhido, resultado)
+        return 0
+
+    def _liberar_envios_travados(self, agora):
+        self._conexao().execute(
+            "UPDATE envios_telegram SET status = ?, atualizado_em = ? WHERE status = ? AND atualizado_em < ?",
+            (STATUS_PENDENTE, agora, STATUS_ENVIANDO, agora - ENVIO_TRAVADO_APOS),
+        )
+
+    def _registrar_resultado(self, envio, resultado):
+        conexao = self._conexao()
+        agora = time.time()
+        tentativas = envio["tentativas"] + 1
+
+        if resultado.ok:
+            conexao.execute(
+                "UPDATE envios_telegram SET status = ?, tentativas = ?, erro = NULL, atualizado_em = ? WHERE id = ?",
+                (STATUS_ENVIADO, tentativas, agora, envio["id"]),
+            )
+            return
+
+        if resultado.permanente or tentativas >= MAX_TENTATIVAS:
+            logger.warning("envio falhou definitivamente",
+                           extra={"campos": {"id_envio": envio["id"], "erro": resultado.erro}})
+            conexao.execute(
+                "UPDATE envios_telegram SET status = ?, tentativas = ?, erro = ?, atualizado_em = ? WHERE id = ?",
+                (STATUS_FALHOU, tentativas, resultado.erro, agora, envio["id"]),
+            )
+            return
+
+        if resultado.retry_after:
+            espera = float(resultado.retry_after)
+            self.limitador.pausar(espera, time.monotonic())
+        else:
+            espera = min(BACKOFF_BASE * (2 ** (tentativas - 1)), BACKOFF_MAXIMO)
+            espera *= random.uniform(0.8, 1.2)  # Jitter para não sincronizar as tentativas
+        logger.info("envio será repetido",
+                    extra={"campos": {"id_envio": envio["id"], "espera": round(espera, 1), "erro": resultado.erro}})
+        conexao.execute(
+            "UPDATE envios_telegram SET status = ?, tentativas = ?, erro = ?, proxima_tentativa = ?,"
+            " atualizado_em = ? WHERE id = ?",
+            (STATUS_PENDENTE, tentativas, resultado.erro, agora + espera, agora, envio["id"]),
+        )
@@ -0,0 +1,243 @@
+"""
+Importação em massa de listas de ofertas (CSV ou JSONL).
+
+O arquivo passa por uma sequência de geradores, linha a linha:
+ler a linha -> extrair o ASIN -> buscar o produto -> montar link e mensagem -> colocar na
+fila do Telegram (ou só simular). Cada linha gera um resultado assim que fica pronta,
+então o progresso pode ser transmitido como NDJSON enquanto a importação roda.
+
+As buscas rodam em paralelo dentro de uma janela fixa (as linhas seguintes só são lidas
+quando há vaga), e os resultados saem na ordem do arquivo: a memória usada não depende do
+tamanho do arquivo.
+
+Colunas (CSV com cabeçalho ou chaves do JSONL):
+    link (ou url) obrigatório; nome, preco_de, preco_por, cupom, descricao e tag_afiliado
+    opcionais. Sem nome/preços na linha, valem os dados buscados na Amazon.
+
+Linha de comando (usa a fila e o cache do app; quem envia é a thread da fila):
+    python -m importacao_ofertas ofertas.csv --tag celoland-20 --simular
+    python -m importacao_ofertas ofertas.jsonl --tag celoland-20 > resultado.ndjson
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from collections import deque
+
+COLUNAS_LINK = ("link", "url")
+
+
+class ImportadorOfertas:
+    """
+    Liga as etapas da importação às funções do app: 'buscar(url)' retorna
+    {"resultado", "origem"}, 'montar_link(link, tag)', 'montar_mensagem(...)' e
+    'enfileirar(chat_id, mensagem, link_afiliado, preco_por, cupom)' retorna (id do envio, ação),
+    sendo a ação "enfileirada" ou, para uma oferta repetida, "agrupada"/"suprimida".
+    """
+
+    def __init__(self, buscar, montar_link, montar_mensagem, enfileirar, extrair_asin, obter_executor, janela=16):
+        self.buscar = buscar
+        self.montar_link = montar_link
+        self.montar_mensagem = montar_mensagem
+        self.enfileirar = enfileirar
+        self.extrair_asin = extrair_asin
+        self.obter_executor = obter_executor  # Pool de threads do processo atual (recriado após fork)
+        self.janela = janela
+
+    def importar(self, arquivo, chat_id, tag_afiliado=None, formato=None, simular=False):
+        """
+        Gera um dict por linha do arquivo (texto) e, no fim, {"resumo": {...}}.
+        'formato' é "csv" ou "jsonl" (None = detectar pelo primeiro caractere).
+        """
+        resumo = {"linhas": 0, "enfileiradas": 0, "repetidas": 0, "simuladas": 0, "erros": 0}
+        linhas = self._com_asin(ler_linhas(arquivo, formato))
+        for resultado in self._processar(self._buscar_em_janela(linhas), chat_id, tag_afiliado, simular):
+            resumo["linhas"] += 1
+            if not resultado["sucesso"]:
+                resumo["erros"] += 1
+            elif simular:
+                resumo["simuladas"] += 1
+            elif resultado.get("repetida"):
+                resumo["repetidas"] += 1
+            else:
+                resumo["enfileiradas"] += 1
+            yield resultado
+        yield {"resumo": resumo}
+
+    # --- Etapas ---
+
+    def _com_asin(self, linhas):
+        for numero, dados, erro in linhas:
+            if erro is None:
+                link = next((str(dados[c]).strip() for c in COLUNAS_LINK if dados.get(c)), None)
+                if not link:
+                    erro = "Link da Amazon é obrigatório"
+                else:
+                    dados["link"] = link
+                    if not self.extrair_asin(link):
+                        erro = "ASIN não encontrado no link"
+            yield numero, dados, erro
+
+    def _buscar_em_janela(self, linhas):
+        """Busca até 'janela' produtos ao mesmo tempo, devolvendo na ordem das linhas."""
+        executor = self.obter_executor()
+        pendentes = deque()
+        for numero, dados, erro in linhas:
+            futuro = executor.submit(self.buscar, dados["link"]) if erro is None else None
+            pendentes.append((numero, dados, erro, futuro))
+            if len(pendentes) >= self.janela:
+                yield self._concluir(*pendentes.popleft())
+        while pendentes:
+            yield self._concluir(*pendentes.popleft())
+
+    def _concluir(self, numero, dados, erro, futuro):
+        busca = None
+        if futuro is not None:
+            try:
+                busca = futuro.result()
+            except Exception as e:
+                erro = f"Falha na busca do produto: {e}"
+        return numero, dados, erro, busca
+
+    def _processar(self, linhas, chat_id, tag_padrao, simular):
+        for numero, dados, erro, busca in linhas:
+            resultado = {"linha": numero, "sucesso": False}
+            if dados:
+                resultado["link"] = dados.get("link")
+            if erro is not None:
+                resultado["erro"] = erro
+                yield resultado
+                continue
+
+            asin = self.extrair_asin(dados["link"])
+            produto = busca["resultado"] if busca["origem"] == "amazon" else {}
+            nome = dados.get("nome") or produto.get("titulo")
+            preco_por = dados.get("preco_por") or produto.get("preco_atual")
+            preco_de = dados.get("preco_de") or produto.get("preco_antigo")
+            tag_afiliado = dados.get("tag_afiliado") or tag_padrao
+            resultado["asin"] = asin
+
+            if not tag_afiliado:
+                resultado["erro"] = "Tag de afiliado é obrigatória"
+            elif not nome or not preco_por:
+                # Sem dados da Amazon (bloqueio/simulação) e sem nome e preço na linha: não dá para anunciar
+                resultado["erro"] = "Produto não encontrado na Amazon e a linha não traz nome e preço"
+            else:
+                link_afiliado = self.montar_link(dados["link"], tag_afiliado)
+                if link_afiliado is None:
+                    resultado["erro"] = "Link inválido"  # Ex: caminho sem host ('/dp/B09B8V1LZ3')
+            if "erro" in resultado:
+                yield resultado
+                continue
+
+            mensagem = self.montar_mensagem(nome, link_afiliado, preco_de=preco_de, preco_por=preco_por,
+                                            cupom=dados.get("cupom"), descricao=dados.get("descricao"))
+            resultado.update({"sucesso": True, "titulo": nome, "preco_de": preco_de, "preco_por": preco_por,
+                              "link_afiliado": link_afiliado, "origem": busca["origem"]})
+            if simular:
+                resultado["mensagem"] = mensagem
+            else:
+                try:
+                    id_envio, acao = self.enfileirar(chat_id, mensagem, link_afiliado, preco_por, dados.get("cupom"))
+                    resultado["id_envio"] = id_envio
+                    if acao != "enfileirada":
+                        resultado.update({"repetida": True, "acao": acao})
+                except Exception as e:
+                    resultado.update({"sucesso": False, "erro": f"Falha ao colocar na fila: {e}"})
+            yield resultado
+
+
+def ler_linhas(arquivo, formato=None):
+    """
+    Gera (número da linha, dados, erro) para cada registro do arquivo (texto), sem carregar
+    o arquivo inteiro. Linhas em branco são ignoradas.
+    """
+    if formato is None:
+        primeira = ""
+        while True:
+            primeira = arquivo.readline()
+            if not primeira or primeira.strip():
+                break
+        formato = "jsonl" if primeira.lstrip().startswith("{") else "csv"
+        arquivo = _recolocar_linha(primeira, arquivo)
+
+    if formato == "jsonl":
+        for numero, linha in enumerate(arquivo, start=1):
+            if not linha.strip():
+                continue
+            try:
+                dados = json.loads(linha)
+            except ValueError:
+                yield numero, None, "JSON inválido"
+                continue
+            if not isinstance(dados, dict):
+                yield numero, None, "Cada linha deve ser um objeto JSON"
+                continue
+            yield numero, dados, None
+        return
+
+    leitor = csv.DictReader(arquivo)
+    for dados in leitor:
+        if not any((valor or "").strip() for valor in dados.values() if isinstance(valor, str)):
+            continue
+        dados = {(chave or "").strip().lower(): (valor.strip() if isinstance(valor, str) else valor)
+                 for chave, valor in dados.items()}
+        yield leitor.line_num, dados, None
+
+
+def abrir_texto(fluxo):
+    """
+    Abre como texto um fluxo binário que só tem read() (ex: o corpo da requisição no
+    gunicorn), para ler linha a linha sem carregar tudo.
+    """
+    return io.TextIOWrapper(io.BufferedReader(_FluxoBruto(fluxo)), encoding="utf-8-sig", newline="")
+
+
+class _FluxoBruto(io.RawIOBase):
+    def __init__(self, fluxo):
+        self._fluxo = fluxo
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        dados = self._fluxo.read(len(destino))
+        destino[:len(dados)] = dados
+        return len(dados)
+
+
+def _recolocar_linha(linha, arquivo):
+    """Iterador que devolve 'linha' e depois o resto do arquivo (para detectar o formato sem perdê-la)."""
+    if linha:
+        yield linha
+    yield from arquivo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa uma lista de ofertas (CSV ou JSONL).")
+    parser.add_argument("arquivo", help="Arquivo CSV/JSONL ('-' para a entrada padrão)")
+    parser.add_argument("--tag", help="Tag de afiliado para as linhas sem 'tag_afiliado'")
+    parser.add_argument("--formato", choices=("csv", "jsonl"), help="Padrão: detectar pelo conteúdo")
+    parser.add_argument("--chat-id", help="Chat do Telegram (padrão: TELEGRAM_CHAT_ID do app)")
+    parser.add_argument("--simular", action="store_true", help="Monta as mensagens sem colocar na fila")
+    args = parser.parse_args(argv)
+
+    import app  # Importado aqui: o app importa este módulo
+
+    if args.arquivo == "-":
+        arquivo = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="")
+    else:
+        arquivo = open(args.arquivo, encoding="utf-8-sig", newline="")
+    erros = 0
+    with arquivo:
+        for resultado in app.importador_ofertas.importar(arquivo, args.chat_id or app.TELEGRAM_CHAT_ID,
+                                                         args.tag, args.formato, args.simular):
+            sys.stdout.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+            erros = resultado.get("resumo", {}).get("erros", erros)
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
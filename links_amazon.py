@@ -0,0 +1,224 @@
+"""
+Links da Amazon: extração do ASIN e link de afiliado canônico.
+
+Todas as formas de link de produto (/dp/, /gp/product/, /gp/aw/d/, /exec/obidos/ASIN/,
+com slug, ref=, parâmetros de rastreamento, tag antiga, tag codificada...) viram
+    https://www.amazon.com.br/dp/<ASIN>?tag=<tag>
+Links curtos (amzn.to, a.co) são expandidos seguindo o redirecionamento, com cache em
+memória. Links sem ASIN (busca, lojas) e links de outros sites mantêm o caminho e só
+trocam a tag.
+
+A reescrita em lote (reescrever_links) é feita para listas de dezenas de milhares de
+links: o parsing é um único regex compilado por link e os links curtos repetidos são
+expandidos uma vez só, em paralelo.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote, unquote_plus
+
+# Partes do link: esquema, host, caminho, query e fragmento (compilado uma única vez)
+LINK_REGEX = re.compile(
+    r"^\s*(?:(?P<esquema>https?)://)?(?P<host>[^/?#\s]*[.:][^/?#\s]*)?(?P<caminho>[^?#\s]*)"
+    r"(?:\?(?P<query>[^#\s]*))?(?:#(?P<fragmento>\S*))?\s*$",
+    re.IGNORECASE,
+)
+
+# ASIN no caminho: logo depois de um caminho de produto conhecido (aceita minúsculas) ou, mais
+# adiante no mesmo caminho de produto, um segmento de 10 caracteres (ex: /dp/product/<ASIN>,
+# /gp/product/glance/<ASIN>). Outros segmentos de 10 caracteres (/stores/page/...) não são ASIN.
+ASIN_REGEX = re.compile(
+    r"/(?:dp|gp/product|gp/aw/d|gp/offer-listing|exec/obidos/ASIN|o/ASIN)/(?P<asin>[A-Za-z0-9]{10})(?=[/?#]|$)"
+    r"|/(?:dp|gp/product|gp/aw/d)/(?:[^/?#]+/)*?(?P<segmento>[A-Z0-9]{10})(?=[/?#]|$)"
+)
+
+AMAZON_HOST_REGEX = re.compile(r"^(?:[a-z0-9-]+\.)*?(?P<dominio>amazon\.[a-z.]+)$")
+
+HOSTS_LINK_CURTO = frozenset({"amzn.to", "a.co", "amzn.eu", "amzn.asia"})
+
+
+def separar_link(link):
+    """Retorna (esquema, host, caminho, query, fragmento) do link, ou None se não for um link."""
+    partes = LINK_REGEX.match(link) if isinstance(link, str) else None
+    if partes is None or not partes.group("host"):
+        return None
+    return partes.group("esquema"), partes.group("host"), partes.group("caminho"), partes.group("query"), \
+        partes.group("fragmento")
+
+
+def extrair_asin(url):
+    """Retorna o ASIN contido na URL (em maiúsculas) ou None se não houver."""
+    partes = LINK_REGEX.match(url) if isinstance(url, str) else None
+    caminho = partes.group("caminho") if partes is not None else url
+    encontrado = ASIN_REGEX.search(caminho or "")
+    if encontrado is None:
+        return None
+    return (encontrado.group("asin") or encontrado.group("segmento")).upper()
+
+
+def eh_link_curto(link):
+    """True para links encurtados da Amazon (amzn.to, a.co...), que não trazem o ASIN."""
+    partes = separar_link(link)
+    return partes is not None and partes[1].lower() in HOSTS_LINK_CURTO
+
+
+def host_canonico(host):
+    """www.amazon.com.br para amazon.com.br, m.amazon.com.br, smile.amazon.com.br...; outros hosts como estão."""
+    host = host.lower()
+    amazon = AMAZON_HOST_REGEX.match(host)
+    return "www." + amazon.group("dominio") if amazon else host
+
+
+def eh_host_amazon(host):
+    """True para amazon.com.br, www.amazon.com, m.amazon.de... (não inclui os encurtadores)."""
+    return AMAZON_HOST_REGEX.match(host.lower()) is not None
+
+
+def valor_tag(tag_afiliado):
+    """Tag pronta para a query (aceita a tag já codificada, ex: celoland%2D20)."""
+    return quote(unquote_plus(str(tag_afiliado).strip()), safe="-_.~")
+
+
+def montar_link_afiliado(link_original, tag_afiliado, expandir=None):
+    """
+    Link de afiliado canônico (https://<host>/dp/<ASIN>?tag=...). Links sem ASIN ou de
+    outros sites mantêm caminho e parâmetros, trocando qualquer tag existente. 'expandir(link)'
+    resolve links curtos (retorna o destino ou None); sem ele, o link curto só recebe a tag.
+    Retorna None se 'link_original' não for um link.
+    """
+    return _reescrever(link_original, valor_tag(tag_afiliado), expandir)[1]
+
+
+def _reescrever(link, tag, expandir):
+    """(asin, link de afiliado) para um link; o link de afiliado é None se o link for inválido."""
+    partes = LINK_REGEX.match(link) if isinstance(link, str) else None
+    if partes is None or not partes.group("host"):
+        return None, None
+    if expandir is not None and partes.group("host").lower() in HOSTS_LINK_CURTO:
+        destino = expandir(link.strip())
+        destino_partes = LINK_REGEX.match(destino) if destino else None
+        if destino_partes is not None and destino_partes.group("host"):
+            partes = destino_partes
+
+    esquema, host, caminho = partes.group("esquema"), partes.group("host"), partes.group("caminho")
+    encontrado = ASIN_REGEX.search(caminho) if eh_host_amazon(host) else None
+    if encontrado is not None:
+        asin = (encontrado.group("asin") or encontrado.group("segmento")).upper()
+        return asin, f"{(esquema or 'https').lower()}://{host_canonico(host)}/dp/{asin}?tag={tag}"
+
+    # Sem ASIN (ou fora da Amazon): troca só a tag, preservando o resto do link
+    parametros = [p for p in (partes.group("query") or "").split("&") if p and not _eh_parametro_tag(p)]
+    parametros.append("tag=" + tag)
+    novo = f"{esquema + '://' if esquema else ''}{host}{caminho}?{'&'.join(parametros)}"
+    fragmento = partes.group("fragmento")
+    return None, novo + "#" + fragmento if fragmento is not None else novo
+
+
+def _eh_parametro_tag(parametro):
+    # 'tag=x', 'TAG=x', 'tag%3Dx' (o '=' codificado) e '%74ag=x' são todos a tag
+    chave = unquote_plus(parametro.split("=", 1)[0])
+    return chave.split("=", 1)[0].strip().lower() == "tag"
+
+
+def reescrever_links(links, tag_afiliado, expansor=None, executor=None):
+    """
+    Reescreve uma lista de links com a tag de afiliado. Retorna (resultados, resumo):
+    um dict por link, na mesma ordem ({"link", "asin", "link_afiliado"} ou {"link", "erro"}),
+    e as contagens. Os links curtos distintos são expandidos antes, em paralelo no 'executor'.
+    """
+    tag = valor_tag(tag_afiliado)
+    expandir = None
+    expandidos = 0
+    if expansor is not None:
+        curtos = {link.strip() for link in links if isinstance(link, str) and eh_link_curto(link)}
+        destinos = expansor.expandir_varios(curtos, executor)
+        expandidos = sum(1 for destino in destinos.values() if destino)
+        expandir = destinos.get
+
+    resultados = []
+    resumo = {"links": len(links), "com_asin": 0, "sem_asin": 0, "invalidos": 0, "curtos_expandidos": expandidos}
+    for link in links:
+        asin, link_afiliado = _reescrever(link, tag, expandir)
+        if link_afiliado is None:
+            resumo["invalidos"] += 1
+            resultados.append({"link": link, "erro": "Link inválido"})
+            continue
+        resumo["com_asin" if asin else "sem_asin"] += 1
+        resultados.append({"link": link, "asin": asin, "link_afiliado": link_afiliado})
+    return resultados, resumo
+
+
+class ExpansorLinksCurtos:
+    """
+    Expande links curtos com 'resolver(link)' (retorna o link de destino ou None) e guarda
+    o destino em cache LRU com TTL. Falhas ficam em cache por pouco tempo, para não
+    repetir a requisição a cada link da mesma lista.
+    """
+
+    def __init__(self, resolver, max_itens=20000, ttl=86400.0, ttl_falha=60.0):
+        self.resolver = resolver
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.ttl_falha = ttl_falha
+        self._itens = OrderedDict()  # link curto -> (expira_em, destino)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.falhas = 0
+
+    def _do_cache(self, link):
+        with self._lock:
+            item = self._itens.get(link)
+            if item is None or item[0] <= time.monotonic():
+                self.misses += 1
+                return False, None
+            self._itens.move_to_end(link)
+            self.hits += 1
+            return True, item[1]
+
+    def _guardar(self, link, destino):
+        with self._lock:
+            self._itens[link] = (time.monotonic() + (self.ttl if destino else self.ttl_falha), destino)
+            self._itens.move_to_end(link)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def expandir(self, link):
+        """Destino do link curto (do cache ou resolvido agora), ou None se não deu para expandir."""
+        encontrado, destino = self._do_cache(link)
+        if encontrado:
+            return destino
+        return self._resolver_e_guardar(link)
+
+    def _resolver_e_guardar(self, link):
+        try:
+            destino = self.resolver(link)
+        except Exception:
+            destino = None
+        if not destino:
+            with self._lock:
+                self.falhas += 1
+        self._guardar(link, destino)
+        return destino
+
+    def expandir_varios(self, links, executor=None):
+        """{link: destino} para os links (distintos); os que não estão em cache são resolvidos em paralelo."""
+        destinos = {}
+        faltando = []
+        for link in links:
+            encontrado, destino = self._do_cache(link)
+            if encontrado:
+                destinos[link] = destino
+            else:
+                faltando.append(link)
+        if executor is None or len(faltando) < 2:
+            destinos.update((link, self._resolver_e_guardar(link)) for link in faltando)
+        else:
+            destinos.update(zip(faltando, executor.map(self._resolver_e_guardar, faltando)))
+        return destinos
+
+    def estatisticas(self):
+        with self._lock:
+            return {"itens": len(self._itens), "max_itens": self.max_itens, "hits": self.hits,
+                    "misses": self.misses, "falhas": self.falhas}
@@ -0,0 +1,81 @@
+"""
+Mensagem da oferta para o Telegram e a impressão digital usada para não repetir ofertas.
+
+Os modelos da mensagem são montados uma única vez, na importação do módulo: um por
+combinação das partes opcionais (preço de, preço por, cupom e descrição), então montar
+uma mensagem é só preencher um modelo pronto. As mensagens montadas ficam num cache LRU,
+porque a mesma oferta costuma ser montada de novo (reenvios, importações repetidas,
+monitor de preços).
+
+A impressão digital identifica a oferta pelo conteúdo que importa para quem recebe:
+produto (ASIN do link canônico), preço, cupom e chat. Nome e descrição não entram, assim
+a mesma oferta com outro texto continua sendo a mesma oferta.
+"""
+import hashlib
+import os
+import re
+from functools import lru_cache
+from itertools import product
+
+from links_amazon import extrair_asin
+from precos import preco_para_centavos
+
+MENSAGENS_CACHE = int(os.environ.get("MENSAGENS_CACHE", "4096"))  # Mensagens montadas guardadas (LRU)
+
+CABECALHO = "🚨 *OFERTA EXCLUSIVA* 🚨\n\n🎁 *{nome}*\n\n"
+PARTES_OPCIONAIS = (
+    "❌ DE: ~{preco_de}~\n",  # ~ risca (strikethrough) no Markdown
+    "🔥 POR: *{preco_por}*\n",  # * negrito
+    "\n🏷️ *Cupom*: `{cupom}`\n",  # ` código
+    "\n📝 _{descricao}_\n",  # _ itálico
+)
+RODAPE = "\n🔗 [Link para Amazon]({link_afiliado})"
+
+# (tem preço de, tem preço por, tem cupom, tem descrição) -> modelo pronto
+MODELOS = {
+    presentes: CABECALHO + "".join(parte for parte, presente in zip(PARTES_OPCIONAIS, presentes) if presente) + RODAPE
+    for presentes in product((False, True), repeat=len(PARTES_OPCIONAIS))
+}
+
+ESPACOS_REGEX = re.compile(r"\s+")
+
+
+def _montar(nome, link_afiliado, preco_de, preco_por, cupom, descricao):
+    modelo = MODELOS[bool(preco_de), bool(preco_por), bool(cupom), bool(descricao)]
+    return modelo.format(nome=nome, link_afiliado=link_afiliado, preco_de=preco_de, preco_por=preco_por,
+                         cupom=cupom, descricao=descricao)
+
+
+_montar_em_cache = lru_cache(maxsize=MENSAGENS_CACHE)(_montar)
+
+
+def montar_mensagem_oferta(nome, link_afiliado, preco_de=None, preco_por=None, cupom=None, descricao=None):
+    """Formata a mensagem da oferta em Markdown do Telegram."""
+    try:
+        return _montar_em_cache(nome, link_afiliado, preco_de, preco_por, cupom, descricao)
+    except TypeError:
+        # Valor que não serve de chave (lista/dict vindo do JSON): monta sem cache
+        return _montar(nome, link_afiliado, preco_de, preco_por, cupom, descricao)
+
+
+def estatisticas_mensagens():
+    informacoes = _montar_em_cache.cache_info()
+    consultas = informacoes.hits + informacoes.misses
+    return {"itens": informacoes.currsize, "max_itens": informacoes.maxsize, "hits": informacoes.hits,
+            "misses": informacoes.misses, "taxa_acerto": round(informacoes.hits / consultas, 4) if consultas else 0.0}
+
+
+def _normalizar(texto):
+    return ESPACOS_REGEX.sub(" ", str(texto)).strip().lower() if texto else ""
+
+
+def impressao_oferta(chat_id, link_afiliado, preco_por=None, cupom=None):
+    """
+    Impressão digital (hex) da oferta: ASIN do link canônico (ou o próprio link, sem ASIN),
+    preço em centavos ('R$ 1.234,50' e '1234,5' são o mesmo preço), cupom e chat.
+    """
+    produto = extrair_asin(link_afiliado) or _normalizar(link_afiliado)
+    centavos = preco_para_centavos(preco_por)
+    preco = str(centavos) if centavos is not None else _normalizar(preco_por)
+    cupom = _normalizar(cupom).upper()
+    return hashlib.sha1(f"{chat_id}\x1f{produto}\x1f{preco}\x1f{cupom}".encode("utf-8")).hexdigest()
@@ -0,0 +1,276 @@
+"""
+Monitor de preços: lista de produtos vigiados (SQLite) verificada por um agendador em segundo plano.
+
+Uma única thread agendadora escolhe os itens com verificação vencida (consulta indexada por
+'proxima_verificacao') e entrega as buscas a um pool de threads limitado, então a lista pode
+ter dezenas de milhares de ASINs sem uma thread por item. O intervalo entre verificações
+tem jitter para espalhar a carga na Amazon.
+
+O histórico guarda só as mudanças de preço, em centavos inteiros e timestamp em segundos,
+com chave primária (asin, momento) para a consulta por ASIN ser indexada.
+Quando o preço cruza o alvo, 'ao_cruzar_alvo' é chamado (o app coloca a oferta na fila do Telegram).
+"""
+import logging
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from precos import centavos_para_preco, preco_para_centavos
+from recursos_processo import ConexoesSQLite, ThreadDoProcesso, TravaLider
+
+INTERVALO_PADRAO = 1800  # Segundos entre verificações de um mesmo item
+INTERVALO_MINIMO = 300
+JITTER = 0.15  # +-15% no intervalo
+RESERVA = 600.0  # Segundos que um item reservado fica fora da fila enquanto é verificado
+ESPERA_APOS_FALHA = 600  # Segundos até tentar de novo um item cuja busca falhou
+ESPERA_MAXIMA_AGENDADOR = 5.0
+
+logger = logging.getLogger(__name__)
+
+
+class MonitorPrecos:
+    """
+    'buscar' recebe a URL e retorna {"resultado": ..., "origem": ...} (origem "amazon" quando
+    o preço veio da página real; simulações e falhas não entram no histórico).
+    'ao_cruzar_alvo' recebe (monitorado, resultado) quando o preço fica menor ou igual ao alvo.
+    """
+
+    def __init__(self, caminho_db, buscar, ao_cruzar_alvo, max_threads=8):
+        self.caminho_db = caminho_db
+        self.buscar = buscar
+        self.ao_cruzar_alvo = ao_cruzar_alvo
+        self.max_threads = max_threads
+        self._conexao = ConexoesSQLite(caminho_db, sqlite3.Row)
+        self._acordar = threading.Event()
+        self._thread = ThreadDoProcesso(self._executar, "monitor-precos", preparar=self._preparar_agendador)
+        self._lideranca = TravaLider(caminho_db + ".lock")  # Só um processo verifica a lista por vez
+        self._executor = None
+        self._em_andamento = 0
+        self._lock = threading.Lock()  # Protege _em_andamento e os contadores (threads do pool)
+        self.verificacoes = 0
+        self.falhas = 0
+        self.alertas = 0
+        self._criar_tabelas()
+
+    # --- Banco de dados ---
+
+    def _criar_tabelas(self):
+        conexao = self._conexao()
+        conexao.execute("""
+            CREATE TABLE IF NOT EXISTS monitorados (
+                asin TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                tag_afiliado TEXT NOT NULL,
+                preco_alvo_centavos INTEGER NOT NULL,
+                intervalo INTEGER NOT NULL,
+                ultimo_preco_centavos INTEGER,
+                alerta_ativo INTEGER NOT NULL DEFAULT 0,
+                proxima_verificacao REAL NOT NULL,
+                ultima_verificacao REAL,
+                criado_em REAL NOT NULL
+            )
+        """)
+        conexao.execute(
+            "CREATE INDEX IF NOT EXISTS idx_monitorados_proxima ON monitorados (proxima_verificacao)"
+        )
+        conexao.execute("""
+            CREATE TABLE IF NOT EXISTS historico_precos (
+                asin TEXT NOT NULL,
+                momento INTEGER NOT NULL,
+                preco_centavos INTEGER NOT NULL,
+                PRIMARY KEY (asin, momento)
+            ) WITHOUT ROWID
+        """)
+
+    # --- API usada pelos endpoints ---
+
+    def adicionar(self, asin, url, tag_afiliado, preco_alvo_centavos, intervalo=INTERVALO_PADRAO):
+        """Adiciona (ou atualiza) um produto vigiado. A primeira verificação acontece em segundos."""
+        agora = time.time()
+        intervalo = max(int(intervalo), INTERVALO_MINIMO)
+        self._conexao().execute(
+            "INSERT INTO monitorados (asin, url, tag_afiliado, preco_alvo_centavos, intervalo,"
+            " proxima_verificacao, criado_em) VALUES (?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (asin) DO UPDATE SET url = excluded.url, tag_afiliado = excluded.tag_afiliado,"
+            " preco_alvo_centavos = excluded.preco_alvo_centavos, intervalo = excluded.intervalo,"
+            " proxima_verificacao = excluded.proxima_verificacao, alerta_ativo = 0",
+            (asin, url, tag_afiliado, preco_alvo_centavos, intervalo, agora + random.uniform(0, 5), agora),
+        )
+        self.iniciar()
+        self._acordar.set()
+
+    def remover(self, asin):
+        """Remove o produto da lista (o histórico de preços é mantido)."""
+        return self._conexao().execute("DELETE FROM monitorados WHERE asin = ?", (asin,)).rowcount > 0
+
+    def listar(self, limite=100, deslocamento=0):
+        linhas = self._conexao().execute(
+            "SELECT asin, url, preco_alvo_centavos, intervalo, ultimo_preco_centavos, alerta_ativo,"
+            " proxima_verificacao, ultima_verificacao FROM monitorados ORDER BY asin LIMIT ? OFFSET ?",
+            (limite, deslocamento),
+        ).fetchall()
+        return [dict(linha) for linha in linhas]
+
+    def historico(self, asin, desde=0, limite=1000):
+        """Mudanças de preço do ASIN (mais recentes primeiro)."""
+        linhas = self._conexao().execute(
+            "SELECT momento, preco_centavos FROM historico_precos WHERE asin = ? AND momento >= ?"
+            " ORDER BY momento DESC LIMIT ?",
+            (asin, int(desde), limite),
+        ).fetchall()
+        return [dict(linha) for linha in linhas]
+
+    def estatisticas(self):
+        total = self._conexao().execute("SELECT COUNT(*) FROM monitorados").fetchone()[0]
+        with self._lock:
+            return {
+                "monitorados": total,
+                "em_andamento": self._em_andamento,
+                "verificacoes": self.verificacoes,
+                "falhas": self.falhas,
+                "alertas": self.alertas,
+            }
+
+    def _contar(self, contador):
+        with self._lock:
+            setattr(self, contador, getattr(self, contador) + 1)
+
+    # --- Agendador ---
+
+    def iniciar(self):
+        """Inicia o agendador deste processo (se ainda não estiver rodando)."""
+        self._thread.garantir()
+
+    def _preparar_agendador(self, novo_processo):
+        if novo_processo:
+            # O pool de threads herdado do pai não tem threads no filho
+            self._executor = None
+            self._em_andamento = 0
+        self._executor = self._executor or ThreadPoolExecutor(
+            max_workers=self.max_threads, thread_name_prefix="monitor-precos"
+        )
+
+    def _executar(self):
+        while True:
+            try:
+                if not self._lideranca.tentar():
+                    self._acordar.wait(ESPERA_MAXIMA_AGENDADOR)
+                    self._acordar.clear()
+                    continue
+                espera = self._agendar()
+                if espera > 0:
+                    self._acordar.wait(espera)
+                    self._acordar.clear()
+            except Exception as e:
+                logger.exception("erro inesperado no agendador: %s", e)
+                time.sleep(ESPERA_MAXIMA_AGENDADOR)
+
+    def _agendar(self):
+        """Reserva os itens vencidos que cabem no pool. Retorna quantos segundos esperar."""
+        with self._lock:
+            vagas = self.max_threads * 2 - self._em_andamento  # Mantém uma fila curta no pool
+        if vagas <= 0:
+            return 0.5
+
+        itens = self._reservar(vagas)
+        for item in itens:
+            with self._lock:
+                self._em_andamento += 1
+            self._executor.submit(self._verificar, item)
+        if itens:
+            return 0
+
+        proxima = self._conexao().execute("SELECT MIN(proxima_verificacao) FROM monitorados").fetchone()[0]
+        if proxima is None:
+            return ESPERA_MAXIMA_AGENDADOR
+        return min(max(proxima - time.time(), 0.05), ESPERA_MAXIMA_AGENDADOR)
+
+    def _reservar(self, quantidade):
+        """Marca os itens vencidos como reservados (empurra 'proxima_verificacao') e os retorna."""
+        conexao = self._conexao()
+        agora = time.time()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            linhas = conexao.execute(
+                "SELECT * FROM monitorados WHERE proxima_verificacao <= ? ORDER BY proxima_verificacao LIMIT ?",
+                (agora, quantidade),
+            ).fetchall()
+            conexao.executemany(
+                "UPDATE monitorados SET proxima_verificacao = ? WHERE asin = ?",
+                [(agora + RESERVA, linha["asin"]) for linha in linhas],
+            )
+            conexao.execute("COMMIT")
+        except Exception:
+            conexao.execute("ROLLBACK")
+            raise
+        return [dict(linha) for linha in linhas]
+
+    def _verificar(self, item):
+        try:
+            self._verificar_item(item)
+        except Exception as e:
+            self._contar("falhas")
+            logger.warning("erro ao verificar produto", extra={"campos": {"asin": item["asin"], "erro": str(e)}})
+        finally:
+            with self._lock:
+                self._em_andamento -= 1
+            self._acordar.set()
+
+    def _verificar_item(self, item):
+        busca = self.buscar(item["url"])
+        resultado = busca["resultado"]
+        centavos = preco_para_centavos(resultado.get("preco_atual")) if busca["origem"] == "amazon" else None
+        conexao = self._conexao()
+        agora = time.time()
+        self._contar("verificacoes")
+
+        if centavos is None:
+            # Scraping falhou (ou caiu na simulação): não registra nada e tenta mais tarde
+            self._contar("falhas")
+            conexao.execute(
+                "UPDATE monitorados SET proxima_verificacao = ?, ultima_verificacao = ? WHERE asin = ?",
+                (agora + ESPERA_APOS_FALHA * random.uniform(1 - JITTER, 1 + JITTER), agora, item["asin"]),
+            )
+            return
+
+        abaixo_do_alvo = centavos <= item["preco_alvo_centavos"]
+        cruzou = abaixo_do_alvo and not item["alerta_ativo"]
+        proxima = agora + item["intervalo"] * random.uniform(1 - JITTER, 1 + JITTER)
+        # Ao cruzar o alvo, o alerta só fica ativo depois que a oferta estiver na fila (ver abaixo)
+        alerta_ativo = 1 if abaixo_do_alvo and not cruzou else 0
+
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            if centavos != item["ultimo_preco_centavos"]:
+                conexao.execute(
+                    "INSERT OR REPLACE INTO historico_precos (asin, momento, preco_centavos) VALUES (?, ?, ?)",
+                    (item["asin"], int(agora), centavos),
+                )
+            conexao.execute(
+                "UPDATE monitorados SET ultimo_preco_centavos = ?, alerta_ativo = ?, proxima_verificacao = ?,"
+                " ultima_verificacao = ? WHERE asin = ?",
+                (centavos, alerta_ativo, proxima, agora, item["asin"]),
+            )
+            conexao.execute("COMMIT")
+        except Exception:
+            conexao.execute("ROLLBACK")
+            raise
+
+        if cruzou:
+            logger.info("preço chegou ao alvo", extra={"campos": {
+                "asin": item["asin"],
+                "preco": centavos_para_preco(centavos),
+                "alvo": centavos_para_preco(item["preco_alvo_centavos"]),
+            }})
+            try:
+                self.ao_cruzar_alvo(item, resultado)
+            except Exception:
+                # O alerta continua inativo: a próxima verificação tenta de novo
+                conexao.execute("UPDATE monitorados SET proxima_verificacao = ? WHERE asin = ?",
+                                (agora + ESPERA_APOS_FALHA * random.uniform(1 - JITTER, 1 + JITTER), item["asin"]))
+                raise
+            # O alerta só volta a disparar depois que o preço subir acima do alvo de novo
+            conexao.execute("UPDATE monitorados SET alerta_ativo = 1 WHERE asin = ?", (item["asin"],))
+            self._contar("alertas")
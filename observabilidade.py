@@ -0,0 +1,273 @@
+"""
+Métricas (contadores e histogramas de latência) no formato de texto do Prometheus e logs estruturados.
+
+Cada worker do gunicorn mantém suas métricas em memória e, a cada poucos segundos, grava um
+instantâneo em <diretório>/<instância>-<pid>-<token>.json. O /metrics soma os instantâneos
+dos workers vivos da mesma instância, então a resposta é a mesma não importa qual worker
+atendeu. A instância é o processo pai dos workers (o master do gunicorn; METRICAS_INSTANCIA
+muda isso), então dois serviços na mesma máquina não somam as métricas um do outro. O token
+é novo a cada processo: um pid reaproveitado não sobrescreve o arquivo antigo. Os arquivos
+de processos que já morreram são apagados na coleta. Quando um worker é reiniciado, os
+contadores dele recomeçam do zero, o que o Prometheus trata como reset do contador.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from recursos_processo import ThreadDoProcesso
+
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+INTERVALO_GRAVACAO = 2.0  # Segundos entre instantâneos gravados por worker
+EXPIRACAO_ARQUIVOS = 7 * 24 * 3600  # Arquivos com nome fora do padrão e sem atualização há mais tempo são apagados
+
+
+class Metricas:
+    """Registro de contadores e histogramas do processo."""
+
+    def __init__(self, diretorio=None, instancia=None):
+        self.diretorio = diretorio
+        self.instancia = instancia  # None = METRICAS_INSTANCIA ou o pid do processo pai (master do gunicorn)
+        self._definicoes = {}  # nome -> (tipo, ajuda, buckets)
+        self._contadores = {}  # (nome, rótulos) -> valor
+        self._histogramas = {}  # (nome, rótulos) -> [contagens por bucket..., soma, total]
+        self._lock = threading.Lock()
+        self._alterado = False
+        self._thread = ThreadDoProcesso(self._gravar_periodicamente, "metricas", preparar=self._preparar_gravacao)
+        self._arquivo = None
+        self._arquivo_pid = None
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+    def contador(self, nome, ajuda):
+        self._definicoes[nome] = ("counter", ajuda, None)
+
+    def histograma(self, nome, ajuda, buckets=BUCKETS_PADRAO):
+        self._definicoes[nome] = ("histogram", ajuda, tuple(buckets))
+
+    def incrementar(self, nome, valor=1, **rotulos):
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            self._contadores[chave] = self._contadores.get(chave, 0) + valor
+            self._alterado = True
+        self._garantir_gravacao()
+
+    def observar(self, nome, segundos, **rotulos):
+        buckets = self._definicoes[nome][2]
+        chave = (nome, tuple(sorted(rotulos.items())))
+        with self._lock:
+            valores = self._histogramas.get(chave)
+            if valores is None:
+                valores = self._histogramas[chave] = [0] * (len(buckets) + 2)
+            for i, limite in enumerate(buckets):
+                if segundos <= limite:
+                    valores[i] += 1
+                    break
+            valores[-2] += segundos
+            valores[-1] += 1
+            self._alterado = True
+        self._garantir_gravacao()
+
+    @contextmanager
+    def medir(self, nome, **rotulos):
+        """Observa no histograma o tempo gasto dentro do bloco 'with'."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nome, time.perf_counter() - inicio, **rotulos)
+
+    # --- Agregação entre workers ---
+
+    def instantaneo(self):
+        with self._lock:
+            return {
+                "contadores": [[nome, list(rotulos), valor] for (nome, rotulos), valor in self._contadores.items()],
+                "histogramas": [[nome, list(rotulos), list(valores)]
+                                for (nome, rotulos), valores in self._histogramas.items()],
+            }
+
+    def _instancia(self):
+        return self.instancia or os.environ.get("METRICAS_INSTANCIA") or str(os.getppid())
+
+    def _arquivo_do_processo(self):
+        """Arquivo do instantâneo deste processo (um nome novo por processo, mesmo se o pid se repetir)."""
+        pid = os.getpid()
+        if self._arquivo_pid != pid:
+            self._arquivo = os.path.join(self.diretorio, f"{self._instancia()}-{pid}-{uuid.uuid4().hex[:12]}.json")
+            self._arquivo_pid = pid
+        return self._arquivo
+
+    def gravar(self):
+        """Grava o instantâneo deste processo no diretório compartilhado (troca atômica)."""
+        if not self.diretorio:
+            return
+        with self._lock:
+            self._alterado = False
+        caminho = self._arquivo_do_processo()
+        temporario = f"{caminho}.{threading.get_ident()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(self.instantaneo(), arquivo)
+        os.replace(temporario, caminho)
+
+    def _garantir_gravacao(self):
+        if self.diretorio:
+            self._thread.garantir()
+
+    def _preparar_gravacao(self, novo_processo):
+        if novo_processo:
+            # Processo filho (fork): os números herdados pertencem ao pai
+            with self._lock:
+                self._contadores.clear()
+                self._histogramas.clear()
+
+    def _gravar_periodicamente(self):
+        while True:
+            time.sleep(INTERVALO_GRAVACAO)
+            try:
+                if self._alterado:
+                    self.gravar()
+            except OSError as e:
+                logging.getLogger(__name__).warning("falha ao gravar métricas: %s", e)
+
+    def _instantaneos_dos_workers(self):
+        if not self.diretorio:
+            return [self.instantaneo()]
+        self.gravar()
+        instancia = self._instancia()
+        limite = time.time() - EXPIRACAO_ARQUIVOS
+        por_pid = {}  # pid -> (mtime, caminho) do arquivo mais recente do pid nesta instância
+        for entrada in os.scandir(self.diretorio):
+            if not entrada.name.endswith(".json"):
+                continue
+            partes = entrada.name[:-len(".json")].rsplit("-", 2)
+            try:
+                if len(partes) != 3 or not partes[1].isdigit():
+                    if entrada.stat().st_mtime < limite:
+                        os.remove(entrada.path)  # Formato antigo (<pid>.json) ou arquivo estranho
+                    continue
+                if not _processo_vivo(int(partes[1])):
+                    os.remove(entrada.path)
+                    continue
+                if partes[0] != instancia:
+                    continue
+                atual = (entrada.stat().st_mtime, entrada.path)
+                anterior = por_pid.get(partes[1])
+                if anterior is not None:
+                    # Mesmo pid com dois arquivos: o mais antigo é de um processo morto que teve o pid reaproveitado
+                    atual, antigo = max(atual, anterior), min(atual, anterior)
+                    os.remove(antigo[1])
+                por_pid[partes[1]] = atual
+            except OSError:
+                continue  # Arquivo sumiu (outro worker limpou): segue
+
+        instantaneos = []
+        for _, caminho in por_pid.values():
+            try:
+                with open(caminho, encoding="utf-8") as arquivo:
+                    instantaneos.append(json.load(arquivo))
+            except (OSError, ValueError):
+                continue  # Arquivo sumiu ou está sendo trocado: entra na próxima coleta
+        return instantaneos
+
+    def texto_prometheus(self):
+        """Métricas somadas de todos os workers, no formato de texto do Prometheus."""
+        contadores = {}
+        histogramas = {}
+        for instantaneo in self._instantaneos_dos_workers():
+            for nome, rotulos, valor in instantaneo.get("contadores", []):
+                chave = (nome, tuple(tuple(r) for r in rotulos))
+                contadores[chave] = contadores.get(chave, 0) + valor
+            for nome, rotulos, valores in instantaneo.get("histogramas", []):
+                chave = (nome, tuple(tuple(r) for r in rotulos))
+                soma = histogramas.get(chave)
+                if soma is None:
+                    histogramas[chave] = list(valores)
+                elif len(soma) == len(valores):
+                    histogramas[chave] = [a + b for a, b in zip(soma, valores)]
+
+        linhas = []
+        for nome, (tipo, ajuda, buckets) in sorted(self._definicoes.items()):
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            if tipo == "counter":
+                for (nome_serie, rotulos), valor in sorted(contadores.items()):
+                    if nome_serie == nome:
+                        linhas.append(f"{nome}{_formatar_rotulos(rotulos)} {_formatar_numero(valor)}")
+                continue
+            for (nome_serie, rotulos), valores in sorted(histogramas.items()):
+                if nome_serie != nome or len(valores) != len(buckets) + 2:
+                    continue
+                acumulado = 0
+                for limite, contagem in zip(buckets, valores):
+                    acumulado += contagem
+                    linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos + (('le', _formatar_numero(limite)),))} "
+                                  f"{acumulado}")
+                linhas.append(f"{nome}_bucket{_formatar_rotulos(rotulos + (('le', '+Inf'),))} {valores[-1]}")
+                linhas.append(f"{nome}_sum{_formatar_rotulos(rotulos)} {_formatar_numero(valores[-2])}")
+                linhas.append(f"{nome}_count{_formatar_rotulos(rotulos)} {valores[-1]}")
+        return "\n".join(linhas) + "\n"
+
+
+def _processo_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Existe, mas é de outro usuário
+    return True
+
+
+def _formatar_rotulos(rotulos):
+    if not rotulos:
+        return ""
+    partes = []
+    for nome, valor in rotulos:
+        valor = str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        partes.append(f'{nome}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def _formatar_numero(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor)) if abs(valor) < 1e15 else repr(valor)
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+# --- Logs estruturados ---
+
+class FormatadorJson(logging.Formatter):
+    """Uma linha JSON por evento. Campos extras vão em extra={"campos": {...}}."""
+
+    def format(self, registro):
+        evento = {
+            "momento": self.formatTime(registro, "%Y-%m-%dT%H:%M:%S"),
+            "nivel": registro.levelname,
+            "logger": registro.name,
+            "mensagem": registro.getMessage(),
+        }
+        campos = getattr(registro, "campos", None)
+        if campos:
+            evento.update(campos)
+        if registro.exc_info:
+            evento["excecao"] = self.formatException(registro.exc_info)
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+def configurar_logs(nivel="INFO", formato="json"):
+    """Configura o logger raiz (uma única vez): JSON por linha ou texto simples."""
+    raiz = logging.getLogger()
+    if getattr(raiz, "_celoland_configurado", False):
+        return
+    manipulador = logging.StreamHandler()
+    if formato == "json":
+        manipulador.setFormatter(FormatadorJson())
+    else:
+        manipulador.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    raiz.addHandler(manipulador)
+    raiz.setLevel(nivel)
+    raiz._celoland_configurado = True
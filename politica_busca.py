@@ -0,0 +1,193 @@
+"""
+Política de busca na Amazon que falha rápido.
+
+- Páginas de bloqueio (captcha / "robot check") são reconhecidas pelo status HTTP ou pelos
+  primeiros bytes do corpo, sem ler nem parsear o resto da página.
+- Um disjuntor (circuit breaker) abre depois de várias falhas seguidas: enquanto está
+  aberto as buscas nem vão à Amazon e caem direto no fallback. Passado o resfriamento,
+  uma única busca de teste decide se ele fecha de novo ou volta a abrir (com resfriamento
+  dobrado, até um teto).
+- O timeout acompanha o p95 do tempo de resposta observado em vez de ficar fixo em 20s,
+  e o mesmo p95 serve de atraso para a requisição de hedge (opcional). Um timeout entra
+  como amostra censurada (o dobro do timeout usado), para o timeout crescer quando a
+  Amazon fica mais lenta em vez de estourar em todas as buscas.
+
+O estado é por processo: cada worker do gunicorn tem o seu disjuntor.
+"""
+import re
+import threading
+import time
+from collections import deque
+
+# Status que a Amazon usa para bloquear robôs (não adianta repetir a requisição)
+STATUS_BLOQUEIO = {503: "status_503", 429: "status_429"}
+
+# Marcadores das páginas de bloqueio, procurados só no início do corpo
+BLOQUEIO_REGEX = re.compile(
+    rb'/errors/validateCaptcha|id="captchacharacters"|<title[^>]*>\s*Robot Check|api-services-support@amazon\.com',
+    re.IGNORECASE,
+)
+BLOQUEIO_BYTES_INICIO = 32 * 1024
+
+FECHADO = "fechado"
+ABERTO = "aberto"
+MEIO_ABERTO = "meio_aberto"
+
+
+class PaginaBloqueada(Exception):
+    """A Amazon respondeu com captcha/robot check (ou status de bloqueio) em vez do produto."""
+
+    def __init__(self, motivo):
+        super().__init__(f"Página de bloqueio da Amazon ({motivo}).")
+        self.motivo = motivo
+
+
+class CircuitoAberto(Exception):
+    """A busca nem foi feita: o disjuntor está aberto."""
+
+
+def motivo_bloqueio_status(status):
+    """Motivo do bloqueio indicado pelo status HTTP, ou None."""
+    return STATUS_BLOQUEIO.get(status)
+
+
+def motivo_bloqueio_inicio(inicio):
+    """Motivo do bloqueio indicado pelos primeiros bytes do corpo, ou None."""
+    encontrado = BLOQUEIO_REGEX.search(inicio[:BLOQUEIO_BYTES_INICIO])
+    if encontrado is None:
+        return None
+    return "robot_check" if b"robot" in encontrado.group(0).lower() else "captcha"
+
+
+class DisjuntorCircuito:
+    """
+    Disjuntor com três estados: fechado (normal), aberto (buscas evitadas) e meio aberto
+    (uma busca de teste por vez, depois do resfriamento). limite_falhas=0 desliga o disjuntor.
+    """
+
+    def __init__(self, limite_falhas=5, resfriamento=60.0, resfriamento_maximo=600.0):
+        self.limite_falhas = limite_falhas
+        self.resfriamento_base = resfriamento
+        self.resfriamento_maximo = resfriamento_maximo
+        self.resfriamento = resfriamento
+        self.estado = FECHADO
+        self.falhas_seguidas = 0
+        self.aberto_ate = 0.0
+        self._teste_desde = None
+        self.aberturas = 0
+        self.evitadas = 0
+        self.falhas_por_motivo = {}
+        self.ultimo_motivo = None
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        """True se a busca pode ir à Amazon agora."""
+        with self._lock:
+            if self.estado == FECHADO:
+                return True
+            agora = time.time()
+            if self.estado == ABERTO and agora >= self.aberto_ate:
+                self.estado = MEIO_ABERTO
+                self._teste_desde = None
+            if self.estado == MEIO_ABERTO:
+                # Uma busca de teste por vez; se ela sumir sem resultado, libera outra depois do resfriamento
+                if self._teste_desde is None or agora - self._teste_desde > self.resfriamento:
+                    self._teste_desde = agora
+                    return True
+            self.evitadas += 1
+            return False
+
+    def registrar_sucesso(self):
+        with self._lock:
+            self.falhas_seguidas = 0
+            if self.estado != FECHADO:
+                self.estado = FECHADO
+                self.resfriamento = self.resfriamento_base
+                self._teste_desde = None
+
+    def registrar_falha(self, motivo):
+        """Registra uma falha; retorna True se ela abriu o disjuntor."""
+        with self._lock:
+            self.falhas_seguidas += 1
+            self.falhas_por_motivo[motivo] = self.falhas_por_motivo.get(motivo, 0) + 1
+            self.ultimo_motivo = motivo
+            if self.estado == MEIO_ABERTO:
+                # O teste falhou: volta a abrir, com resfriamento maior
+                self.resfriamento = min(self.resfriamento * 2, self.resfriamento_maximo)
+            elif self.estado == ABERTO or not self.limite_falhas or self.falhas_seguidas < self.limite_falhas:
+                return False
+            self.estado = ABERTO
+            self.aberto_ate = time.time() + self.resfriamento
+            self._teste_desde = None
+            self.aberturas += 1
+            return True
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "estado": self.estado,
+                "falhas_seguidas": self.falhas_seguidas,
+                "aberto_por_mais_segundos": max(round(self.aberto_ate - time.time(), 1), 0)
+                if self.estado == ABERTO else 0,
+                "resfriamento_segundos": self.resfriamento,
+                "aberturas": self.aberturas,
+                "buscas_evitadas": self.evitadas,
+                "falhas_por_motivo": dict(self.falhas_por_motivo),
+                "ultimo_motivo": self.ultimo_motivo,
+            }
+
+
+class TimeoutAdaptativo:
+    """
+    Timeout = p95 das últimas respostas x 'fator', limitado entre 'minimo' e 'maximo'.
+    Até juntar 'amostras_minimas' respostas, usa o máximo. Buscas que estouraram o timeout
+    entram por registrar_timeout.
+    """
+
+    def __init__(self, minimo=3.0, maximo=20.0, fator=3.0, janela=200, amostras_minimas=20):
+        self.minimo = minimo
+        self.maximo = maximo
+        self.fator = fator
+        self.amostras_minimas = amostras_minimas
+        self._amostras = deque(maxlen=janela)
+        self._p95 = None
+        self._novas = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, segundos):
+        with self._lock:
+            self._amostras.append(segundos)
+            self._novas += 1
+            # Recalcula o p95 a cada 10 amostras (ordenar a janela a cada resposta não compensa)
+            if len(self._amostras) >= self.amostras_minimas and (self._p95 is None or self._novas >= 10):
+                ordenadas = sorted(self._amostras)
+                self._p95 = ordenadas[min(int(len(ordenadas) * 0.95), len(ordenadas) - 1)]
+                self._novas = 0
+
+    def registrar_timeout(self, timeout_usado):
+        """
+        A resposta não chegou em 'timeout_usado' segundos: o tempo real é desconhecido, mas
+        maior. Entra como amostra de 2x o timeout, senão o p95 nunca sobe e o timeout fica
+        abaixo da latência da Amazon para sempre.
+        """
+        self.registrar(min(timeout_usado * 2, self.maximo * 2))
+
+    @property
+    def p95(self):
+        """p95 do tempo de resposta (None enquanto não há amostras suficientes)."""
+        return self._p95
+
+    def atual(self):
+        p95 = self._p95
+        if p95 is None:
+            return self.maximo
+        return min(max(p95 * self.fator, self.minimo), self.maximo)
+
+    def estatisticas(self):
+        with self._lock:
+            amostras = len(self._amostras)
+        return {
+            "timeout_segundos": round(self.atual(), 3),
+            "p95_resposta_segundos": round(self._p95, 4) if self._p95 is not None else None,
+            "amostras": amostras,
+        }
@@ -0,0 +1,321 @@
+"""
+Pool de saída para as buscas na Amazon: proxies e perfis de cabeçalhos (User-Agent etc.).
+
+Com um único IP e um único User-Agent, a Amazon passa a bloquear depois de um certo número
+de buscas por minuto. Aqui cada busca sai por um proxy (ou conexão direta) e com um perfil
+de cabeçalhos sorteados entre os membros saudáveis de cada pool.
+
+Cada membro tem uma nota de saúde, atualizada a cada resultado por médias móveis
+exponenciais da taxa de sucesso, da taxa de bloqueio (captcha / 503 / 429) e da latência.
+Bloqueios contam para o perfil de cabeçalhos e falhas de conexão (ou timeout) para o proxy:
+um proxy fora do ar não derruba perfis saudáveis, e vice-versa.
+O sorteio é ponderado pela nota. Um membro com várias falhas seguidas (ou nota muito baixa)
+entra em quarentena e só volta ao sorteio depois que uma thread em segundo plano faz uma
+sondagem por ele, quando a quarentena acaba: se passar, volta; senão, a quarentena recomeça
+com o dobro do tempo.
+
+O estado é por processo: cada worker do gunicorn tem o seu pool.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from recursos_processo import ThreadDoProcesso
+
+SUCESSO = "sucesso"
+BLOQUEIO = "bloqueio"
+FALHA = "falha"
+
+# Perfis de navegador: cabeçalhos enviados junto (o Accept-Encoding fica na sessão)
+PERFIS_CABECALHOS = {
+    "chrome_windows": {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                      "Chrome/126.0.0.0 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+        "Accept-Language": "pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7",
+        "Sec-Ch-Ua": '"Not/A)Brand";v="8", "Chromium";v="126", "Google Chrome";v="126"',
+        "Sec-Ch-Ua-Mobile": "?0",
+        "Sec-Ch-Ua-Platform": '"Windows"',
+    },
+    "chrome_mac": {
+        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) "
+                      "Chrome/125.0.0.0 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+        "Accept-Language": "pt-BR,pt;q=0.9,en;q=0.8",
+        "Sec-Ch-Ua": '"Google Chrome";v="125", "Chromium";v="125", "Not.A/Brand";v="24"',
+        "Sec-Ch-Ua-Mobile": "?0",
+        "Sec-Ch-Ua-Platform": '"macOS"',
+    },
+    "edge_windows": {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                      "Chrome/126.0.0.0 Safari/537.36 Edg/126.0.0.0",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+        "Accept-Language": "pt-BR,pt;q=0.9,en-US;q=0.8",
+        "Sec-Ch-Ua": '"Not/A)Brand";v="8", "Chromium";v="126", "Microsoft Edge";v="126"',
+        "Sec-Ch-Ua-Mobile": "?0",
+        "Sec-Ch-Ua-Platform": '"Windows"',
+    },
+    "firefox_windows": {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:127.0) Gecko/20100101 Firefox/127.0",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+        "Accept-Language": "pt-BR,pt;q=0.8,en-US;q=0.5,en;q=0.3",
+    },
+    "safari_mac": {
+        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+                      "Version/17.5 Safari/605.1.15",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "pt-BR,pt;q=0.9",
+    },
+    "chrome_android": {
+        "User-Agent": "Mozilla/5.0 (Linux; Android 14; SM-S911B) AppleWebKit/537.36 (KHTML, like Gecko) "
+                      "Chrome/126.0.0.0 Mobile Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8",
+        "Accept-Language": "pt-BR,pt;q=0.9,en-US;q=0.8,en;q=0.7",
+        "Sec-Ch-Ua": '"Not/A)Brand";v="8", "Chromium";v="126", "Google Chrome";v="126"',
+        "Sec-Ch-Ua-Mobile": "?1",
+        "Sec-Ch-Ua-Platform": '"Android"',
+    },
+}
+
+logger = logging.getLogger(__name__)
+
+
+def nome_proxy(proxy):
+    """Nome do proxy para status e logs, sem usuário e senha."""
+    if not proxy:
+        return "direto"
+    partes = urlsplit(proxy)
+    return f"{partes.scheme}://{partes.hostname}:{partes.port}" if partes.port else f"{partes.scheme}://{partes.hostname}"
+
+
+class MembroPool:
+    """Um proxy ou perfil de cabeçalhos, com as médias que formam a nota de saúde."""
+
+    def __init__(self, nome, valor):
+        self.nome = nome
+        self.valor = valor
+        self.taxa_sucesso = 1.0  # Otimista: membro novo entra no sorteio com nota máxima
+        self.taxa_bloqueio = 0.0
+        self.latencia = None
+        self.resultados = {SUCESSO: 0, BLOQUEIO: 0, FALHA: 0}
+        self.falhas_seguidas = 0
+        self.quarentena_ate = 0.0
+        self.resfriamento = 0.0
+        self.quarentenas = 0
+        self.sondando = False
+
+    def nota(self, latencia_referencia):
+        """Saúde entre 0 e 1: sucesso x (1 - bloqueio), descontada pela latência."""
+        nota = self.taxa_sucesso * (1.0 - self.taxa_bloqueio)
+        if self.latencia is not None:
+            nota *= latencia_referencia / (latencia_referencia + self.latencia)
+        return nota
+
+    def em_quarentena(self):
+        # Continua em quarentena depois do prazo, até ser liberado (pela sondagem ou pelo sorteio)
+        return bool(self.quarentena_ate)
+
+
+class PoolSaudavel:
+    """Membros de um mesmo tipo (proxies ou perfis), sorteados pela nota de saúde."""
+
+    def __init__(self, nome, membros, quarentena=60.0, quarentena_maxima=900.0, falhas_para_quarentena=3,
+                 nota_minima=0.2, amostras_minimas=10, alfa=0.2, latencia_referencia=2.0):
+        self.nome = nome
+        self.membros = [MembroPool(nome_membro, valor) for nome_membro, valor in membros]
+        self.quarentena = quarentena
+        self.quarentena_maxima = quarentena_maxima
+        self.falhas_para_quarentena = falhas_para_quarentena
+        self.nota_minima = nota_minima
+        self.amostras_minimas = amostras_minimas
+        self.alfa = alfa
+        self.latencia_referencia = latencia_referencia
+        self._lock = threading.Lock()
+
+    def escolher(self, excluir=None, sem_sondagem=False):
+        """
+        Sorteia um membro fora de quarentena, com peso pela nota. Sem 'sem_sondagem', membros
+        cuja quarentena acabou voltam direto ao sorteio (não há quem os sonde). Se todos
+        estão em quarentena, usa o que sai dela primeiro (melhor do que não buscar).
+        """
+        agora = time.time()
+        with self._lock:
+            if not sem_sondagem:
+                for membro in self.membros:
+                    if membro.quarentena_ate and membro.quarentena_ate <= agora and not membro.sondando:
+                        self._liberar(membro)
+            candidatos = [m for m in self.membros if not m.em_quarentena() and m is not excluir]
+            if not candidatos:
+                candidatos = [m for m in self.membros if not m.em_quarentena()] or \
+                    [min(self.membros, key=lambda m: m.quarentena_ate)]
+                return candidatos[0]
+            if len(candidatos) == 1:
+                return candidatos[0]
+            pesos = [max(m.nota(self.latencia_referencia), 0.01) for m in candidatos]
+            return random.choices(candidatos, weights=pesos)[0]
+
+    def registrar(self, membro, resultado, segundos=None):
+        """Atualiza a saúde do membro com o resultado de uma busca (SUCESSO, BLOQUEIO ou FALHA)."""
+        with self._lock:
+            membro.resultados[resultado] += 1
+            membro.taxa_sucesso += self.alfa * ((resultado == SUCESSO) - membro.taxa_sucesso)
+            membro.taxa_bloqueio += self.alfa * ((resultado == BLOQUEIO) - membro.taxa_bloqueio)
+            if segundos is not None:
+                membro.latencia = segundos if membro.latencia is None else \
+                    membro.latencia + self.alfa * (segundos - membro.latencia)
+            if resultado == SUCESSO:
+                membro.falhas_seguidas = 0
+                return
+            membro.falhas_seguidas += 1
+            amostras = sum(membro.resultados.values())
+            if membro.em_quarentena():
+                return
+            if membro.falhas_seguidas >= self.falhas_para_quarentena or (
+                    amostras >= self.amostras_minimas and membro.nota(self.latencia_referencia) < self.nota_minima):
+                self._colocar_em_quarentena(membro)
+
+    def _colocar_em_quarentena(self, membro):
+        membro.resfriamento = min(membro.resfriamento * 2 if membro.resfriamento else self.quarentena,
+                                  self.quarentena_maxima)
+        membro.quarentena_ate = time.time() + membro.resfriamento
+        membro.quarentenas += 1
+        logger.warning("membro do pool de saída em quarentena", extra={"campos": {
+            "pool": self.nome, "membro": membro.nome, "segundos": membro.resfriamento,
+            "nota": round(membro.nota(self.latencia_referencia), 3)}})
+
+    def _liberar(self, membro):
+        # Volta ao sorteio com as médias no meio do caminho: uma nova falha seguida já o devolve à quarentena
+        membro.quarentena_ate = 0.0
+        membro.falhas_seguidas = self.falhas_para_quarentena - 1
+        membro.taxa_sucesso = max(membro.taxa_sucesso, 0.5)
+        membro.taxa_bloqueio = min(membro.taxa_bloqueio, 0.5)
+        logger.info("membro do pool de saída liberado", extra={"campos": {"pool": self.nome, "membro": membro.nome}})
+
+    def para_sondar(self):
+        """Membros cuja quarentena acabou, marcados como em sondagem (fora do sorteio até o resultado)."""
+        agora = time.time()
+        with self._lock:
+            vencidos = [m for m in self.membros if m.quarentena_ate and m.quarentena_ate <= agora and not m.sondando]
+            for membro in vencidos:
+                membro.sondando = True
+            return vencidos
+
+    def concluir_sondagem(self, membro, resultado, segundos=None):
+        """'resultado' None: a sondagem não diz nada sobre o membro, que é sondado de novo na próxima rodada."""
+        with self._lock:
+            membro.sondando = False
+            if resultado is None:
+                return
+            if resultado == SUCESSO:
+                if segundos is not None:
+                    membro.latencia = segundos
+                self._liberar(membro)
+                membro.resfriamento = max(membro.resfriamento / 2, self.quarentena) if membro.resfriamento else 0.0
+            else:
+                self._colocar_em_quarentena(membro)
+
+    def estatisticas(self):
+        agora = time.time()
+        with self._lock:
+            return [{
+                "membro": m.nome,
+                "nota": round(m.nota(self.latencia_referencia), 4),
+                "taxa_sucesso": round(m.taxa_sucesso, 4),
+                "taxa_bloqueio": round(m.taxa_bloqueio, 4),
+                "latencia_segundos": round(m.latencia, 4) if m.latencia is not None else None,
+                "resultados": dict(m.resultados),
+                "em_quarentena": m.em_quarentena(),
+                "quarentena_por_mais_segundos": max(round(m.quarentena_ate - agora, 1), 0),
+                "quarentenas": m.quarentenas,
+            } for m in self.membros]
+
+
+class Saida:
+    """Proxy e perfil escolhidos para uma requisição."""
+
+    __slots__ = ("proxy", "perfil")
+
+    def __init__(self, proxy, perfil):
+        self.proxy = proxy
+        self.perfil = perfil
+
+    @property
+    def url_proxy(self):
+        return self.proxy.valor
+
+    @property
+    def cabecalhos(self):
+        return self.perfil.valor
+
+
+class PoolSaida:
+    """
+    Pools de proxies e de perfis de cabeçalhos. 'proxies' é uma lista de URLs (None = conexão
+    direta); 'perfis' são nomes de PERFIS_CABECALHOS. 'sondar(saida)' retorna (resultado,
+    segundos) e é usada pela thread de sondagem; sem ela, a quarentena só expira.
+    """
+
+    def __init__(self, proxies, perfis, sondar=None, intervalo_sondagem=10.0, **opcoes):
+        desconhecidos = [nome for nome in perfis if nome not in PERFIS_CABECALHOS]
+        if desconhecidos:
+            logger.warning("perfis de cabeçalhos desconhecidos ignorados", extra={"campos": {
+                "perfis": desconhecidos, "conhecidos": list(PERFIS_CABECALHOS)}})
+        perfis = [nome for nome in perfis if nome in PERFIS_CABECALHOS] or list(PERFIS_CABECALHOS)
+        self.proxies = PoolSaudavel("proxies", [(nome_proxy(p), p) for p in proxies], **opcoes)
+        self.perfis = PoolSaudavel("perfis", [(nome, PERFIS_CABECALHOS[nome]) for nome in perfis], **opcoes)
+        self.sondar = sondar
+        self.intervalo_sondagem = intervalo_sondagem
+        self.sondagens = 0
+        self._thread = ThreadDoProcesso(self._sondar_continuamente, "pool-saida")
+
+    def escolher(self, excluir=None):
+        """Saida para a próxima requisição; 'excluir' (outra Saida) evita repetir o proxy (ex: hedge)."""
+        if self.sondar is not None:
+            self._thread.garantir()
+        sem_sondagem = self.sondar is not None
+        proxy = self.proxies.escolher(excluir.proxy if excluir is not None else None, sem_sondagem)
+        perfil = self.perfis.escolher(excluir.perfil if excluir is not None else None, sem_sondagem)
+        return Saida(proxy, perfil)
+
+    def registrar(self, saida, resultado, segundos=None):
+        """Sucesso conta para os dois; bloqueio só para o perfil e falha de conexão só para o proxy."""
+        if resultado != BLOQUEIO:
+            self.proxies.registrar(saida.proxy, resultado, segundos)
+        if resultado != FALHA:
+            self.perfis.registrar(saida.perfil, resultado, segundos)
+
+    # --- Sondagem (thread em segundo plano) ---
+
+    def _sondar_continuamente(self):
+        while True:
+            time.sleep(self.intervalo_sondagem)
+            try:
+                self.sondar_vencidos()
+            except Exception as e:
+                logger.warning("falha na sondagem do pool de saída: %s", e)
+
+    def sondar_vencidos(self):
+        """Sonda cada membro cuja quarentena acabou, combinado com o melhor membro do outro pool."""
+        for pool, outro in ((self.proxies, self.perfis), (self.perfis, self.proxies)):
+            for membro in pool.para_sondar():
+                parceiro = outro.escolher(sem_sondagem=True)
+                saida = Saida(membro, parceiro) if pool is self.proxies else Saida(parceiro, membro)
+                try:
+                    resultado, segundos = self.sondar(saida)
+                except Exception:
+                    resultado, segundos = FALHA, None
+                self.sondagens += 1
+                if resultado == (FALHA if pool is self.perfis else BLOQUEIO):
+                    resultado = None  # Culpa do parceiro, não do membro sondado
+                pool.concluir_sondagem(membro, resultado, segundos)
+
+    def estatisticas(self):
+        return {
+            "pid": os.getpid(),
+            "sondagens": self.sondagens,
+            "proxies": self.proxies.estatisticas(),
+            "perfis": self.perfis.estatisticas(),
+        }
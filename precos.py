@@ -0,0 +1,35 @@
+"""
+Preços em reais: texto ('R$ 1.234,56', '99.99') ou número do JSON para centavos inteiros e
+de volta. Usado pelo monitor de preços (histórico e alvo) e pela impressão digital das ofertas.
+"""
+import math
+import re
+
+PRECO_REGEX = re.compile(r'(\d[\d.]*)(?:,(\d{1,2}))?')
+PONTO_DECIMAL_REGEX = re.compile(r'^(\d+)\.(\d{1,2})$')  # '99.99', '150.5': o ponto é a vírgula decimal
+VIRGULAS_REGEX = re.compile(r',+')  # 'R$ 1.149,,90': o preço montado por partes pode repetir a vírgula
+
+
+def preco_para_centavos(texto):
+    """
+    Converte 'R$ 1.234,56' em 123456. Números (99.99, do JSON) e um único ponto seguido de 1 ou
+    2 dígitos ('99.99') são reais com casas decimais. Retorna None se não houver número.
+    """
+    if isinstance(texto, (int, float)) and not isinstance(texto, bool):
+        return round(texto * 100) if math.isfinite(texto) and texto >= 0 else None
+    if not texto:
+        return None
+    encontrado = PRECO_REGEX.search(VIRGULAS_REGEX.sub(",", str(texto)))
+    if not encontrado:
+        return None
+    inteiro, centavos = encontrado.group(1).rstrip('.'), encontrado.group(2)
+    decimal = PONTO_DECIMAL_REGEX.match(inteiro) if centavos is None else None
+    if decimal is not None:
+        inteiro, centavos = decimal.groups()
+    return int(inteiro.replace('.', '')) * 100 + int((centavos or "0").ljust(2, "0"))
+
+
+def centavos_para_preco(centavos):
+    """Converte 123456 em 'R$ 1.234,56'."""
+    reais, centavos = divmod(int(centavos), 100)
+    return "R$ " + f"{reais:,}".replace(",", ".") + f",{centavos:02d}"
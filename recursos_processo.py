@@ -0,0 +1,102 @@
+"""
+Recursos que pertencem a um processo e são refeitos depois do fork do gunicorn.
+
+- ConexoesSQLite: uma conexão SQLite (WAL, autocommit) por thread e por processo.
+- TravaLider: trava de arquivo (flock) que elege um processo entre os workers para um
+  trabalho que não pode rodar em dois ao mesmo tempo; some sozinha se o processo morrer.
+- ThreadDoProcesso: thread daemon em segundo plano, iniciada uma vez por processo (e de
+  novo se tiver parado).
+
+Conexões, travas de arquivo e threads herdadas do processo pai não servem no filho, então
+os três verificam o pid antes de reaproveitar o que já têm.
+"""
+import fcntl
+import os
+import sqlite3
+import threading
+
+
+class ConexoesSQLite:
+    """Chamar o objeto retorna a conexão da thread atual, criando-a se preciso."""
+
+    def __init__(self, caminho_db, row_factory=None, timeout=10):
+        self.caminho_db = caminho_db
+        self.row_factory = row_factory
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __call__(self):
+        pid = os.getpid()
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None or getattr(self._local, "pid", None) != pid:
+            conexao = sqlite3.connect(self.caminho_db, timeout=self.timeout, isolation_level=None)
+            if self.row_factory is not None:
+                conexao.row_factory = self.row_factory
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexao = conexao
+            self._local.pid = pid
+        return conexao
+
+
+class TravaLider:
+    """
+    'tentar()' retorna True se este processo é (ou acabou de virar) o líder. 'ao_assumir' é
+    chamado quando o processo assume a liderança (ex: recuperar o trabalho do líder anterior).
+    """
+
+    def __init__(self, caminho, ao_assumir=None):
+        self.caminho = caminho
+        self.ao_assumir = ao_assumir
+        self._arquivo = None
+        self._pid = None
+
+    def tentar(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            self._arquivo = None  # Travas de arquivo não valem para o processo filho
+            self._pid = pid
+        if self._arquivo is not None:
+            return True
+        arquivo = open(self.caminho, "a+")
+        try:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            arquivo.close()
+            return False
+        self._arquivo = arquivo
+        if self.ao_assumir is not None:
+            self.ao_assumir()
+        return True
+
+
+class ThreadDoProcesso:
+    """
+    'garantir()' inicia a thread 'alvo' se este processo ainda não tem uma rodando.
+    'preparar(novo_processo)' é chamado antes de cada início, com True no primeiro início
+    depois de um fork (para descartar o estado herdado do pai).
+    """
+
+    def __init__(self, alvo, nome, preparar=None):
+        self.alvo = alvo
+        self.nome = nome
+        self.preparar = preparar
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ativa(self):
+        return self._thread is not None and self._pid == os.getpid() and self._thread.is_alive()
+
+    def garantir(self):
+        if self.ativa():
+            return
+        with self._lock:
+            if self.ativa():
+                return
+            pid = os.getpid()
+            if self.preparar is not None:
+                self.preparar(self._pid is not None and self._pid != pid)
+            self._thread = threading.Thread(target=self.alvo, name=self.nome, daemon=True)
+            self._pid = pid
+            self._thread.start()
@@ -0,0 +1,160 @@
+"""
+Resultados de busca de produto compartilhados entre os workers do gunicorn.
+
+Cada worker tem o seu cache em memória (CacheProdutos); sem um lugar comum, o produto
+buscado por um worker é buscado de novo na Amazon pelos outros. Aqui os resultados ficam
+num SQLite em modo WAL (leituras não esperam escritas), com a mesma chave (ASIN) e o
+mesmo TTL do cache em memória, que passa a ser o primeiro nível na frente deste.
+
+A gravação é um upsert atômico: o resultado mais novo substitui o antigo, exceto um
+fallback (simulação/falha) por cima de um resultado real ainda válido. Itens vencidos são
+ignorados na leitura e apagados por uma compactação periódica em segundo plano; só um
+worker compacta a cada intervalo (eleito pela própria tabela de controle).
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from recursos_processo import ConexoesSQLite, ThreadDoProcesso
+
+LOTE_COMPACTACAO = 5000  # Linhas apagadas por transação (não segura a escrita dos outros workers)
+
+logger = logging.getLogger(__name__)
+
+
+class ResultadosCompartilhados:
+    """Armazém chave -> {"resultado", "origem"} com expiração, em SQLite."""
+
+    def __init__(self, caminho_db, intervalo_compactacao=300.0):
+        self.caminho_db = caminho_db
+        self.intervalo_compactacao = intervalo_compactacao
+        self._conexao = ConexoesSQLite(caminho_db)
+        self._thread = ThreadDoProcesso(self._compactar_continuamente, "resultados-compartilhados")
+        self.hits = 0
+        self.misses = 0
+        self.gravacoes = 0
+        self.compactacoes = 0
+        self.removidos = 0
+        self._criar_tabelas()
+
+    # --- Banco de dados ---
+
+    def _criar_tabelas(self):
+        conexao = self._conexao()
+        conexao.execute("""
+            CREATE TABLE IF NOT EXISTS resultados (
+                chave TEXT PRIMARY KEY,
+                origem TEXT NOT NULL,
+                dados TEXT NOT NULL,
+                gravado_em REAL NOT NULL,
+                expira_em REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conexao.execute("CREATE INDEX IF NOT EXISTS idx_resultados_expira_em ON resultados (expira_em)")
+        conexao.execute("CREATE TABLE IF NOT EXISTS controle (chave TEXT PRIMARY KEY, valor REAL NOT NULL)")
+        conexao.execute("INSERT OR IGNORE INTO controle (chave, valor) VALUES ('compactacao', 0)")
+
+    # --- Leitura e gravação ---
+
+    def obter(self, chave):
+        """Retorna ({"resultado", "origem"}, segundos até expirar) ou None se não houver item válido."""
+        agora = time.time()
+        try:
+            linha = self._conexao().execute(
+                "SELECT origem, dados, expira_em FROM resultados WHERE chave = ? AND expira_em > ?", (chave, agora)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("falha ao ler resultado compartilhado: %s", e)
+            linha = None
+        if linha is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {"resultado": json.loads(linha[1]), "origem": linha[0]}, linha[2] - agora
+
+    def guardar(self, chave, busca, ttl):
+        """Grava (upsert atômico) o resultado da busca por 'ttl' segundos."""
+        if ttl <= 0:
+            return
+        agora = time.time()
+        try:
+            dados = json.dumps(busca["resultado"], ensure_ascii=False)
+            self._conexao().execute("""
+                INSERT INTO resultados (chave, origem, dados, gravado_em, expira_em) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (chave) DO UPDATE SET
+                    origem = excluded.origem, dados = excluded.dados,
+                    gravado_em = excluded.gravado_em, expira_em = excluded.expira_em
+                WHERE excluded.gravado_em >= resultados.gravado_em
+                  AND (excluded.origem = 'amazon' OR resultados.origem != 'amazon'
+                       OR resultados.expira_em <= excluded.gravado_em)
+            """, (chave, busca["origem"], dados, agora, agora + ttl))
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning("falha ao gravar resultado compartilhado: %s", e)
+            return
+        self.gravacoes += 1
+        if self.intervalo_compactacao > 0:
+            self._thread.garantir()
+
+    def limpar(self):
+        self._conexao().execute("DELETE FROM resultados")
+
+    # --- Compactação (thread em segundo plano) ---
+
+    def _compactar_continuamente(self):
+        while True:
+            time.sleep(self.intervalo_compactacao)
+            try:
+                self.compactar()
+            except sqlite3.Error as e:
+                logger.warning("falha na compactação dos resultados compartilhados: %s", e)
+
+    def compactar(self, forcar=False):
+        """
+        Apaga os itens vencidos e devolve o WAL ao tamanho mínimo. Retorna quantos foram
+        apagados, ou None se outro worker já compactou neste intervalo.
+        """
+        conexao = self._conexao()
+        agora = time.time()
+        if not forcar:
+            # Eleição atômica: só o worker que conseguir avançar o marcador compacta
+            eleito = conexao.execute(
+                "UPDATE controle SET valor = ? WHERE chave = 'compactacao' AND valor <= ?",
+                (agora, agora - self.intervalo_compactacao * 0.9),
+            ).rowcount
+            if not eleito:
+                return None
+
+        removidos = 0
+        while True:
+            apagados = conexao.execute(
+                "DELETE FROM resultados WHERE chave IN "
+                "(SELECT chave FROM resultados WHERE expira_em <= ? LIMIT ?)", (agora, LOTE_COMPACTACAO)
+            ).rowcount
+            removidos += apagados
+            if apagados < LOTE_COMPACTACAO:
+                break
+        conexao.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.compactacoes += 1
+        self.removidos += removidos
+        logger.info("resultados compartilhados compactados", extra={"campos": {"removidos": removidos}})
+        return removidos
+
+    def estatisticas(self):
+        conexao = self._conexao()
+        total, validos = conexao.execute(
+            "SELECT COUNT(*), COALESCE(SUM(expira_em > ?), 0) FROM resultados", (time.time(),)
+        ).fetchone()
+        consultas = self.hits + self.misses
+        return {
+            "pid": os.getpid(),
+            "itens": total,
+            "itens_validos": validos,
+            "hits": self.hits,
+            "misses": self.misses,
+            "taxa_acerto": round(self.hits / consultas, 4) if consultas else 0.0,
+            "gravacoes": self.gravacoes,
+            "compactacoes": self.compactacoes,
+            "removidos_na_compactacao": self.removidos,
+        }
@@ -0,0 +1,418 @@
+"""
+Modo de servir assíncrono (ASGI).
+
+No deploy síncrono (gunicorn com workers sync) cada /api/buscar-produto prende um worker
+inteiro enquanto a página da Amazon é baixada, por até 20s. Aqui as rotas de busca rodam
+no event loop: o download usa o cliente assíncrono do httpx e só o parsing (CPU) vai para
+um pool de threads, então um processo atende centenas de buscas simultâneas.
+
+As demais rotas continuam no Flask (app.py), atrás do adaptador WSGI do a2wsgi, com os
+mesmos contratos JSON; o corpo da requisição chega ao Flask aos poucos, então o
+/api/importar-ofertas continua lendo o NDJSON em memória constante. Cache de produtos,
+métricas, fila do Telegram e monitor de preços são os mesmos do app síncrono.
+
+Coalescência: buscas simultâneas pelo mesmo ASIN esperam a que está em andamento só dentro
+do processo. A coalescência entre workers do app síncrono (busca_unica, COALESCENCIA_DIR)
+não vale aqui, então N workers podem buscar o mesmo ASIN na Amazon ao mesmo tempo; as
+buscas seguintes já encontram o resultado no armazenamento compartilhado (RESULTADOS_DB).
+Com poucos workers (o normal neste modo: um processo já atende centenas de buscas) a
+diferença é pequena.
+
+Uso:
+    gunicorn -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:$PORT servidor_async:app
+    uvicorn servidor_async:app --port 5000
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import httpx
+from a2wsgi import WSGIMiddleware
+
+import app as app_sync
+from app import (
+    BUSCA_HEDGE, HEADERS_AMAZON, HTTP_RETRY_BACKOFF, HTTP_RETRY_TOTAL, LOTE_MAX_LINKS, LOTE_MAX_POR_HOST,
+    STREAMING_ATIVO, STREAMING_TAMANHO_BLOCO, LeituraPagina, cache_produtos, disjuntor_amazon, extrair_asin,
+    metricas, pool_saida, registrar_falha_amazon, registrar_resposta_amazon, resultado_fallback, timeout_amazon,
+    timeout_da_busca, validar_campos, verificar_status_bloqueio,
+)
+from links_amazon import eh_link_curto
+from politica_busca import CircuitoAberto, PaginaBloqueada
+from pool_saida import BLOQUEIO, FALHA, SUCESSO
+
+ASYNC_MAX_CONEXOES = int(os.environ.get("ASYNC_MAX_CONEXOES", "200"))  # Conexões simultâneas com a Amazon
+ASYNC_THREADS_PARSE = int(os.environ.get("ASYNC_THREADS_PARSE", "4"))  # Parsing do HTML fora do event loop
+ASYNC_THREADS_FLASK = int(os.environ.get("ASYNC_THREADS_FLASK", "16"))  # Rotas que continuam no Flask
+ASYNC_THREADS_BLOQUEANTES = 4  # Chamadas bloqueantes do app (expandir link curto, gravar no SQLite)
+ASYNC_MAX_CORPO = 1024 * 1024  # Bytes aceitos no corpo das rotas assíncronas
+
+STATUS_REPETIDOS = (500, 502, 504)  # Mesma política de retry da sessão síncrona da Amazon
+
+logger = logging.getLogger("celoland.async")
+
+
+class ServidorAsync:
+    """Aplicação ASGI: rotas de busca no event loop e o resto repassado ao Flask."""
+
+    def __init__(self, app_wsgi):
+        self.app_wsgi = app_wsgi
+        self.flask = WSGIMiddleware(_entrada_terminada(app_wsgi), workers=ASYNC_THREADS_FLASK)
+        self.cliente = None
+        self._executor_parse = None
+        self._executor_bloqueante = None
+        self._em_andamento = {}  # chave -> Future da busca em andamento (coalescência no processo)
+        self._semaforos_host = {}
+        self.rotas = {
+            "/api/buscar-produto": self._buscar_produto,
+            "/api/buscar-produtos": self._buscar_produtos,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._ciclo_de_vida(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        if self.cliente is None:
+            self._iniciar()  # Servidor sem suporte a lifespan
+
+        rota = self.rotas.get(scope["path"])
+        if rota is None or scope["method"] != "POST":
+            await self.flask(scope, receive, send)  # Corpo repassado aos poucos, sem ler tudo antes
+            return
+        corpo, mensagens = await _ler_corpo(receive, ASYNC_MAX_CORPO)
+        dados = _json_ou_none(corpo) if corpo is not None else None
+        if isinstance(dados, dict):
+            status, resposta = await rota(dados)
+            await self._responder_json(scope, send, status, resposta)
+            return
+        # JSON inválido (ou grande demais) cai no Flask, que devolve a mesma resposta de erro de antes
+        await self.flask(scope, _reproduzir(mensagens, receive), send)
+
+    # --- Ciclo de vida ---
+
+    def _iniciar(self):
+        # O transporte repete só falhas de conexão; respostas 5xx são repetidas em _baixar_e_extrair
+        limites = httpx.Limits(max_connections=ASYNC_MAX_CONEXOES, max_keepalive_connections=ASYNC_MAX_CONEXOES)
+        transporte = httpx.AsyncHTTPTransport(limits=limites, retries=HTTP_RETRY_TOTAL)
+        self.cliente = httpx.AsyncClient(headers=HEADERS_AMAZON, timeout=20, follow_redirects=True,
+                                         transport=transporte)
+        self._clientes_proxy = {}
+        self._executor_parse = ThreadPoolExecutor(max_workers=ASYNC_THREADS_PARSE, thread_name_prefix="parse")
+        self._executor_bloqueante = ThreadPoolExecutor(max_workers=ASYNC_THREADS_BLOQUEANTES,
+                                                       thread_name_prefix="bloqueante")
+        app_sync.iniciar_fila_telegram()
+
+    async def _encerrar(self):
+        if self.cliente is not None:
+            await self.cliente.aclose()
+        for cliente in self._clientes_proxy.values():
+            await cliente.aclose()
+        for executor in (self._executor_parse, self._executor_bloqueante, self.flask.executor):
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensagem = await receive()
+            if mensagem["type"] == "lifespan.startup":
+                self._iniciar()
+                await send({"type": "lifespan.startup.complete"})
+            elif mensagem["type"] == "lifespan.shutdown":
+                await self._encerrar()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # --- Rotas assíncronas (mesmos contratos de app.py) ---
+
+    async def _buscar_produto(self, dados):
+        link = dados.get('url')
+        if not link:
+            return 400, {"sucesso": False, "erro": "Link da Amazon é obrigatório"}
+        busca = await self.buscar_info_produto_com_origem(link)
+        return 200, dict(busca["resultado"])
+
+    async def _buscar_produtos(self, dados):
+        links = dados.get('urls')
+        if not isinstance(links, list) or not links:
+            return 400, {"sucesso": False, "erro": "Lista de links da Amazon ('urls') é obrigatória"}
+        if len(links) > LOTE_MAX_LINKS:
+            return 400, {"sucesso": False, "erro": f"Máximo de {LOTE_MAX_LINKS} links por requisição"}
+        return 200, {"sucesso": True, "resultados": await self.buscar_info_produtos_lote(links)}
+
+    # --- Busca de produtos ---
+
+    async def buscar_info_produto_com_origem(self, url):
+        """Versão assíncrona de app.buscar_info_produto_com_origem (mesmo cache e mesmas métricas)."""
+        if eh_link_curto(url):
+            destino = await asyncio.get_running_loop().run_in_executor(
+                self._executor_bloqueante, app_sync.links_curtos.expandir, url.strip())
+            url = destino or url
+        asin = extrair_asin(url)
+        chave = asin or url
+
+        busca = cache_produtos.obter(chave)
+        if busca is not None:
+            metricas.incrementar("celoland_cache_produtos_total", resultado="hit")
+            return busca
+        # Leitura no SQLite em WAL não espera escritas: pode ser feita no event loop
+        compartilhado = app_sync.obter_resultado_compartilhado(chave)
+        if compartilhado is not None:
+            busca, restante = compartilhado
+            cache_produtos.guardar(chave, busca, min(restante, app_sync._ttl_cache(busca["origem"])))
+            return busca
+        metricas.incrementar("celoland_cache_produtos_total", resultado="miss")
+
+        # Buscas simultâneas pelo mesmo ASIN esperam a que já está em andamento
+        futuro = self._em_andamento.get(chave)
+        if futuro is not None:
+            app_sync.busca_unica.contar(coalescida=True)  # Mesmos contadores de /api/coalescencia
+            try:
+                return await asyncio.shield(futuro)
+            except asyncio.CancelledError:
+                if not futuro.cancelled():
+                    raise
+                return await self.buscar_info_produto_com_origem(url)  # A busca líder foi cancelada
+        futuro = asyncio.get_running_loop().create_future()
+        self._em_andamento[chave] = futuro
+        app_sync.busca_unica.contar(coalescida=False)
+        try:
+            resultado, origem = await self._buscar_sem_cache(url, asin)
+            metricas.incrementar("celoland_buscas_total", origem=origem)
+            busca = {"resultado": resultado, "origem": origem}
+            cache_produtos.guardar(chave, busca, app_sync._ttl_cache(origem))
+            # A escrita pode esperar a trava do SQLite: fica fora do event loop
+            asyncio.get_running_loop().run_in_executor(self._executor_bloqueante,
+                                                       app_sync.guardar_resultado_compartilhado, chave, busca)
+            futuro.set_result(busca)
+            return busca
+        except asyncio.CancelledError:
+            futuro.cancel()
+            raise
+        except Exception as e:
+            futuro.set_exception(e)
+            futuro.exception()  # Marca como consultada: ninguém esperando não gera aviso
+            raise
+        finally:
+            del self._em_andamento[chave]
+
+    async def _buscar_sem_cache(self, url, asin):
+        # Mesma política de app._buscar_info_produto_sem_cache (disjuntor, bloqueios, timeout adaptativo)
+        if not disjuntor_amazon.permitir():
+            metricas.incrementar("celoland_disjuntor_evitadas_total")
+            return resultado_fallback(url, asin, CircuitoAberto("Disjuntor da Amazon aberto: busca não realizada."))
+        timeout = timeout_da_busca()
+        try:
+            campos = await self._baixar_e_extrair(url, timeout)
+            return validar_campos(url, campos), "amazon"
+        except PaginaBloqueada as e:
+            registrar_falha_amazon(e.motivo)
+            return resultado_fallback(url, asin, e)
+        except (httpx.TransportError, asyncio.TimeoutError) as e:
+            estourou = isinstance(e, (httpx.TimeoutException, asyncio.TimeoutError))
+            registrar_falha_amazon("timeout" if estourou else "conexao", timeout)
+            return resultado_fallback(url, asin, e)
+        except Exception as e:
+            return resultado_fallback(url, asin, e)
+
+    async def _baixar_e_extrair(self, url, timeout):
+        loop = asyncio.get_running_loop()
+        for tentativa in range(HTTP_RETRY_TOTAL + 1):
+            inicio = time.perf_counter()
+            response = await self._get_com_hedge(url, timeout)
+            try:
+                tempo_resposta = time.perf_counter() - inicio
+                metricas.observar("celoland_amazon_resposta_segundos", tempo_resposta)
+                metricas.incrementar("celoland_amazon_status_total", status=str(response.status_code))
+                verificar_status_bloqueio(response.status_code)
+                if response.status_code in STATUS_REPETIDOS and tentativa < HTTP_RETRY_TOTAL:
+                    await asyncio.sleep(HTTP_RETRY_BACKOFF * (2 ** tentativa))
+                    continue
+                response.raise_for_status()
+
+                # O parsing roda no pool de threads, um bloco por vez (o extrator não é compartilhado)
+                leitura = LeituraPagina(url, response.headers.get('Content-Type'))
+                tamanho_bloco = STREAMING_TAMANHO_BLOCO if STREAMING_ATIVO else None
+                async for bloco in response.aiter_bytes(tamanho_bloco):
+                    if await loop.run_in_executor(self._executor_parse, leitura.receber, bloco):
+                        break
+                campos = await loop.run_in_executor(self._executor_parse, leitura.finalizar,
+                                                    response.num_bytes_downloaded,
+                                                    response.headers.get('Content-Length'))
+                registrar_resposta_amazon(tempo_resposta)
+                pool_saida.registrar(response.saida, SUCESSO, tempo_resposta)
+                return campos
+            except PaginaBloqueada:
+                pool_saida.registrar(response.saida, BLOQUEIO)
+                raise
+            except httpx.TransportError:
+                pool_saida.registrar(response.saida, FALHA)  # Falhou no meio do corpo
+                raise
+            finally:
+                await response.aclose()
+
+    def _cliente_para(self, proxy):
+        """No httpx o proxy é do cliente: um cliente (com o seu pool de conexões) por proxy."""
+        if proxy is None:
+            return self.cliente
+        cliente = self._clientes_proxy.get(proxy)
+        if cliente is None:
+            limites = httpx.Limits(max_connections=ASYNC_MAX_CONEXOES, max_keepalive_connections=ASYNC_MAX_CONEXOES)
+            transporte = httpx.AsyncHTTPTransport(limits=limites, retries=HTTP_RETRY_TOTAL, proxy=proxy)
+            cliente = httpx.AsyncClient(headers=HEADERS_AMAZON, timeout=20, follow_redirects=True,
+                                        transport=transporte)
+            self._clientes_proxy[proxy] = cliente
+        return cliente
+
+    async def _get(self, url, timeout, saida=None):
+        """GET pela saída indicada (ou sorteada no pool de saída), como app._get_amazon."""
+        saida = saida or pool_saida.escolher()
+        cliente = self._cliente_para(saida.url_proxy)
+        pedido = cliente.build_request("GET", app_sync.url_de_download(url), timeout=timeout, headers=saida.cabecalhos)
+        try:
+            response = await cliente.send(pedido, stream=True)
+        except httpx.TransportError:
+            pool_saida.registrar(saida, FALHA)
+            raise
+        response.saida = saida
+        return response
+
+    async def _get_com_hedge(self, url, timeout):
+        """Igual a app._get_amazon_com_hedge: segunda requisição se a primeira passar do p95."""
+        atraso = timeout_amazon.p95
+        saida = pool_saida.escolher()
+        primeira = asyncio.ensure_future(self._get(url, timeout, saida))
+        if not BUSCA_HEDGE or atraso is None:
+            return await primeira
+        concluidas, _ = await asyncio.wait({primeira}, timeout=atraso)
+        if concluidas:
+            return primeira.result()
+
+        metricas.incrementar("celoland_amazon_hedge_total", resultado="disparada")
+        segunda = asyncio.ensure_future(self._get(url, timeout, pool_saida.escolher(excluir=saida)))
+        pendentes = {primeira, segunda}
+        while pendentes:
+            concluidas, pendentes = await asyncio.wait(pendentes, return_when=asyncio.FIRST_COMPLETED)
+            vencedora = next((t for t in concluidas if t.exception() is None), None)
+            if vencedora is None:
+                continue
+            for tarefa in concluidas | pendentes:
+                if tarefa is not vencedora:
+                    tarefa.cancel()
+                    tarefa.add_done_callback(_fechar_resposta)
+            if vencedora is segunda:
+                metricas.incrementar("celoland_amazon_hedge_total", resultado="vencedora")
+            return vencedora.result()
+        return primeira.result()  # As duas falharam: levanta o erro da primeira
+
+    async def buscar_info_produtos_lote(self, urls):
+        """Versão assíncrona de app.buscar_info_produtos_lote (mesmo formato de resultado)."""
+        tarefas = {}
+        chaves = []
+        for url in urls:
+            if not isinstance(url, str) or not url.strip():
+                chaves.append(None)
+                continue
+            url = url.strip()
+            chave = extrair_asin(url) or url
+            chaves.append(chave)
+            if chave not in tarefas:
+                tarefas[chave] = asyncio.ensure_future(self._buscar_com_limite_host(url))
+        if tarefas:
+            await asyncio.wait(tarefas.values())
+
+        resultados = []
+        for url, chave in zip(urls, chaves):
+            if chave is None:
+                resultados.append({"sucesso": False, "url": url, "erro": "Link inválido"})
+                continue
+            erro = tarefas[chave].exception()
+            if erro is not None:
+                logger.warning("erro na busca em lote", extra={"campos": {"url": url, "erro": str(erro)}})
+                resultado = {"sucesso": False, "titulo": None, "preco_atual": None, "preco_antigo": None,
+                             "erro": str(erro)}
+            else:
+                resultado = dict(tarefas[chave].result()["resultado"])
+            resultado["url"] = url
+            resultados.append(resultado)
+        return resultados
+
+    async def _buscar_com_limite_host(self, url):
+        host = (urlparse(url).hostname or "").lower()
+        semaforo = self._semaforos_host.get(host)
+        if semaforo is None:
+            semaforo = self._semaforos_host[host] = asyncio.Semaphore(LOTE_MAX_POR_HOST)
+        async with semaforo:
+            return await self.buscar_info_produto_com_origem(url)
+
+    # --- Respostas ---
+
+    async def _responder_json(self, scope, send, status, dados):
+        corpo = self.app_wsgi.json.dumps(dados, separators=(",", ":")).encode("utf-8") + b"\n"
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(corpo)).encode())]
+        origem = next((valor for nome, valor in scope.get("headers", ()) if nome == b"origin"), None)
+        if origem is not None:
+            # Mesmo comportamento do CORS(app) no Flask: devolve a origem da requisição
+            headers += [(b"access-control-allow-origin", origem), (b"vary", b"Origin")]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": corpo})
+
+
+def _fechar_resposta(tarefa):
+    if not tarefa.cancelled() and tarefa.exception() is None:
+        asyncio.ensure_future(tarefa.result().aclose())
+
+
+async def _ler_corpo(receive, limite):
+    """
+    Lê o corpo até 'limite' bytes. Retorna (corpo, mensagens lidas); o corpo é None se
+    passou do limite ou o cliente desconectou, e as mensagens podem ser reproduzidas ao Flask.
+    """
+    mensagens = []
+    tamanho = 0
+    while True:
+        mensagem = await receive()
+        mensagens.append(mensagem)
+        if mensagem["type"] == "http.disconnect":
+            return None, mensagens
+        tamanho += len(mensagem.get("body", b""))
+        if tamanho > limite:
+            return None, mensagens
+        if not mensagem.get("more_body", False):
+            return b"".join(m.get("body", b"") for m in mensagens), mensagens
+
+
+def _reproduzir(mensagens, receive):
+    """'receive' que entrega de novo as mensagens já lidas e depois continua no original."""
+    pendentes = list(mensagens)
+
+    async def receber():
+        if pendentes:
+            return pendentes.pop(0)
+        return await receive()
+    return receber
+
+
+def _entrada_terminada(app_wsgi):
+    """
+    Como no gunicorn, avisa ao Flask que o wsgi.input termina sozinho: sem isso o corpo
+    enviado em chunked (sem Content-Length) chega vazio.
+    """
+    def app_com_entrada_terminada(environ, start_response):
+        environ["wsgi.input_terminated"] = True
+        return app_wsgi(environ, start_response)
+    return app_com_entrada_terminada
+
+
+def _json_ou_none(corpo):
+    try:
+        return json.loads(corpo)
+    except ValueError:
+        return None
+
+
+app = ServidorAsync(app_sync.app)